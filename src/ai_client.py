@@ -0,0 +1,173 @@
+"""HTTP clients for the editor's AI assistant.
+
+One client per provider and base URL lives for the whole process, so the
+TLS connection is kept alive between messages. Replies are streamed
+(Gemini streamGenerateContent, OpenRouter chat completions with
+stream=true, both as server-sent events) and yielded piece by piece.
+The base URLs can be changed, e.g. to point at a local mock server.
+"""
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+OPENROUTER_MODEL = "openai/gpt-3.5-turbo"
+
+# Worth another try: rate limits and transient server errors
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class AIClientError(Exception):
+    pass
+
+
+def iter_sse(response):
+    """Yields the data of each server-sent event until the stream ends or [DONE]"""
+    data = []
+    # Event streams are always UTF-8; without a charset requests would assume ISO-8859-1
+    for raw in response.iter_lines():
+        if raw is None:
+            continue
+        line = raw.decode("utf-8", errors="replace") if isinstance(raw, bytes) else raw
+        if not line:
+            if data:
+                payload = "\n".join(data)
+                data = []
+                if payload == "[DONE]":
+                    return
+                yield payload
+        elif line.startswith(":"):
+            # Comment / keep-alive
+            continue
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip(" "))
+    if data and "\n".join(data) != "[DONE]":
+        yield "\n".join(data)
+
+
+class StreamingClient:
+    """requests.Session with a connection pool, timeouts and retries.
+
+    Failed attempts are retried with exponential backoff (honouring
+    Retry-After) only until the response starts; once text has been yielded
+    a retry would repeat it, so errors after that are raised.
+    """
+
+    def __init__(self, base_url, timeout=(10, 60), max_retries=3, backoff=0.5, pool_size=4):
+        self.base_url = base_url.rstrip("/")
+        # (connect, read) seconds; the read timeout applies between streamed chunks
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post_events(self, path, payload, headers=None):
+        """POSTs payload as JSON and yields the decoded JSON of each event"""
+        url = self.base_url + path
+        for attempt in range(self.max_retries + 1):
+            last_try = attempt == self.max_retries
+            try:
+                response = self.session.post(url, json=payload, headers=headers,
+                                             stream=True, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_try:
+                    raise AIClientError(f"Bağlantı hatası: {e}") from e
+                self.sleep(attempt)
+                continue
+
+            with response:
+                if response.status_code in RETRY_STATUS and not last_try:
+                    self.sleep(attempt, response.headers.get("Retry-After"))
+                    continue
+                if response.status_code != 200:
+                    raise AIClientError(f"API Hatası ({response.status_code}): {response.text}")
+                for data in iter_sse(response):
+                    try:
+                        event = json.loads(data)
+                    except ValueError:
+                        continue
+                    if isinstance(event, dict) and event.get("error"):
+                        error = event["error"]
+                        raise AIClientError(f"API Hatası: {error.get('message', error) if isinstance(error, dict) else error}")
+                    yield event
+            return
+
+    def sleep(self, attempt, retry_after=None):
+        delay = self.backoff * (2 ** attempt)
+        try:
+            delay = max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+        time.sleep(min(delay, 30))
+
+    def close(self):
+        self.session.close()
+
+
+class GeminiClient(StreamingClient):
+    def __init__(self, base_url=None, **kwargs):
+        super().__init__(base_url or GEMINI_BASE_URL, **kwargs)
+
+    def stream_chat(self, api_key, messages, model=None):
+        contents = [{
+            "role": "model" if msg["role"] == "assistant" else "user",
+            "parts": [{"text": msg["content"]}],
+        } for msg in messages]
+        # The key goes in a header, so it does not end up in proxy or server logs
+        headers = {"x-goog-api-key": api_key}
+        path = f"/models/{model or GEMINI_MODEL}:streamGenerateContent?alt=sse"
+        for event in self.post_events(path, {"contents": contents}, headers):
+            for candidate in event.get("candidates", [])[:1]:
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+
+
+class OpenRouterClient(StreamingClient):
+    def __init__(self, base_url=None, **kwargs):
+        super().__init__(base_url or OPENROUTER_BASE_URL, **kwargs)
+
+    def stream_chat(self, api_key, messages, model=None):
+        headers = {"Authorization": f"Bearer {api_key}"}
+        payload = {"model": model or OPENROUTER_MODEL, "messages": messages, "stream": True}
+        for event in self.post_events("/chat/completions", payload, headers):
+            for choice in event.get("choices", [])[:1]:
+                text = choice.get("delta", {}).get("content")
+                if text:
+                    yield text
+
+
+PROVIDERS = {
+    "Google Gemini": GeminiClient,
+    "OpenRouter": OpenRouterClient,
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def client_for(provider, base_url=None):
+    """The shared client of a provider; created on first use"""
+    if provider not in PROVIDERS:
+        raise AIClientError("Geçersiz Sağlayıcı")
+    key = (provider, base_url or None)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = PROVIDERS[provider](base_url or None)
+            _clients[key] = client
+        return client
+
+
+def close_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,198 @@
+import os
+import time
+from dataclasses import dataclass
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from tracing import NULL_SPAN, document_counters
+
+
+@dataclass
+class RenderResult:
+    input_path: str
+    output_path: str
+    ok: bool
+    error: str = ""
+    elapsed: float = 0.0
+    cached: bool = False
+
+
+class RenderJob:
+    def __init__(self, input_path, output_path):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.page = None
+        self.html_body = ""
+        self.waiter = None
+        self.started = 0.0
+        self.cache_key = None
+        self.queued = time.perf_counter()
+        # Whole document and current stage, for converter.tracer
+        self.span = NULL_SPAN
+        self.stage = NULL_SPAN
+
+
+class BatchRenderer(QObject):
+    """Drives several QWebEnginePages at once from the caller's event loop.
+
+    Each job moves through load -> render wait -> printToPdf purely via
+    signals and callbacks, so up to max_in_flight Chromium renderers work
+    in parallel. Results are emitted in completion order.
+    """
+    job_finished = pyqtSignal(object)
+    finished = pyqtSignal()
+
+    def __init__(self, converter, jobs, max_in_flight=4, parent=None):
+        super().__init__(parent)
+        self.converter = converter
+        self.max_in_flight = max(1, max_in_flight)
+        self.queue = []
+        self.total = 0
+        self.in_flight = []
+        self.results = []
+        self.done = False
+        self.started = False
+        self.starting = False
+        for job in jobs:
+            if isinstance(job, (tuple, list)):
+                self.add_job(*job)
+            else:
+                self.add_job(job)
+
+    def add_job(self, input_path, output_path=None):
+        """Queues another document; a running renderer picks it up right away"""
+        if not output_path:
+            output_path = os.path.splitext(input_path)[0] + ".pdf"
+        job = RenderJob(input_path, output_path)
+        self.queue.append(job)
+        self.total += 1
+        if self.started:
+            self.done = False
+            self.start_next()
+        return job
+
+    def start(self):
+        self.started = True
+        self.start_next()
+
+    def cancel(self):
+        """Drops queued jobs; documents already rendering are finished"""
+        self.queue = []
+        self.check_done()
+
+    def check_done(self):
+        # Emitted once, even if a finished handler queues and completes more jobs
+        if not self.done and not self.queue and not self.in_flight:
+            self.done = True
+            self.finished.emit()
+
+    def start_next(self):
+        # Cache hits and errors finish inside start_job and call back in here;
+        # the loop already running picks up the next job instead of recursing
+        if self.starting:
+            return
+        self.starting = True
+        try:
+            while self.queue and len(self.in_flight) < self.max_in_flight:
+                job = self.queue.pop(0)
+                self.in_flight.append(job)
+                self.start_job(job)
+        finally:
+            self.starting = False
+        self.check_done()
+
+    def begin_stage(self, job, name, **args):
+        job.stage.end()
+        job.stage = self.converter.tracer.span(name, job.input_path, **args)
+
+    def start_job(self, job):
+        job.started = time.perf_counter()
+        tracer = self.converter.tracer
+        tracer.record("queued", job.queued, job.started - job.queued, job.input_path)
+        job.span = tracer.span("convert", job.input_path)
+        if self.converter.is_large(job.input_path):
+            # Too big to hold in one page: converted in parts, blocking this loop meanwhile
+            ok = self.converter.convert_streaming(job.input_path, job.output_path)
+            self.finish_job(job, ok, "" if ok else "Streaming conversion failed")
+            return
+        try:
+            job.html_body = self.converter.render_file(job.input_path)
+            if tracer.enabled:
+                tracer.counters(job.input_path, **document_counters(job.html_body))
+            with tracer.span("cache_lookup", job.input_path):
+                hit, job.cache_key = self.converter.cache_lookup(job.input_path, job.html_body,
+                                                                 job.output_path)
+        except Exception as e:
+            self.finish_job(job, False, str(e))
+            return
+        if hit:
+            self.finish_job(job, True, cached=True)
+            return
+
+        if self.converter.prerenderer is not None:
+            self.begin_stage(job, "prerender")
+            self.converter.prerenderer.prerender_async(job.html_body, lambda html_body: self.load_job(job, html_body))
+        else:
+            self.load_job(job, job.html_body)
+
+    def load_job(self, job, html_body):
+        job.html_body = html_body
+        pool = self.converter.pool
+        if pool is not None:
+            self.begin_stage(job, "acquire_page")
+            pool.acquire_async(lambda page: self.on_page_acquired(job, page))
+        else:
+            self.begin_stage(job, "load")
+            job.page = self.converter.create_page()
+            job.page.loadFinished.connect(lambda ok: self.on_loaded(job, ok))
+            job.page.setHtml(self.converter.build_html(job.html_body),
+                             self.converter.base_url_for(job.input_path))
+
+    def on_page_acquired(self, job, page):
+        job.page = page
+        self.begin_stage(job, "load", pooled=True)
+        self.converter.pool.set_content_async(
+            page, job.html_body, self.converter.base_url_for(job.input_path),
+            lambda: self.wait_and_print(job))
+
+    def on_loaded(self, job, ok):
+        job.page.loadFinished.disconnect()
+        if not ok:
+            self.finish_job(job, False, "Page failed to load")
+        elif self.converter.needs_render_wait(job.html_body):
+            self.wait_and_print(job)
+        else:
+            self.print_job(job)
+
+    def wait_and_print(self, job):
+        self.begin_stage(job, "render_wait")
+        job.waiter = self.converter.wait_for_render_async(job.page, lambda ready: self.print_job(job))
+
+    def print_job(self, job):
+        job.waiter = None
+        self.begin_stage(job, "print")
+        job.page.pdfPrintingFinished.connect(lambda path, ok: self.on_printed(job, ok))
+        job.page.printToPdf(job.output_path, self.converter.page_layout())
+
+    def on_printed(self, job, ok):
+        job.page.pdfPrintingFinished.disconnect()
+        if ok:
+            self.converter.cache_store(job.cache_key, "pdf", job.output_path)
+        self.finish_job(job, ok, "" if ok else "printToPdf failed")
+
+    def finish_job(self, job, ok, error="", cached=False):
+        job.stage.end()
+        job.span.end(ok=ok, cached=cached)
+        if job.page is not None:
+            if self.converter.pool is not None:
+                self.converter.pool.release(job.page)
+            else:
+                job.page.deleteLater()
+            job.page = None
+        job.html_body = ""
+
+        result = RenderResult(job.input_path, job.output_path, ok, error,
+                              time.perf_counter() - job.started, cached)
+        self.results.append(result)
+        self.in_flight.remove(job)
+        self.job_finished.emit(result)
+        self.start_next()
@@ -0,0 +1,480 @@
+"""Reproducible conversion benchmark.
+
+    python src/benchmark.py generate bench/corpus --seed 1
+    python src/benchmark.py run bench/corpus -o bench/before.json
+    python src/benchmark.py compare bench/before.json bench/after.json
+
+generate writes a synthetic corpus (sizes, code, math, Mermaid, tables and
+local images) that is identical for the same seed. run converts it offline
+with the local MathJax/Mermaid bundle and records per-stage latencies (from
+the converter's tracing spans: read, markdown, load, render_wait, print,
+pdf2docx and the whole convert), throughput and peak memory as JSON.
+compare prints the differences between two runs and exits with 1 when a
+metric got worse than the threshold.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import random
+import struct
+import sys
+import time
+import zlib
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 2: stages come from the converter's tracing spans (read, markdown, load, render_wait, print...)
+RESULT_VERSION = 2
+GENERATOR_VERSION = 1
+
+WORDS = ("markdown render page chromium layout table diagram formula export queue cache "
+         "document heading paragraph section image output batch worker latency style code "
+         "block inline token parser theme margin print font vector browser output").split()
+
+# name -> (target bytes, code blocks per KB, formulas per KB, diagrams, tables per KB, images)
+PROFILES = {
+    "prose-small": (2_000, 0, 0, 0, 0, 0),
+    "prose-large": (200_000, 0, 0, 0, 0, 0),
+    "code-heavy": (40_000, 1.0, 0, 0, 0, 0),
+    "math-heavy": (20_000, 0, 2.0, 0, 0, 0),
+    "diagrams": (8_000, 0, 0, 6, 0, 0),
+    "tables": (40_000, 0, 0, 0, 0.5, 0),
+    "images": (10_000, 0, 0, 0, 0, 8),
+    "mixed": (30_000, 0.3, 0.5, 2, 0.1, 3),
+}
+
+# Metrics where a larger value is better; everything else should go down
+HIGHER_IS_BETTER = ("docs_per_sec",)
+
+
+def png_bytes(width, height, color):
+    """A small solid-colour PNG without needing an imaging library"""
+    row = b"\x00" + bytes(color) * width
+    raw = row * height
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw, 9)) + chunk(b"IEND", b""))
+
+
+def sentence(rng, words=12):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def code_block(rng):
+    lines = [f"def {rng.choice(WORDS)}_{i}(value):\n    return value * {rng.randint(2, 99)}"
+             for i in range(rng.randint(2, 6))]
+    return "```python\n" + "\n\n".join(lines) + "\n```"
+
+
+def formula(rng):
+    a, b = rng.choice("abcxyz"), rng.choice("nmkij")
+    if rng.random() < 0.5:
+        return f"Inline ${a}_{b}^2 + \\frac{{{a}}}{{{rng.randint(2, 9)}}}$ in text."
+    return f"$$\n\\sum_{{{b}=1}}^{{N}} {a}_{b} = \\int_0^1 f({a})\\,d{a}\n$$"
+
+
+def diagram(rng):
+    nodes = [rng.choice(WORDS).capitalize() for _ in range(rng.randint(3, 6))]
+    edges = [f"    N{i}[{nodes[i]}] --> N{i + 1}[{nodes[i + 1]}]" for i in range(len(nodes) - 1)]
+    return "```mermaid\ngraph TD\n" + "\n".join(edges) + "\n```"
+
+
+def table(rng):
+    cols = rng.randint(3, 6)
+    rows = ["| " + " | ".join(rng.choice(WORDS) for _ in range(cols)) + " |"
+            for _ in range(rng.randint(4, 12))]
+    return "\n".join([rows[0], "|" + " --- |" * cols] + rows[1:])
+
+
+def generate_document(rng, target_bytes, code, math, diagrams, tables, images, image_names):
+    """Markdown with the requested mix of features, spread over the text"""
+    kb = target_bytes / 1000
+    extras = ([code_block] * round(code * kb) + [formula] * round(math * kb)
+              + [diagram] * diagrams + [table] * round(tables * kb))
+    extras += [lambda r: f"![{r.choice(WORDS)}](images/{r.choice(image_names)})"] * images
+    rng.shuffle(extras)
+
+    parts = [f"# {sentence(rng, 4)[:-1]}"]
+    size = len(parts[0])
+    per_extra = target_bytes // (len(extras) + 1)
+    next_extra = per_extra
+    section = 0
+    while size < target_bytes or extras:
+        if size >= next_extra and extras:
+            block = extras.pop()(rng)
+            next_extra += per_extra
+        elif size // 3000 > section:
+            section += 1
+            block = f"## {sentence(rng, 3)[:-1]} {section}"
+        else:
+            block = " ".join(sentence(rng) for _ in range(rng.randint(3, 7)))
+        parts.append(block)
+        size += len(block) + 2
+        if size >= target_bytes * 2:
+            break
+    return "\n\n".join(parts) + "\n"
+
+
+def generate_corpus(directory, seed=1, copies=2):
+    """Writes the corpus and its manifest; returns the manifest"""
+    rng = random.Random(seed)
+    image_dir = os.path.join(directory, "images")
+    os.makedirs(image_dir, exist_ok=True)
+    image_names = []
+    for i in range(6):
+        name = f"image{i}.png"
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        with open(os.path.join(image_dir, name), "wb") as f:
+            f.write(png_bytes(160 + 40 * i, 90 + 20 * i, color))
+        image_names.append(name)
+
+    documents = []
+    for name, profile in PROFILES.items():
+        for copy in range(copies):
+            text = generate_document(rng, *profile, image_names)
+            file_name = f"{name}-{copy}.md"
+            with open(os.path.join(directory, file_name), "w", encoding="utf-8", newline="\n") as f:
+                f.write(text)
+            documents.append({
+                "file": file_name,
+                "profile": name,
+                "bytes": len(text.encode("utf-8")),
+                "sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            })
+
+    manifest = {"seed": seed, "generator": GENERATOR_VERSION, "documents": documents}
+    with open(os.path.join(directory, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def percentile(values, fraction):
+    """Linear interpolation between the closest ranks"""
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * fraction
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "max": max(values),
+    }
+
+
+def process_rss(pid):
+    """Resident set size in bytes, or None if the process is gone"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def child_pids(pid):
+    """All descendants of pid (the Chromium renderer, GPU and utility processes)"""
+    if psutil is not None:
+        try:
+            return [p.pid for p in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+    parents = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; the fields after it don't
+                fields = f.read().rsplit(")", 1)[1].split()
+            parents.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    found = []
+    todo = [pid]
+    while todo:
+        for child in parents.get(todo.pop(), []):
+            found.append(child)
+            todo.append(child)
+    return found
+
+
+def python_peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return process_rss(os.getpid())
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemorySampler:
+    """Polls the summed RSS of the Chromium subprocesses while the event loop runs"""
+
+    def __init__(self, interval=100):
+        from PyQt6.QtCore import QTimer
+
+        self.peak = 0
+        self.supported = psutil is not None or os.path.isdir("/proc")
+        self.timer = QTimer()
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.sample)
+
+    def start(self):
+        if self.supported:
+            self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        self.sample()
+
+    def sample(self):
+        if not self.supported:
+            return
+        total = sum(process_rss(pid) or 0 for pid in child_pids(os.getpid()))
+        self.peak = max(self.peak, total)
+
+
+def run_benchmark(corpus_dir, jobs=4, docx=True, pool=0, repeat=1):
+    """Converts the corpus and returns the result record"""
+    from PyQt6.QtWidgets import QApplication
+    from converter import Md2PdfConverter
+    from renderer_pool import RendererPool
+    from tracing import NULL_TRACER, StatsSink, Tracer
+    import offline_bundle
+
+    with open(os.path.join(corpus_dir, "corpus.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    out_dir = os.path.join(corpus_dir, "out")
+    os.makedirs(out_dir, exist_ok=True)
+
+    offline_bundle.register_scheme()
+    app = QApplication.instance() or QApplication([])
+    # No render cache: every document is really rendered
+    converter = Md2PdfConverter(offline=True)
+    if pool:
+        converter.pool = RendererPool(converter, size=pool)
+        converter.pool.warm_up()
+    sampler = MemorySampler()
+    sampler.start()
+
+    documents = list(manifest["documents"])
+    paths = [os.path.join(corpus_dir, d["file"]) for d in documents]
+    records = []
+
+    # One untimed document so the first measurement doesn't include Chromium's startup
+    converter.convert(paths[0], os.path.join(out_dir, "warmup.pdf"))
+
+    # Stage latencies come from the converter's own spans, each measured once
+    stats = StatsSink()
+    converter.tracer = Tracer([stats])
+    sequential_started = time.perf_counter()
+    for _ in range(repeat):
+        for doc, path in zip(documents, paths):
+            pdf_path = os.path.join(out_dir, os.path.splitext(doc["file"])[0] + ".pdf")
+            record = {"file": doc["file"], "profile": doc["profile"], "bytes": doc["bytes"]}
+
+            started = time.perf_counter()
+            record["ok"] = converter.convert(path, pdf_path)
+            record["pdf"] = time.perf_counter() - started
+
+            if docx and record["ok"]:
+                started = time.perf_counter()
+                record["ok"] = converter.convert_to_docx(pdf_path)
+                record["docx"] = time.perf_counter() - started
+            records.append(record)
+    sequential_seconds = time.perf_counter() - sequential_started
+    converter.tracer.close()
+    # The batch pass only measures throughput; its spans would overlap
+    converter.tracer = NULL_TRACER
+
+    # Throughput with jobs documents in flight, as the GUI and cli.py render
+    batch_started = time.perf_counter()
+    batch_jobs = [(path, os.path.join(out_dir, "batch-" + os.path.splitext(d["file"])[0] + ".pdf"))
+                  for d, path in zip(documents, paths)]
+    batch = converter.convert_many(batch_jobs, max_in_flight=jobs)
+    if not batch.done:
+        batch.finished.connect(app.quit)
+        app.exec()
+    batch_seconds = time.perf_counter() - batch_started
+    sampler.stop()
+    if converter.pool is not None:
+        converter.pool.close()
+
+    count = len(records)
+    return {
+        "version": RESULT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "corpus": {
+            "seed": manifest["seed"],
+            "generator": manifest["generator"],
+            "documents": len(documents),
+            "sha256": hashlib.sha256("".join(d["sha256"] for d in documents).encode()).hexdigest(),
+        },
+        "config": {"jobs": jobs, "docx": docx, "pool": pool, "repeat": repeat},
+        "failed": sum(1 for r in records if not r["ok"]) + sum(1 for r in batch.results if not r.ok),
+        "stages": {stage: summarize(values) for stage, values in sorted(stats.durations.items())},
+        "throughput": {
+            "sequential_docs_per_sec": count / sequential_seconds if sequential_seconds else None,
+            "batch_docs_per_sec": len(batch_jobs) / batch_seconds if batch_seconds else None,
+        },
+        "memory": {
+            "python_peak_mb": (python_peak_rss() or 0) / 2**20,
+            "chromium_peak_mb": sampler.peak / 2**20 if sampler.supported else None,
+        },
+        "documents": records,
+    }
+
+
+def flatten(result):
+    """{metric name: value} for the numbers compare looks at"""
+    metrics = {}
+    for stage, summary in result.get("stages", {}).items():
+        for key in ("p50", "p95", "mean"):
+            if summary.get(key) is not None:
+                metrics[f"{stage}.{key}_seconds"] = summary[key]
+    for key, value in result.get("throughput", {}).items():
+        if value is not None:
+            metrics[key] = value
+    for key, value in result.get("memory", {}).items():
+        if value is not None:
+            metrics[key] = value
+    return metrics
+
+
+def compare_results(old, new, threshold=0.1):
+    """[(metric, old, new, relative change, regressed)]; a positive change is always worse"""
+    old_metrics = flatten(old)
+    new_metrics = flatten(new)
+    rows = []
+    for metric in sorted(old_metrics.keys() & new_metrics.keys()):
+        before, after = old_metrics[metric], new_metrics[metric]
+        if not before:
+            continue
+        change = (after - before) / before
+        if metric.endswith(HIGHER_IS_BETTER):
+            change = -change
+        rows.append((metric, before, after, change, change > threshold))
+    return rows
+
+
+def cmd_generate(args):
+    manifest = generate_corpus(args.directory, seed=args.seed, copies=args.copies)
+    total = sum(d["bytes"] for d in manifest["documents"])
+    print(f"{len(manifest['documents'])} documents, {total / 1000:.0f} KB in {args.directory}")
+    return 0
+
+
+def cmd_run(args):
+    # WebEngine needs no display when running on servers and CI
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_benchmark(args.corpus, jobs=args.jobs, docx=not args.no_docx,
+                                   pool=args.pool, repeat=args.repeat)
+    except RuntimeError as e:
+        # Offline mode without the local bundle: results would depend on the CDN
+        print(e, file=sys.stderr)
+        return 2
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=1)
+    for stage, summary in result["stages"].items():
+        print(f"{stage:12} p50 {summary['p50'] * 1000:8.1f} ms   p95 {summary['p95'] * 1000:8.1f} ms")
+    for key, value in {**result["throughput"], **result["memory"]}.items():
+        if value is not None:
+            print(f"{key:28} {value:10.2f}")
+    return 1 if result["failed"] else 0
+
+
+def cmd_compare(args):
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    if old.get("corpus", {}).get("sha256") != new.get("corpus", {}).get("sha256"):
+        print("Warning: the runs used different corpora", file=sys.stderr)
+    if old.get("version") != new.get("version"):
+        print("Warning: the runs come from different benchmark versions; stages may not match",
+              file=sys.stderr)
+    if old.get("machine") != new.get("machine"):
+        print("Warning: the runs come from different machines", file=sys.stderr)
+
+    regressions = 0
+    for metric, before, after, change, regressed in compare_results(old, new, args.threshold):
+        flag = "REGRESSION" if regressed else ""
+        print(f"{metric:34} {before:10.4f} {after:10.4f} {change * 100:+7.1f}%  {flag}")
+        regressions += regressed
+    print(f"{regressions} regression(s) over {args.threshold * 100:.0f}%")
+    return 1 if regressions else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="md2pdf-benchmark", description="Conversion benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    generate = sub.add_parser("generate", help="Write the synthetic corpus")
+    generate.add_argument("directory")
+    generate.add_argument("--seed", type=int, default=1)
+    generate.add_argument("--copies", type=int, default=2, help="Documents per profile")
+    generate.set_defaults(func=cmd_generate)
+
+    run = sub.add_parser("run", help="Convert the corpus and save the measurements")
+    run.add_argument("corpus")
+    run.add_argument("-o", "--output", default="benchmark.json")
+    run.add_argument("-j", "--jobs", type=int, default=4, help="Documents in flight for the batch pass")
+    run.add_argument("--pool", type=int, default=0, help="Render through this many warm pages")
+    run.add_argument("--repeat", type=int, default=1, help="Sequential passes over the corpus")
+    run.add_argument("--no-docx", action="store_true", help="Skip the PDF to DOCX stage")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="Flag regressions between two runs")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.1,
+                         help="Relative change that counts as a regression (0.1 = 10%%)")
+    compare.set_defaults(func=cmd_compare)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from PyQt6.QtCore import QEventLoop, QObject, QTimer, pyqtSignal
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    import fitz
+
+MANIFEST_NAME = "book.json"
+HEADING_RE = re.compile(r'<h([1-6])\b[^>]*>(.*?)</h\1>', re.DOTALL)
+TAG_RE = re.compile(r'<[^>]+>')
+
+TOC_STYLE = """<style>
+.book-toc .toc-entry { display: flex; align-items: baseline; margin: 0.35em 0; }
+.book-toc .toc-leader { flex: 1; border-bottom: 1px dotted #999; margin: 0 0.4em; min-width: 2em; }
+.book-toc .level-1 { font-weight: bold; margin-top: 0.8em; }
+.book-toc .level-2 { padding-left: 1.5em; }
+.book-toc .level-3 { padding-left: 3em; }
+</style>"""
+
+
+def chapter_headings(html_body):
+    """[(level, text)] of the headings in a rendered chapter, in document order"""
+    headings = []
+    for match in HEADING_RE.finditer(html_body):
+        text = html.unescape(TAG_RE.sub("", match.group(2)))
+        text = " ".join(text.replace("¶", "").split())
+        if text:
+            headings.append((int(match.group(1)), text))
+    return headings
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def locate_headings(doc, headings):
+    """0-based page of each heading, found by searching the page text in order.
+
+    A heading that can't be found (hyphenated, ligatures...) is put on the
+    page of the heading before it.
+    """
+    texts = [normalize(page.get_text()) for page in doc]
+    pages = []
+    current = 0
+    for _, text in headings:
+        needle = normalize(text)
+        for i in range(current, len(texts)):
+            if needle in texts[i]:
+                current = i
+                break
+        pages.append(current)
+    return pages
+
+
+class Chapter:
+    def __init__(self, input_path, pdf_path):
+        self.input_path = input_path
+        self.pdf_path = pdf_path
+        self.key = None
+        self.headings = []
+        self.title = os.path.splitext(os.path.basename(input_path))[0]
+        self.rendered = False
+        self.page_count = 0
+        self.heading_pages = []
+
+
+class BookBuilder(QObject):
+    """Combines several Markdown chapters into one PDF.
+
+    Chapters are rendered in parallel into their own PDFs in build_dir and
+    merged with PyMuPDF, so nothing is rendered twice. A manifest remembers
+    the render key (source, assets and settings, see
+    Md2PdfConverter.cache_key) of every chapter PDF; on the next build only
+    chapters whose key changed are rendered again before re-merging.
+
+    The merged book gets a table of contents page (rendered like any other
+    document), bookmarks for the chapters and their headings, and page
+    numbers stamped over the whole book.
+    """
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(bool)
+
+    def __init__(self, converter, chapters, output_path, build_dir=None, max_in_flight=4,
+                 toc=True, toc_title="İçindekiler", toc_depth=2, bookmark_depth=3,
+                 page_numbers=True, parent=None):
+        super().__init__(parent)
+        self.converter = converter
+        self.output_path = os.path.abspath(output_path)
+        if not build_dir:
+            stem = os.path.splitext(os.path.basename(self.output_path))[0]
+            build_dir = os.path.join(os.path.dirname(self.output_path), f".{stem}.book")
+        self.build_dir = build_dir
+        self.max_in_flight = max_in_flight
+        self.toc = toc
+        self.toc_title = toc_title
+        self.toc_depth = toc_depth
+        self.bookmark_depth = bookmark_depth
+        self.page_numbers = page_numbers
+        self.chapters = []
+        for path in chapters:
+            path = os.path.abspath(path)
+            name = hashlib.sha1(path.encode("utf-8")).hexdigest()[:16]
+            self.chapters.append(Chapter(path, os.path.join(build_dir, name + ".pdf")))
+        self.manifest = {}
+        self.pending = {}
+        self.batch = None
+        self.failed = []
+        self.done = False
+        self.ok = False
+        self.page_count = 0
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def build(self):
+        """Synchronous wrapper around start()"""
+        loop = QEventLoop()
+        self.finished.connect(lambda ok: loop.quit())
+        self.start()
+        if not self.done:
+            loop.exec()
+        return self.ok
+
+    def start(self):
+        self.started = time.perf_counter()
+        try:
+            os.makedirs(self.build_dir, exist_ok=True)
+            self.manifest = self.load_manifest()
+            stale = []
+            for chapter in self.chapters:
+                html_body = self.converter.render_file(chapter.input_path)
+                chapter.key = self.converter.cache_key(chapter.input_path, html_body)
+                chapter.headings = chapter_headings(html_body)
+                if chapter.headings:
+                    top = min(level for level, _ in chapter.headings)
+                    chapter.title = next(text for level, text in chapter.headings if level == top)
+                known = self.manifest.get(chapter.input_path)
+                if not (known and known.get("key") == chapter.key and os.path.exists(chapter.pdf_path)):
+                    stale.append(chapter)
+        except Exception as e:
+            print(f"Book: {e}")
+            self.finish(False)
+            return
+
+        print(f"Book: {len(stale)} of {len(self.chapters)} chapters need rendering")
+        if not stale:
+            QTimer.singleShot(0, self.assemble)
+            return
+        self.pending = {c.input_path: c for c in stale}
+        self.batch = self.converter.convert_many([(c.input_path, c.pdf_path) for c in stale],
+                                                 max_in_flight=self.max_in_flight,
+                                                 on_result=self.on_chapter_rendered)
+        if self.batch.done:
+            QTimer.singleShot(0, self.assemble)
+        else:
+            # Merging prints the TOC page, which must not happen inside the renderer's callback
+            self.batch.finished.connect(lambda: QTimer.singleShot(0, self.assemble))
+
+    def on_chapter_rendered(self, result):
+        chapter = self.pending.get(result.input_path)
+        if chapter is None:
+            return
+        if result.ok:
+            chapter.rendered = True
+            self.manifest[chapter.input_path] = {"key": chapter.key}
+        else:
+            print(f"Book: chapter failed: {result.input_path}: {result.error}")
+            self.manifest.pop(chapter.input_path, None)
+            self.failed.append(chapter)
+        self.progress.emit(sum(1 for c in self.chapters if c.rendered) + len(self.failed),
+                           len(self.pending))
+
+    def assemble(self):
+        ok = False
+        try:
+            self.save_manifest()
+            if not self.failed:
+                self.merge()
+                ok = True
+        except Exception as e:
+            print(f"Book: merge failed: {e}")
+            import traceback
+            traceback.print_exc()
+        self.finish(ok)
+
+    def finish(self, ok):
+        self.ok = ok
+        self.done = True
+        self.elapsed = time.perf_counter() - self.started
+        self.finished.emit(ok)
+
+    def merge(self):
+        for chapter in self.chapters:
+            with fitz.open(chapter.pdf_path) as doc:
+                chapter.page_count = doc.page_count
+                chapter.heading_pages = locate_headings(doc, chapter.headings)
+
+        book = fitz.open()
+        try:
+            toc_pages = 0
+            toc_pdf = None
+            if self.toc:
+                toc_pdf, toc_pages = self.render_toc()
+                with fitz.open(toc_pdf) as doc:
+                    book.insert_pdf(doc)
+
+            for chapter in self.chapters:
+                with fitz.open(chapter.pdf_path) as doc:
+                    book.insert_pdf(doc)
+
+            book.set_toc(self.bookmarks(toc_pages))
+            if self.toc:
+                self.link_toc(book, toc_pages)
+            if self.page_numbers:
+                self.stamp_page_numbers(book)
+            self.page_count = book.page_count
+
+            os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+            tmp_path = self.output_path + ".part"
+            book.save(tmp_path, garbage=1, deflate=True)
+        finally:
+            book.close()
+        os.replace(tmp_path, self.output_path)
+
+    def entries(self, depth, first_page):
+        """[(level, title, 1-based page)] with each chapter title at level 1.
+
+        Levels never jump by more than one, as PDF outlines require.
+        """
+        entries = []
+        page = first_page
+        for chapter in self.chapters:
+            entries.append((1, chapter.title, page + 1))
+            base = min((level for level, _ in chapter.headings), default=1)
+            previous = 1
+            seen_title = False
+            for (level, text), heading_page in zip(chapter.headings, chapter.heading_pages):
+                if not seen_title and level == base and text == chapter.title:
+                    seen_title = True
+                    continue
+                level = min(max(2, level - base + 1), previous + 1)
+                if level <= depth:
+                    entries.append((level, text, page + heading_page + 1))
+                    previous = level
+            page += chapter.page_count
+        return entries
+
+    def bookmarks(self, toc_pages):
+        toc = []
+        if self.toc:
+            toc.append([1, self.toc_title, 1])
+        toc += [list(entry) for entry in self.entries(self.bookmark_depth, toc_pages)]
+        return toc
+
+    def render_toc(self):
+        """Prints the contents pages; returns (pdf_path, page_count).
+
+        The page numbers depend on how many pages the contents take, so it is
+        rendered again until that count settles (once for most books).
+        """
+        # Not .md, so a build dir inside the chapter folder is never taken for a chapter
+        md_path = os.path.join(self.build_dir, "toc.txt")
+        pdf_path = os.path.join(self.build_dir, "toc.pdf")
+        toc_pages = 1
+        for _ in range(4):
+            with open(md_path, "w", encoding="utf-8") as f:
+                f.write(self.toc_markdown(self.entries(self.toc_depth, toc_pages)))
+            if not self.converter.convert(md_path, pdf_path):
+                raise RuntimeError("table of contents could not be rendered")
+            with fitz.open(pdf_path) as doc:
+                count = doc.page_count
+            if count == toc_pages:
+                break
+            toc_pages = count
+        return pdf_path, toc_pages
+
+    def toc_markdown(self, entries):
+        lines = [f"# {self.toc_title}", "", TOC_STYLE, "", '<div class="book-toc">']
+        for level, text, page in entries:
+            lines.append(f'<div class="toc-entry level-{level}"><span class="toc-title">{html.escape(text)}</span>'
+                         f'<span class="toc-leader"></span><span class="toc-page">{page}</span></div>')
+        lines += ["</div>", ""]
+        return "\n".join(lines)
+
+    def link_toc(self, book, toc_pages):
+        """Makes the contents entries clickable"""
+        page_index = 0
+        last_y = -1.0
+        for level, text, target in self.entries(self.toc_depth, toc_pages):
+            for i in range(page_index, toc_pages):
+                page = book[i]
+                hits = [r for r in page.search_for(text) if i > page_index or r.y0 > last_y]
+                if hits:
+                    rect = hits[0]
+                    page.insert_link({"kind": fitz.LINK_GOTO, "from": rect,
+                                      "page": target - 1, "to": fitz.Point(0, 0)})
+                    page_index, last_y = i, rect.y0
+                    break
+
+    @staticmethod
+    def stamp_page_numbers(book, font_size=9):
+        for page in book:
+            label = str(page.number + 1)
+            width = fitz.get_text_length(label, fontname="helv", fontsize=font_size)
+            rect = page.rect
+            page.insert_text(((rect.width - width) / 2, rect.height - 20), label,
+                             fontname="helv", fontsize=font_size, color=(0.4, 0.4, 0.4))
+
+    def load_manifest(self):
+        path = os.path.join(self.build_dir, MANIFEST_NAME)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f).get("chapters", {})
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self):
+        path = os.path.join(self.build_dir, MANIFEST_NAME)
+        with open(path + ".part", "w", encoding="utf-8") as f:
+            json.dump({"chapters": self.manifest}, f, indent=1)
+        os.replace(path + ".part", path)
+
+    def stats(self):
+        return {
+            "chapters": len(self.chapters),
+            "rendered": sum(1 for c in self.chapters if c.rendered),
+            "failed": len(self.failed),
+            "pages": self.page_count,
+            "seconds": round(self.elapsed, 3),
+        }
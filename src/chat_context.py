@@ -0,0 +1,247 @@
+import difflib
+import re
+
+from incremental import ATX_HEADING_RE, FENCE_RE
+
+WORD_RE = re.compile(r'\w{4,}', re.UNICODE)
+MARKER_RE = re.compile(r'<<<(UPDATE|PATCH)>>>.*?<<<END>>>', re.DOTALL)
+
+
+def estimate_tokens(text):
+    """Rough token count; about 3.5 characters per token for Turkish and English text"""
+    return int(len(text) / 3.5) + 1
+
+
+def split_sections(text):
+    """[(start, end, title)] character ranges, one per ATX heading (fences skipped).
+
+    Text before the first heading is a section with an empty title.
+    """
+    starts = [(0, "")]
+    offset = 0
+    fence = None
+    for line in text.splitlines(keepends=True):
+        match = FENCE_RE.match(line)
+        if fence is not None:
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                fence = None
+        elif match:
+            fence = match.group(1)
+        else:
+            heading = ATX_HEADING_RE.match(line)
+            if heading:
+                starts.append((offset, line.strip()))
+        offset += len(line)
+    sections = []
+    for i, (start, title) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(text)
+        if end > start or not sections:
+            sections.append((start, end, title))
+    return sections
+
+
+def summary_line(text, limit=160):
+    text = " ".join(MARKER_RE.sub("[belge güncellendi]", text).split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class ChatContext:
+    """Builds the messages for each assistant request within a token budget.
+
+    Only the latest request carries the editor text, and only one full copy
+    of the document stays in the history: while it is still there, later
+    requests send a diff against it instead. Documents larger than
+    document_tokens are sent as an outline plus the sections around the
+    cursor/selection and the ones whose headings or text match the request,
+    unless the full text is required (canvas mode). Old turns that don't fit
+    max_tokens are dropped and kept only as a one-line summary each.
+    """
+
+    def __init__(self, max_tokens=16000, document_tokens=8000, summary_tokens=600):
+        self.max_tokens = max_tokens
+        self.document_tokens = document_tokens
+        self.summary_tokens = summary_tokens
+        # {"request", "context", "reply"}; context is only kept on the snapshot turn
+        self.turns = []
+        self.summary = []
+        self.snapshot = None
+        self.snapshot_turn = None
+        self.last_stats = {}
+
+    def reset(self):
+        self.turns = []
+        self.summary = []
+        self.snapshot = None
+        self.snapshot_turn = None
+
+    def build(self, request, document, prompt="", focus=None, require_full=False):
+        """Messages for a new request; call add_reply() or discard_pending() afterwards.
+
+        focus is the (start, end) of the cursor or selection in document.
+        """
+        self.discard_pending()
+        context, mode = self.document_context(request, document, focus, require_full)
+        if mode not in ("diff", "unchanged"):
+            # The new request carries the document itself
+            self.snapshot = None
+            self.snapshot_turn = None
+        # Older diffs, sections and replaced copies of the document are not sent
+        # again, so the history is priced without them
+        self.clear_contexts()
+        current = {"request": request, "context": context, "reply": None}
+        content = self.user_content(prompt, current)
+        history = self.fit_history(self.max_tokens - estimate_tokens(content))
+
+        if mode in ("diff", "unchanged") and not any(t is self.snapshot_turn for t in history):
+            # The copy the diff refers to no longer fits; send the document again
+            self.snapshot = None
+            self.snapshot_turn = None
+            self.clear_contexts()
+            context, mode = self.document_context(request, document, focus, require_full)
+            current["context"] = context
+            content = self.user_content(prompt, current)
+            history = self.fit_history(self.max_tokens - estimate_tokens(content))
+
+        if mode == "full":
+            self.snapshot = document
+            self.snapshot_turn = current
+
+        self.drop_turns(history)
+        self.turns.append(current)
+
+        messages = []
+        for turn in history:
+            messages.append({"role": "user", "content": self.user_content("", turn)})
+            messages.append({"role": "assistant", "content": self.reply_content(turn)})
+        messages.append({"role": "user", "content": content})
+        if self.summary:
+            note = "Önceki konuşmanın özeti:\n" + "\n".join(self.summary)
+            messages[0]["content"] = note + "\n\n" + messages[0]["content"]
+
+        tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        self.last_stats = {"mode": mode, "tokens": tokens, "turns": len(history),
+                           "summarized": len(self.summary)}
+        return messages
+
+    def clear_contexts(self):
+        for turn in self.turns:
+            if turn is not self.snapshot_turn:
+                turn["context"] = ""
+
+    def add_reply(self, reply):
+        if self.turns and self.turns[-1]["reply"] is None:
+            self.turns[-1]["reply"] = reply
+
+    def discard_pending(self):
+        """Forgets a request that never got a reply (e.g. after an API error)"""
+        if self.turns and self.turns[-1]["reply"] is None:
+            turn = self.turns.pop()
+            if turn is self.snapshot_turn:
+                self.snapshot = None
+                self.snapshot_turn = None
+
+    def document_context(self, request, document, focus, require_full):
+        """(text, mode) describing the editor content for the new request"""
+        tokens = estimate_tokens(document)
+        if self.snapshot is not None:
+            if document == self.snapshot:
+                return "Editör içeriği önceki mesajdaki halinden beri değişmedi.", "unchanged"
+            diff = "".join(difflib.unified_diff(self.snapshot.splitlines(keepends=True),
+                                                document.splitlines(keepends=True),
+                                                "önceki", "şimdiki", n=2))
+            if estimate_tokens(diff) < min(tokens // 3, self.document_tokens):
+                return ("Editör içeriği önceki mesajdaki halinden bu farkla değişti:\n"
+                        f"```diff\n{diff}```"), "diff"
+
+        if require_full or tokens <= self.document_tokens:
+            return f"Aktif Editör İçeriği (Referans):\n```markdown\n{document}\n```", "full"
+        return self.sections_context(request, document, focus), "sections"
+
+    def sections_context(self, request, document, focus):
+        sections = split_sections(document)
+        words = {w.casefold() for w in WORD_RE.findall(request)}
+        start, end = focus or (0, 0)
+
+        def score(section):
+            s_start, s_end, title = section
+            value = 0
+            if s_start <= end and start < s_end or s_start <= start < s_end:
+                value += 100
+            title_words = {w.casefold() for w in WORD_RE.findall(title)}
+            value += 10 * len(words & title_words)
+            body = document[s_start:s_end].casefold()
+            value += sum(min(body.count(w), 3) for w in words)
+            return value
+
+        outline = [title for _, _, title in sections if title]
+        budget = self.document_tokens - estimate_tokens("\n".join(outline))
+        ranked = sorted(range(len(sections)),
+                        key=lambda i: (-score(sections[i]), abs(sections[i][0] - start)))
+        chosen = set()
+        for i in ranked:
+            cost = estimate_tokens(document[sections[i][0]:sections[i][1]])
+            if cost <= budget:
+                chosen.add(i)
+                budget -= cost
+            elif not chosen:
+                # The section at the cursor alone is too big: send the part around the cursor
+                s_start, s_end, _ = sections[i]
+                half = int(budget * 3.5 / 2)
+                chosen.add((max(s_start, start - half), min(s_end, end + half)))
+                break
+
+        parts = []
+        skipped = 0
+        for i, (s_start, s_end, _) in enumerate(sections):
+            if i in chosen:
+                if skipped:
+                    parts.append(f"[... {skipped} bölüm atlandı ...]\n")
+                    skipped = 0
+                parts.append(document[s_start:s_end])
+            else:
+                skipped += 1
+        for item in chosen:
+            if isinstance(item, tuple):
+                parts.append("[...]\n" + document[item[0]:item[1]] + "\n[...]\n")
+        if skipped:
+            parts.append(f"[... {skipped} bölüm atlandı ...]\n")
+
+        lines = document.count("\n") + 1
+        return (f"Editör içeriği {lines} satır; tamamı yerine başlıkları ve ilgili bölümleri:\n"
+                "Başlıklar:\n" + "\n".join(outline) + "\n\n"
+                f"İlgili bölümler:\n```markdown\n{''.join(parts)}\n```")
+
+    def user_content(self, prompt, turn):
+        parts = [prompt] if prompt else []
+        parts.append(f"Kullanıcı İsteği: {turn['request']}")
+        if turn["context"]:
+            parts.append(turn["context"])
+        return "\n\n".join(parts)
+
+    @staticmethod
+    def reply_content(turn):
+        # The editor text is in the snapshot/diff; the rewrite or patch is not needed twice
+        return MARKER_RE.sub(r"<<<\1>>>[editör içeriği güncellendi]<<<END>>>", turn["reply"])
+
+    def fit_history(self, budget):
+        """The newest answered turns that fit the budget (the summary takes its share first)"""
+        budget -= self.summary_tokens
+        history = []
+        for turn in reversed([t for t in self.turns if t["reply"] is not None]):
+            cost = estimate_tokens(self.user_content("", turn)) + estimate_tokens(self.reply_content(turn))
+            if cost > budget:
+                break
+            history.insert(0, turn)
+            budget -= cost
+        return history
+
+    def drop_turns(self, history):
+        """Replaces the turns that did not fit with summary lines"""
+        kept = set(map(id, history))
+        for turn in self.turns:
+            if id(turn) not in kept and turn["reply"] is not None:
+                self.summary.append(f"- Kullanıcı: {summary_line(turn['request'])}")
+                self.summary.append(f"  Asistan: {summary_line(turn['reply'])}")
+        self.turns = list(history)
+        while self.summary and estimate_tokens("\n".join(self.summary)) > self.summary_tokens:
+            del self.summary[:2]
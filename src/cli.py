@@ -0,0 +1,463 @@
+"""Headless command-line batch converter.
+
+    python src/cli.py convert "docs/**/*.md" -o out/ -j 8 --docx
+    python src/cli.py book chapters/ -o book.pdf
+    python src/cli.py watch docs/ -o out/
+
+Every processed file is reported as one JSON line on stdout; converter logs
+go to stderr. Exit code is 0 when everything converted, 1 when at least one
+file failed and 2 when no input files were found.
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import signal
+import sys
+import time
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_NO_INPUT = 2
+
+
+def collect_inputs(patterns):
+    """Expands files, directories (recursively) and glob patterns into .md paths"""
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                found += [os.path.join(root, f) for f in sorted(files) if f.lower().endswith('.md')]
+        elif glob.has_magic(pattern):
+            found += [p for p in sorted(glob.glob(pattern, recursive=True))
+                      if os.path.isfile(p) and p.lower().endswith('.md')]
+        elif os.path.isfile(pattern):
+            found.append(pattern)
+
+    unique = []
+    seen = set()
+    for path in found:
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    return unique
+
+
+def plan_outputs(inputs, output_dir):
+    """Maps each input to its PDF path, mirroring the source tree under output_dir"""
+    if not output_dir:
+        return [(p, os.path.splitext(p)[0] + ".pdf") for p in inputs]
+
+    root = os.path.commonpath([os.path.dirname(p) for p in inputs])
+    jobs = []
+    for path in inputs:
+        rel = os.path.relpath(os.path.splitext(path)[0] + ".pdf", root)
+        jobs.append((path, os.path.join(os.path.abspath(output_dir), rel)))
+    return jobs
+
+
+def is_up_to_date(input_path, output_path, docx, pdf=True):
+    outputs = [output_path] if pdf else []
+    if docx:
+        outputs.append(os.path.splitext(output_path)[0] + ".docx")
+    source_mtime = os.path.getmtime(input_path)
+    return all(os.path.exists(o) and os.path.getmtime(o) >= source_mtime for o in outputs)
+
+
+class Reporter:
+    """Writes one JSON record per file and keeps the counts for the exit code"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.converted = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def emit(self, record):
+        status = record["status"]
+        if status == "ok":
+            self.converted += 1
+        elif status == "skipped":
+            self.skipped += 1
+        else:
+            self.failed += 1
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+    def result(self, result, docx_seconds=None, docx_ok=True, pdf=True):
+        """pdf=False: a --no-pdf run, result.elapsed is the DOCX time"""
+        ok = result.ok and docx_ok
+        record = {
+            "input": result.input_path,
+            "output": result.output_path if pdf else docx_path_for(result.output_path),
+            "status": "ok" if ok else "failed",
+        }
+        if pdf:
+            record["pdf_seconds"] = round(result.elapsed, 4)
+        elif docx_seconds is None:
+            docx_seconds = result.elapsed
+        if docx_seconds is not None:
+            record["docx_seconds"] = round(docx_seconds, 4)
+        if result.cached:
+            record["cached"] = True
+        if not ok:
+            record["error"] = result.error or "DOCX conversion failed"
+        self.emit(record)
+
+
+def make_cache(args):
+    if args.cache is None:
+        return None
+    from render_cache import RenderCache
+    return RenderCache(args.cache or None, max_bytes=args.cache_max_mb * 1024 * 1024,
+                       hardlink=args.cache_hardlink)
+
+
+def docx_options(args):
+    """pdf2docx options from the command line"""
+    return {
+        "start": args.docx_start,
+        "end": args.docx_end,
+        "pages": args.docx_pages,
+        "multi_processing": args.docx_multi_processing,
+        "cpu_count": args.docx_cpu_count,
+    }
+
+
+def streaming_options(args):
+    return {
+        "streaming_threshold": args.stream_threshold_mb * 1024 * 1024,
+        "stream_part_bytes": args.stream_part_mb * 1024 * 1024 if args.stream_part_mb else None,
+    }
+
+
+def docx_path_for(output_path):
+    return os.path.splitext(output_path)[0] + ".docx"
+
+
+def export_docx_only(converter, jobs, reporter):
+    """--no-pdf: Markdown straight to DOCX, one document after the other"""
+    from batch import RenderResult
+
+    for input_path, output_path in jobs:
+        docx_path = docx_path_for(output_path)
+        started = time.perf_counter()
+        ok = converter.export_docx(input_path, docx_path)
+        reporter.result(RenderResult(input_path, docx_path, ok, "" if ok else "DOCX export failed"),
+                        docx_seconds=time.perf_counter() - started, pdf=False)
+
+
+def start_converter(args):
+    """QApplication, highlight cache and converter for an in-process run"""
+    from PyQt6.QtWidgets import QApplication
+    from converter import Md2PdfConverter
+    import offline_bundle
+    import highlight_cache
+
+    offline_bundle.register_scheme()
+    highlights = highlight_cache.install(highlight_cache.HighlightCache(persist_path=args.highlight_cache))
+    app = QApplication.instance() or QApplication([])
+    converter = Md2PdfConverter(render_timeout=args.render_timeout, offline=args.offline,
+                                cache=make_cache(args), prerender=args.prerender,
+                                **streaming_options(args))
+    if args.trace:
+        from tracing import tracer_for
+        converter.tracer = tracer_for(args.trace)
+    return app, converter, highlights
+
+
+def close_trace(tracer):
+    if tracer.enabled:
+        tracer.close()
+        print(f"Trace: {json.dumps(tracer.stats())}")
+
+
+def run_in_process(jobs, args, reporter):
+    app, converter, highlights = start_converter(args)
+
+    if args.no_pdf:
+        export_docx_only(converter, jobs, reporter)
+        highlights.save()
+        close_trace(converter.tracer)
+        return
+
+    # DOCX runs in its own process pool while the next PDFs render
+    direct = args.docx and args.docx_engine == "direct"
+    direct_results = []
+    docx_stage = None
+    if args.docx and not direct:
+        from docx_stage import DocxStage
+        docx_stage = DocxStage(converter, max_workers=args.docx_workers, options=docx_options(args))
+        docx_stage.job_finished.connect(
+            lambda docx: reporter.result(docx.tag, docx.elapsed, docx.ok))
+
+    def on_result(result):
+        if result.ok and docx_stage is not None:
+            docx_stage.submit(result.output_path, tag=result)
+        elif result.ok and direct:
+            # Exported once the batch is done; it needs no Chromium page per document
+            direct_results.append(result)
+        else:
+            reporter.result(result)
+
+    def quit_when_done():
+        if batch.done and (docx_stage is None or docx_stage.is_idle()):
+            app.quit()
+
+    batch = converter.convert_many(jobs, max_in_flight=args.jobs, on_result=on_result)
+    batch.finished.connect(quit_when_done)
+    if docx_stage is not None:
+        docx_stage.idle.connect(quit_when_done)
+    if not (batch.done and (docx_stage is None or docx_stage.is_idle())):
+        app.exec()
+    for result in direct_results:
+        started = time.perf_counter()
+        docx_ok = converter.export_docx(result.input_path, docx_path_for(result.output_path))
+        reporter.result(result, time.perf_counter() - started, docx_ok)
+    if docx_stage is not None:
+        print(f"DOCX stage: {json.dumps(docx_stage.stats())}")
+        docx_stage.close()
+    if converter.cache is not None:
+        print(f"Render cache: {json.dumps(converter.cache.stats())}")
+    if converter.prerenderer is not None:
+        print(f"Prerender: {json.dumps(converter.prerenderer.stats())}")
+    highlights.save()
+    print(f"Highlight cache: {json.dumps(highlights.stats())}")
+    close_trace(converter.tracer)
+
+
+def run_in_farm(jobs, args, reporter):
+    from farm import ConversionFarm
+
+    farm = ConversionFarm(workers=args.jobs, job_timeout=args.job_timeout, docx=args.docx,
+                          docx_options=docx_options(args), docx_engine=args.docx_engine,
+                          pdf=not args.no_pdf,
+                          converter_options={"render_timeout": args.render_timeout,
+                                             "offline": args.offline,
+                                             "cache": make_cache(args),
+                                             "prerender": args.prerender,
+                                             **streaming_options(args)})
+    for input_path, output_path in jobs:
+        farm.submit(input_path, output_path)
+
+    # Workers are separate processes; the trace only has one span per document
+    tracer = None
+    if args.trace:
+        from tracing import tracer_for
+        tracer = tracer_for(args.trace)
+
+    def on_result(done, total, result):
+        if tracer is not None:
+            tracer.record("convert", time.perf_counter() - result.elapsed, result.elapsed,
+                          result.input_path, ok=result.ok, worker=True)
+        reporter.result(result, pdf=not args.no_pdf)
+
+    farm.run(on_result)
+    if tracer is not None:
+        close_trace(tracer)
+
+
+def cmd_convert(args):
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("No Markdown files matched.", file=sys.stderr)
+        return EXIT_NO_INPUT
+
+    out = sys.stdout
+    reporter = Reporter(out)
+    if args.no_pdf:
+        if args.docx_engine != "direct":
+            print("--no-pdf needs --docx-engine direct", file=sys.stderr)
+            return EXIT_FAILED
+        args.docx = True
+
+    jobs = []
+    for input_path, output_path in plan_outputs(inputs, args.output_dir):
+        if args.changed_only and is_up_to_date(input_path, output_path, args.docx, not args.no_pdf):
+            reporter.emit({"input": input_path, "output": output_path, "status": "skipped"})
+            continue
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        jobs.append((input_path, output_path))
+
+    started = time.perf_counter()
+    if jobs:
+        # Keep stdout machine-readable: converter logs go to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            if args.processes:
+                run_in_farm(jobs, args, reporter)
+            else:
+                run_in_process(jobs, args, reporter)
+
+    print(f"{reporter.converted} converted, {reporter.skipped} skipped, {reporter.failed} failed "
+          f"in {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    return EXIT_FAILED if reporter.failed else EXIT_OK
+
+
+def cmd_book(args):
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("No Markdown files matched.", file=sys.stderr)
+        return EXIT_NO_INPUT
+
+    reporter = Reporter(sys.stdout)
+    with contextlib.redirect_stdout(sys.stderr):
+        from book import BookBuilder
+
+        app, converter, highlights = start_converter(args)
+        builder = BookBuilder(converter, inputs, args.output, build_dir=args.build_dir,
+                              max_in_flight=args.jobs, toc=not args.no_toc, toc_title=args.toc_title,
+                              toc_depth=args.toc_depth, page_numbers=not args.no_page_numbers)
+        ok = builder.build()
+        highlights.save()
+        close_trace(converter.tracer)
+
+    stats = builder.stats()
+    reporter.emit({"output": builder.output_path, "status": "ok" if ok else "failed", **stats})
+    print(f"{stats['chapters']} chapters, {stats['rendered']} rendered, {stats['pages']} pages "
+          f"in {stats['seconds']:.2f} s", file=sys.stderr)
+    return EXIT_OK if ok else EXIT_FAILED
+
+
+def cmd_watch(args):
+    targets = [os.path.abspath(p) for p in args.inputs if os.path.isdir(p)]
+    targets += collect_inputs([p for p in args.inputs if not os.path.isdir(p)])
+    if not targets:
+        print("No Markdown files matched.", file=sys.stderr)
+        return EXIT_NO_INPUT
+
+    root = os.path.commonpath([t if os.path.isdir(t) else os.path.dirname(t) for t in targets])
+
+    def output_path_for(input_path):
+        pdf_path = os.path.splitext(input_path)[0] + ".pdf"
+        if not args.output_dir:
+            return pdf_path
+        return os.path.join(os.path.abspath(args.output_dir), os.path.relpath(pdf_path, root))
+
+    reporter = Reporter(sys.stdout)
+    with contextlib.redirect_stdout(sys.stderr):
+        from PyQt6.QtCore import QTimer
+        from watcher import ChangeWatcher
+
+        app, converter, highlights = start_converter(args)
+        watcher = ChangeWatcher(converter, output_path_for, debounce_ms=args.debounce_ms,
+                                max_in_flight=args.jobs)
+        watcher.converted.connect(lambda result: reporter.result(result))
+        for target in targets:
+            watcher.add_path(target)
+        stale = [p for p in sorted(watcher.inputs)
+                 if not is_up_to_date(p, output_path_for(p), docx=False)]
+        if stale:
+            watcher.render(stale)
+
+        # Qt's loop never returns to Python on its own, so Ctrl+C needs a tick
+        signal.signal(signal.SIGINT, lambda *_: app.quit())
+        tick = QTimer()
+        tick.timeout.connect(lambda: None)
+        tick.start(200)
+        print(f"Watching {len(watcher.inputs)} files, press Ctrl+C to stop")
+        app.exec()
+        watcher.stop()
+        highlights.save()
+        close_trace(converter.tracer)
+    print(f"{reporter.converted} converted, {reporter.failed} failed", file=sys.stderr)
+    return EXIT_OK
+
+
+def add_render_options(parser):
+    parser.add_argument("--render-timeout", type=int, default=10000,
+                        help="Max wait for Mermaid/MathJax in ms")
+    parser.add_argument("--offline", action="store_true",
+                        help="Only use the local MathJax/Mermaid bundle, never the CDN")
+    parser.add_argument("--cache", nargs="?", const="", metavar="DIR",
+                        help="Reuse outputs of unchanged documents from a render cache "
+                             "(default dir: ~/.cache/md2pdf/renders)")
+    parser.add_argument("--cache-max-mb", type=int, default=1024, help="Render cache size limit")
+    parser.add_argument("--cache-hardlink", action="store_true",
+                        help="Hardlink cached outputs instead of copying them")
+    parser.add_argument("--prerender", action="store_true",
+                        help="Render Mermaid/MathJax to cached SVG once, so pages print without JS")
+    parser.add_argument("--highlight-cache", metavar="FILE",
+                        help="Persist highlighted code blocks between runs in this JSON file")
+    parser.add_argument("--stream-threshold-mb", type=int, default=1,
+                        help="Files from this size on are converted in chunks with bounded memory "
+                             "(0 disables)")
+    parser.add_argument("--stream-part-mb", type=int, default=64,
+                        help="Print streamed documents in parts of this much HTML and merge the "
+                             "PDFs (0: one part)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Write per-stage timings: Chrome trace format (open in ui.perfetto.dev), "
+                             "or JSON lines if FILE ends in .jsonl")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="md2pdf", description="Markdown to PDF batch converter")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="Convert Markdown files to PDF")
+    convert.add_argument("inputs", nargs="+", help="Files, directories or glob patterns (** is recursive)")
+    convert.add_argument("-o", "--output-dir", help="Output directory (default: next to each source)")
+    convert.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                         help="Documents rendered in parallel")
+    convert.add_argument("--processes", action="store_true",
+                         help="Use one worker process per job slot instead of pages in one process")
+    convert.add_argument("--docx", action="store_true", help="Also convert each PDF to Word (.docx)")
+    convert.add_argument("--docx-engine", choices=["pdf2docx", "direct"], default="pdf2docx",
+                         help="pdf2docx converts the rendered PDF; direct builds the DOCX from the "
+                              "Markdown (much faster, diagrams and math as images)")
+    convert.add_argument("--no-pdf", action="store_true",
+                         help="Only write DOCX (with --docx-engine direct)")
+    convert.add_argument("--docx-workers", type=int,
+                         help="Parallel PDF to DOCX conversions (default: half the CPUs)")
+    convert.add_argument("--docx-start", type=int, help="First PDF page to convert to DOCX (0-based)")
+    convert.add_argument("--docx-end", type=int, help="Stop DOCX conversion before this page (0-based)")
+    convert.add_argument("--docx-pages", type=lambda v: [int(p) for p in v.split(",")],
+                         metavar="N,N,...", help="Only these PDF pages (0-based) go to DOCX")
+    convert.add_argument("--docx-multi-processing", action="store_true",
+                         help="Let pdf2docx split each document's pages over several processes")
+    convert.add_argument("--docx-cpu-count", type=int, default=0,
+                         help="Processes per document with --docx-multi-processing (0: all CPUs)")
+    convert.add_argument("--changed-only", action="store_true",
+                         help="Skip files whose outputs are newer than the source")
+    add_render_options(convert)
+    convert.add_argument("--job-timeout", type=int, default=300,
+                         help="Per-file timeout in seconds (with --processes)")
+    convert.set_defaults(func=cmd_convert)
+
+    book = sub.add_parser("book", help="Combine chapter files into one PDF")
+    book.add_argument("inputs", nargs="+",
+                      help="Chapters in book order (directories and globs are sorted by name)")
+    book.add_argument("-o", "--output", required=True, help="PDF file to write")
+    book.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                      help="Chapters rendered in parallel")
+    book.add_argument("--build-dir",
+                      help="Where chapter PDFs are kept between builds (default: .NAME.book next to the output)")
+    book.add_argument("--toc-title", default="İçindekiler", help="Heading of the contents page")
+    book.add_argument("--toc-depth", type=int, default=2, help="Heading levels listed on the contents page")
+    book.add_argument("--no-toc", action="store_true", help="Leave out the contents page")
+    book.add_argument("--no-page-numbers", action="store_true", help="Don't stamp page numbers")
+    add_render_options(book)
+    book.set_defaults(func=cmd_book)
+
+    watch = sub.add_parser("watch", help="Convert files again whenever they or their images change")
+    watch.add_argument("inputs", nargs="+", help="Files, directories (watched recursively) or glob patterns")
+    watch.add_argument("-o", "--output-dir", help="Output directory (default: next to each source)")
+    watch.add_argument("-j", "--jobs", type=int, default=2, help="Documents rendered in parallel")
+    watch.add_argument("--debounce-ms", type=int, default=150,
+                       help="Wait this long after the last change before converting")
+    add_render_options(watch)
+    watch.set_defaults(func=cmd_watch)
+    return parser
+
+
+def main(argv=None):
+    # WebEngine needs no display when running on servers and CI
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
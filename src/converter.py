@@ -1,16 +1,149 @@
 from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineSettings
-from PyQt6.QtCore import QUrl, QEventLoop, QTimer, QMarginsF, QSizeF
+from PyQt6.QtCore import QUrl, QEventLoop, QTimer, QElapsedTimer, QMarginsF, QSizeF
 from PyQt6.QtGui import QPageSize, QPageLayout
-import markdown
 import os
-import pymdownx.superfences
-import pymdownx.arithmatex
+import re
+import json
+import html
+from urllib.parse import unquote
 from pdf2docx import Converter
+from batch import BatchRenderer
+from md_parser import shared_renderer
+from render_cache import RenderCache
+from prerender import DiagramPrerenderer
+from docx_writer import DocxWriter
+from streaming import StreamingConverter
+from tracing import NULL_TRACER, document_counters
+import offline_bundle
+
+# Evaluated in the page to find out whether Mermaid, MathJax and images have
+# settled. Both flags are raised by the template scripts, even when rendering fails.
+RENDER_READY_JS = (
+    "!!(window.md2pdfDiagramsReady && window.md2pdfMathReady"
+    " && Array.from(document.images).every(img => img.complete))"
+)
+
+class RenderWaiter:
+    """Polls a page until RENDER_READY_JS is true or the timeout expires.
+
+    callback(ready) is called exactly once; ready is False on timeout.
+    """
+    def __init__(self, page, timeout, interval, callback):
+        self.page = page
+        self.timeout = timeout
+        self.callback = callback
+        self.done = False
+
+        self.poll = QTimer()
+        self.poll.setInterval(interval)
+        self.poll.timeout.connect(self.check)
+
+        # Fallback: print whatever is on the page once the timeout is reached
+        self.deadline = QTimer()
+        self.deadline.setSingleShot(True)
+        self.deadline.timeout.connect(self.on_timeout)
+
+    def start(self):
+        self.poll.start()
+        self.deadline.start(self.timeout)
+
+    def check(self):
+        self.page.runJavaScript(RENDER_READY_JS, self.on_result)
+
+    def on_result(self, ready):
+        if ready and not self.done:
+            self.finish(True)
+
+    def on_timeout(self):
+        print(f"Render timeout ({self.timeout} ms), printing anyway")
+        self.finish(False)
+
+    def finish(self, ready):
+        self.done = True
+        self.poll.stop()
+        self.deadline.stop()
+        self.callback(ready)
 
 class Md2PdfConverter:
-    def __init__(self):
+    def __init__(self, render_timeout=10000, ready_poll_interval=50, offline=False,
+                 markdown_renderer=None, cache=None, prerender=False,
+                 streaming_threshold=1024 * 1024, stream_chunk_bytes=256 * 1024,
+                 stream_part_bytes=64 * 1024 * 1024):
+        # Upper bound (ms) for the Mermaid/MathJax wait before printing anyway
+        self.render_timeout = render_timeout
+        self.ready_poll_interval = ready_poll_interval
+        # Parser is built once per thread and reset between documents
+        self.markdown = markdown_renderer or shared_renderer()
+        # Optional RendererPool; when set, warm pages are reused between documents
+        self.pool = None
+        # Optional RenderCache; unchanged documents are copied from it instead of rendered
+        self.cache = cache
+        # Optional DiagramPrerenderer; inlines diagrams/formulas as SVG before printing
+        self.prerenderer = None
+        # Receives timing spans and per-document counters (see tracing.Tracer)
+        self.tracer = NULL_TRACER
+        # Used by export_docx when PDF conversion does not pre-render
+        self.docx_prerenderer = None
+        # Larger inputs are converted in chunks through temp files (setHtml() stops at
+        # 2 MB), and printed in parts of stream_part_bytes HTML that are merged afterwards
+        self.streaming_threshold = streaming_threshold
+        self.stream_chunk_bytes = stream_chunk_bytes
+        self.stream_part_bytes = stream_part_bytes
+
+        # Page layout (also part of the render cache key)
+        self.page_size_id = QPageSize.PageSizeId.A4
+        self.page_orientation = QPageLayout.Orientation.Portrait
+        self.page_margins_mm = (15, 15, 15, 15)
+
+        # Mermaid and MathJax come from the local bundle when it has been fetched,
+        # otherwise from the CDN. Offline mode refuses to fall back to the network.
+        self.offline = offline
+        if offline_bundle.install():
+            self.mathjax_url = offline_bundle.local_url("mathjax/tex-chtml.js")
+            self.mathjax_svg_url = offline_bundle.local_url("mathjax/tex-svg.js")
+            self.mermaid_url = offline_bundle.local_url("mermaid/mermaid.min.js")
+        elif offline:
+            raise RuntimeError("Offline mode needs the MathJax/Mermaid bundle in "
+                               f"{offline_bundle.VENDOR_DIR} (python src/offline_bundle.py fetch)")
+        else:
+            self.mathjax_url = offline_bundle.cdn_url("mathjax/tex-chtml.js")
+            self.mathjax_svg_url = offline_bundle.cdn_url("mathjax/tex-svg.js")
+            self.mermaid_url = offline_bundle.cdn_url("mermaid/mermaid.min.js")
+
+        if prerender:
+            self.prerenderer = DiagramPrerenderer(self)
+
+        # Library scripts are only injected into documents that need them (see build_html)
+        self.mathjax_scripts = """
+            <!-- MathJax Configuration -->
+            <script>
+            window.MathJax = {{
+                tex: {{
+                    inlineMath: [['$', '$'], ['\\\\(', '\\\\)']],
+                    displayMath: [['$$', '$$'], ['\\\\[', '\\\\]']],
+                    processEscapes: true
+                }},
+                options: {{
+                    ignoreHtmlClass: 'tex2jax_ignore',
+                    processHtmlClass: 'tex2jax_process'
+                }},
+                startup: {{
+                    ready: () => {{
+                        MathJax.startup.defaultReady();
+                        const done = () => {{ window.md2pdfMathReady = true; }};
+                        MathJax.startup.promise.then(done, done);
+                    }}
+                }}
+            }};
+            </script>
+            <script id="MathJax-script" async src="{mathjax_url}"></script>
+        """
+        self.mermaid_scripts = """
+            <!-- Mermaid JS (Version 10.9.1) -->
+            <script src="{mermaid_url}"></script>
+        """
+
         # We will use robust CSS from a CDN or embedded, leveraging WebEngine's full browser capabilities
-        # Mermaid and MathJax will be loaded from CDN
         self.html_template = """
         <!DOCTYPE html>
         <html>
@@ -86,52 +219,128 @@ class Md2PdfConverter:
                 img {{ max-width: 100%; box-sizing: content-box; background-color: #fff; }}
                 
                 /* Mermaid Centering */
-                .mermaid {{
+                .mermaid, .mermaid-svg {{
                     display: flex;
                     justify-content: center;
                     margin: 20px 0;
                 }}
+                .math-display {{ text-align: center; margin: 1em 0; }}
             </style>
             
-            <!-- MathJax Configuration -->
-            <script>
-            window.MathJax = {{
-                tex: {{
-                    inlineMath: [['$', '$'], ['\\\\(', '\\\\)']],
-                    displayMath: [['$$', '$$'], ['\\\\[', '\\\\]']],
-                    processEscapes: true
-                }},
-                options: {{
-                    ignoreHtmlClass: 'tex2jax_ignore',
-                    processHtmlClass: 'tex2jax_process'
-                }}
-            }};
-            </script>
-            <script id="MathJax-script" async src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-chtml.js"></script>
-            
-            <!-- Mermaid JS (Version 10.9.1) -->
-            <script src="https://cdn.jsdelivr.net/npm/mermaid@10.9.1/dist/mermaid.min.js"></script>
+            {mathjax_scripts}
+            {mermaid_scripts}
         </head>
         <body>
+            <div id="md2pdf-content">
             {content}
-            
+            </div>
+
             <script>
-                // 1. Transform superfences output for Mermaid
-                document.querySelectorAll('pre code.language-mermaid').forEach(el => {{
-                    let pre = el.parentElement;
-                    let div = document.createElement('div');
-                    div.className = 'mermaid';
-                    div.textContent = el.textContent;
-                    pre.replaceWith(div);
-                }});
-
-                // 2. Run Mermaid
+                window.md2pdf = {{
+                    // 1. Transform superfences output for Mermaid
+                    prepareMermaid: function (root) {{
+                        root.querySelectorAll('pre code.language-mermaid').forEach(el => {{
+                            let pre = el.parentElement;
+                            let div = document.createElement('div');
+                            div.className = 'mermaid';
+                            div.textContent = el.textContent;
+                            pre.replaceWith(div);
+                        }});
+                    }},
+
+                    // 2. Run Mermaid and report when it has settled
+                    runMermaid: function (root) {{
+                        this.prepareMermaid(root);
+                        let nodes = Array.from(root.querySelectorAll('.mermaid:not([data-processed])'));
+                        window.md2pdfDiagramsReady = false;
+                        if (window.mermaid && nodes.length) {{
+                            mermaid.run({{ nodes: nodes }}).catch(e => console.error(e)).finally(() => {{
+                                window.md2pdfDiagramsReady = true;
+                            }});
+                        }} else {{
+                            window.md2pdfDiagramsReady = true;
+                        }}
+                    }},
+
+                    // 3. Re-typeset math (the first pass is done by MathJax startup)
+                    runMathJax: function (root) {{
+                        if (!(window.MathJax && MathJax.typesetPromise)) return;
+                        window.md2pdfMathReady = false;
+                        const done = () => {{ window.md2pdfMathReady = true; }};
+                        MathJax.typesetPromise([root]).then(done, done);
+                    }},
+
+                    setBase: function (baseHref) {{
+                        let base = document.querySelector('base');
+                        if (!base) {{
+                            base = document.createElement('base');
+                            document.head.prepend(base);
+                        }}
+                        base.href = baseHref;
+                    }},
+
+                    // Used by warm pages to swap in a new document without reloading
+                    setContent: function (html, baseHref) {{
+                        this.setBase(baseHref);
+                        let root = document.getElementById('md2pdf-content');
+                        if (window.MathJax && MathJax.typesetClear) MathJax.typesetClear([root]);
+                        root.innerHTML = html;
+                        this.runMermaid(root);
+                        this.runMathJax(root);
+                    }},
+
+                    // Live preview: blocks is a list of [key, html]; html is null for
+                    // blocks the page already has. Only new blocks are inserted and
+                    // rendered, the rest are moved or kept. Returns keys that were
+                    // expected but missing so the caller can resend them.
+                    patch: function (blocks, baseHref) {{
+                        this.setBase(baseHref);
+                        let root = document.getElementById('md2pdf-content');
+                        let existing = new Map();
+                        Array.from(root.children).forEach(el => {{
+                            if (el.dataset.key) existing.set(el.dataset.key, el);
+                            else el.remove();
+                        }});
+
+                        let added = [];
+                        let missing = [];
+                        let prev = null;
+                        for (const [key, html] of blocks) {{
+                            let el = existing.get(key);
+                            if (el) {{
+                                existing.delete(key);
+                            }} else if (html === null) {{
+                                missing.push(key);
+                                continue;
+                            }} else {{
+                                el = document.createElement('div');
+                                el.dataset.key = key;
+                                el.innerHTML = html;
+                                added.push(el);
+                            }}
+                            let expected = prev ? prev.nextSibling : root.firstChild;
+                            if (el !== expected) root.insertBefore(el, expected);
+                            prev = el;
+                        }}
+
+                        existing.forEach(el => {{
+                            if (window.MathJax && MathJax.typesetClear) MathJax.typesetClear([el]);
+                            el.remove();
+                        }});
+                        if (added.length) {{
+                            added.forEach(el => this.prepareMermaid(el));
+                            let nodes = added.flatMap(el => Array.from(el.querySelectorAll('.mermaid:not([data-processed])')));
+                            if (window.mermaid && nodes.length) mermaid.run({{ nodes: nodes }}).catch(e => console.error(e));
+                            if (window.MathJax && MathJax.typesetPromise) MathJax.typesetPromise(added).catch(e => console.error(e));
+                        }}
+                        return missing;
+                    }}
+                }};
+
                 if (window.mermaid) {{
                     mermaid.initialize({{ startOnLoad: false, theme: 'default' }});
-                    mermaid.run({{
-                        querySelector: '.mermaid'
-                    }});
                 }}
+                md2pdf.runMermaid(document.body);
             </script>
         </body>
         </html>
@@ -141,99 +350,338 @@ class Md2PdfConverter:
         if not output_path:
             output_path = os.path.splitext(input_path)[0] + ".pdf"
 
+        if self.is_large(input_path):
+            return self.convert_streaming(input_path, output_path)
+
+        tracer = self.tracer
+        span = tracer.span("convert", input_path)
         try:
-            with open(input_path, 'r', encoding='utf-8') as f:
-                md_content = f.read()
+            html_body = self.render_file(input_path)
+            if tracer.enabled:
+                tracer.counters(input_path, **document_counters(html_body))
+            with tracer.span("cache_lookup", input_path):
+                hit, cache_key = self.cache_lookup(input_path, html_body, output_path)
+            if hit:
+                span.end(cached=True)
+                return True
+            if self.prerenderer is not None:
+                with tracer.span("prerender", input_path):
+                    html_body = self.prerenderer.prerender(html_body)
+            base_url = self.base_url_for(input_path)
 
-            # Convert MD to HTML with extensions for Math and Code
-            html_body = markdown.markdown(
-                md_content, 
-                extensions=[
-                    'extra', 
-                    'codehilite', 
-                    'tables', 
-                    'toc',
-                    'pymdownx.arithmatex',
-                    'pymdownx.superfences',
-                    'pymdownx.highlight',
-                    'pymdownx.inlinehilite',
-                    'pymdownx.magiclink',
-                    'pymdownx.tasklist'
-                ],
-                extension_configs={
-                    'pymdownx.arithmatex': {
-                        'generic': True
-                    },
-                    'pymdownx.superfences': {
-                         "disable_indented_code_blocks": True
-                    }
-                }
-            )
-            
-            full_html = self.html_template.format(content=html_body)
+            if self.pool is not None:
+                # Swap the document into an already loaded page
+                page = self.pool.acquire()
+                try:
+                    with tracer.span("load", input_path, pooled=True):
+                        self.pool.set_content(page, html_body, base_url)
+                    with tracer.span("render_wait", input_path):
+                        self.wait_for_render(page)
+                    with tracer.span("print", input_path):
+                        ok = self.print_page(page, output_path)
+                finally:
+                    self.pool.release(page)
+                if ok:
+                    self.cache_store(cache_key, "pdf", output_path)
+                span.end(ok=ok)
+                return ok
+
+            full_html = self.build_html(html_body)
             
             # --- WebEngine Async PDF Generation Loop ---
-            page = QWebEnginePage()
-            
-            # CRITICAL: Allow local content to access remote CDN scripts (Mermaid/MathJax)
-            settings = page.settings()
-            settings.setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessRemoteUrls, True)
-            settings.setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessFileUrls, True)
+            page = self.create_page()
             
             # Use EventLoop to wait for signals
             loop = QEventLoop()
             
             # 1. Load HTML
-            base_url = QUrl.fromLocalFile(os.path.dirname(os.path.abspath(input_path)) + os.sep)
+            load_span = tracer.span("load", input_path, html_bytes=len(full_html))
             page.setHtml(full_html, base_url)
             
             # Wait for load finished (initial DOM ready)
             page.loadFinished.connect(lambda ok: loop.quit())
             loop.exec()
+            load_span.end()
             
-            # 2. Short delay for JS rendering (Mermaid/MathJax async processing)
-            timer = QTimer()
-            timer.setSingleShot(True)
-            timer.timeout.connect(loop.quit)
-            timer.start(3000) # Wait 3 seconds
-            loop.exec()
+            # 2. Wait for Mermaid/MathJax only if the document actually uses them
+            if self.needs_render_wait(html_body):
+                with tracer.span("render_wait", input_path):
+                    self.wait_for_render(page)
             
             # 3. Print to PDF
-            layout = QPageLayout(
-                QPageSize(QPageSize.PageSizeId.A4),
-                QPageLayout.Orientation.Portrait,
-                QMarginsF(15, 15, 15, 15),
-                QPageLayout.Unit.Millimeter
-            )
-            
-            page.printToPdf(output_path, layout)
-            
-            # Wait for PDF writing to finish
-            page.pdfPrintingFinished.connect(lambda result: loop.quit())
-            loop.exec()
+            with tracer.span("print", input_path):
+                ok = self.print_page(page, output_path)
             
             # Cleanup
             page.deleteLater()
-            
-            return True
+
+            if ok:
+                self.cache_store(cache_key, "pdf", output_path)
+            span.end(ok=ok)
+            return ok
             
         except Exception as e:
+            span.end(ok=False, error=type(e).__name__)
             print(f"PDF Dönüştürme Hatası: {e}")
             import traceback
             traceback.print_exc()
             return False
 
-    def convert_to_docx(self, pdf_path, docx_path=None):
-        """Converts a PDF file to a DOCX file using pdf2docx"""
+    def is_large(self, input_path):
+        try:
+            return bool(self.streaming_threshold) and os.path.getsize(input_path) >= self.streaming_threshold
+        except OSError:
+            return False
+
+    def convert_streaming(self, input_path, output_path=None):
+        """Converts a (very) large file chunk by chunk with bounded memory"""
+        if not output_path:
+            output_path = os.path.splitext(input_path)[0] + ".pdf"
+        try:
+            streamer = StreamingConverter(self, chunk_bytes=self.stream_chunk_bytes,
+                                          part_bytes=self.stream_part_bytes)
+            with self.tracer.span("stream", input_path, bytes=os.path.getsize(input_path)):
+                return streamer.convert(input_path, output_path)
+        except Exception as e:
+            print(f"PDF Dönüştürme Hatası: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def render_file(self, input_path):
+        """Reads a Markdown file and returns the HTML body"""
+        with self.tracer.span("read", input_path):
+            with open(input_path, 'r', encoding='utf-8') as f:
+                md_content = f.read()
+        with self.tracer.span("markdown", input_path, bytes=len(md_content)):
+            return self.markdown_to_html(md_content)
+
+    def markdown_to_html(self, md_content):
+        # Convert MD to HTML with extensions for Math and Code
+        return self.markdown.convert(md_content)
+
+    def build_html(self, html_body, math=None, diagrams=None):
+        """Fills the template, including MathJax/Mermaid only if the body uses them.
+
+        math/diagrams force a library in or out; warm pages pass True for both.
+        """
+        if math is None:
+            math = self.uses_math(html_body)
+        if diagrams is None:
+            diagrams = self.uses_diagrams(html_body)
+
+        if math:
+            mathjax_scripts = self.mathjax_scripts.format(mathjax_url=self.mathjax_url)
+        else:
+            # Nothing to typeset, so the math half of the readiness check is already met
+            mathjax_scripts = "<script>window.md2pdfMathReady = true;</script>"
+        mermaid_scripts = self.mermaid_scripts.format(mermaid_url=self.mermaid_url) if diagrams else ""
+
+        return self.html_template.format(content=html_body, mathjax_scripts=mathjax_scripts,
+                                         mermaid_scripts=mermaid_scripts)
+
+    def base_url_for(self, input_path):
+        """Relative images and links resolve against the Markdown file's directory"""
+        return QUrl.fromLocalFile(os.path.dirname(os.path.abspath(input_path)) + os.sep)
+
+    def create_page(self):
+        page = QWebEnginePage()
+
+        # CRITICAL: Allow local content to access remote CDN scripts (Mermaid/MathJax)
+        settings = page.settings()
+        settings.setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessRemoteUrls, True)
+        settings.setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessFileUrls, True)
+        return page
+
+    def page_layout(self):
+        return QPageLayout(
+            QPageSize(self.page_size_id),
+            self.page_orientation,
+            QMarginsF(*self.page_margins_mm),
+            QPageLayout.Unit.Millimeter
+        )
+
+    def print_page(self, page, output_path):
+        """Prints the page to output_path and waits for the PDF to be written"""
+        loop = QEventLoop()
+        result = []
+
+        def on_printed(path, ok):
+            result.append(ok)
+            loop.quit()
+
+        page.pdfPrintingFinished.connect(on_printed)
+        page.printToPdf(output_path, self.page_layout())
+        loop.exec()
+        page.pdfPrintingFinished.disconnect()
+        return bool(result and result[0])
+
+    def render_fingerprint(self):
+        """Everything besides the document itself that changes the PDF output"""
+        return json.dumps({
+            "template": self.html_template,
+            "mathjax": [self.mathjax_scripts, self.mathjax_url],
+            "mermaid": [self.mermaid_scripts, self.mermaid_url],
+            "markdown": [self.markdown.extensions, self.markdown.extension_configs],
+            "layout": [self.page_size_id.name, self.page_orientation.name, self.page_margins_mm],
+        }, sort_keys=True, default=lambda o: getattr(o, "__qualname__", repr(o)))
+
+    def local_assets(self, input_path, html_body):
+        """Local files (images etc.) referenced by src attributes in the HTML"""
+        base_dir = os.path.dirname(os.path.abspath(input_path))
+        assets = []
+        for src in re.findall(r'\bsrc="([^"]+)"', html_body):
+            src = html.unescape(src)
+            if src.startswith("file:"):
+                path = QUrl(src).toLocalFile()
+            elif re.match(r'^[a-zA-Z][a-zA-Z0-9+.-]*:', src):
+                # Remote or data: URL
+                continue
+            else:
+                path = os.path.join(base_dir, unquote(src.split('#')[0].split('?')[0]))
+            path = os.path.normpath(path)
+            if os.path.isfile(path) and path not in assets:
+                assets.append(path)
+        return assets
+
+    def cache_key(self, input_path, html_body):
+        with open(input_path, 'rb') as f:
+            parts = [f.read(), self.render_fingerprint()]
+        for path in self.local_assets(input_path, html_body):
+            with open(path, 'rb') as f:
+                parts += [path, f.read()]
+        return RenderCache.make_key(*parts)
+
+    def cache_lookup(self, input_path, html_body, output_path):
+        """Returns (hit, key); on a hit the cached PDF is already at output_path"""
+        if self.cache is None:
+            return False, None
+        key = self.cache_key(input_path, html_body)
+        if self.cache.fetch(key, "pdf", output_path):
+            return True, key
+        if self.cache.hardlink and os.path.lexists(output_path):
+            # May be a hardlink into the cache; never write through it
+            os.remove(output_path)
+        return False, key
+
+    def cache_store(self, key, kind, path):
+        if self.cache is not None and key is not None and os.path.exists(path):
+            try:
+                self.cache.store(key, kind, path)
+            except OSError as e:
+                print(f"Render cache error: {e}")
+
+    def uses_math(self, html_body):
+        # pymdownx.arithmatex (generic mode) wraps every formula in this class
+        return 'class="arithmatex"' in html_body
+
+    def uses_diagrams(self, html_body):
+        return 'class="mermaid"' in html_body or 'language-mermaid' in html_body
+
+    def needs_render_wait(self, html_body):
+        """True if the HTML contains math or diagrams that are rendered by JS"""
+        return self.uses_math(html_body) or self.uses_diagrams(html_body)
+
+    def wait_for_render(self, page):
+        """Blocks until Mermaid and MathJax are done or render_timeout expires"""
+        loop = QEventLoop()
+        elapsed = QElapsedTimer()
+        elapsed.start()
+        waiter = self.wait_for_render_async(page, lambda ready: loop.quit())
+        if not waiter.done:
+            loop.exec()
+        return elapsed.elapsed()
+
+    def wait_for_render_async(self, page, callback):
+        """Starts polling the page; keep the returned waiter alive until callback runs"""
+        waiter = RenderWaiter(page, self.render_timeout, self.ready_poll_interval, callback)
+        waiter.start()
+        return waiter
+
+    def convert_many(self, jobs, max_in_flight=4, on_result=None):
+        """Renders several documents at once without nested event loops.
+
+        jobs is an iterable of input paths or (input_path, output_path) tuples.
+        Returns the started BatchRenderer; its job_finished signal (and
+        on_result, if given) receives a RenderResult per document, in
+        completion order, and finished is emitted after the last one.
+        """
+        batch = BatchRenderer(self, jobs, max_in_flight)
+        if on_result:
+            batch.job_finished.connect(on_result)
+        batch.start()
+        return batch
+
+    def export_docx(self, input_path, docx_path=None):
+        """Builds the DOCX straight from the Markdown, without rendering a PDF.
+
+        Diagrams and formulas are pre-rendered to SVG (and cached) as for
+        the PDF path, then embedded as pictures by DocxWriter.
+        """
+        if not docx_path:
+            docx_path = os.path.splitext(input_path)[0] + ".docx"
+
+        try:
+            html_body = self.render_file(input_path)
+            cache_key = None
+            if self.cache is not None:
+                cache_key = RenderCache.make_key(self.cache_key(input_path, html_body), "docx-writer")
+                if self.cache.fetch(cache_key, "docx", docx_path):
+                    return True
+                if self.cache.hardlink and os.path.lexists(docx_path):
+                    os.remove(docx_path)
+
+            if self.uses_math(html_body) or self.uses_diagrams(html_body):
+                # Word cannot run the page scripts, so DOCX always needs the SVGs
+                prerenderer = self.prerenderer
+                if prerenderer is None:
+                    if self.docx_prerenderer is None:
+                        self.docx_prerenderer = DiagramPrerenderer(self)
+                    prerenderer = self.docx_prerenderer
+                with self.tracer.span("prerender", input_path):
+                    html_body = prerenderer.prerender(html_body)
+
+            with self.tracer.span("docx_writer", input_path):
+                DocxWriter(os.path.dirname(os.path.abspath(input_path))).write(html_body, docx_path)
+            self.cache_store(cache_key, "docx", docx_path)
+            return True
+        except Exception as e:
+            print(f"DOCX Export Error: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def docx_cache_key(self, pdf_path, options=None):
+        # Keyed on the PDF bytes, so a cached PDF also finds its DOCX
+        with open(pdf_path, 'rb') as f:
+            return RenderCache.make_key(f.read(), "pdf2docx",
+                                        json.dumps(options or {}, sort_keys=True))
+
+    def convert_to_docx(self, pdf_path, docx_path=None, **options):
+        """Converts a PDF file to a DOCX file using pdf2docx.
+
+        options go to pdf2docx (start, end, pages, multi_processing, cpu_count).
+        For batches, docx_stage.DocxStage runs this in a process pool instead.
+        """
         if not docx_path:
             docx_path = os.path.splitext(pdf_path)[0] + ".docx"
             
         try:
             # Suppress some console output from pdf2docx if possible, or just run
+            cache_key = None
+            if self.cache is not None:
+                cache_key = self.docx_cache_key(pdf_path, options)
+                if self.cache.fetch(cache_key, "docx", docx_path):
+                    return True
+                if self.cache.hardlink and os.path.lexists(docx_path):
+                    os.remove(docx_path)
+
             print(f"Converting PDF to Word: {pdf_path} -> {docx_path}")
-            cv = Converter(pdf_path)
-            cv.convert(docx_path)
-            cv.close()
+            with self.tracer.span("pdf2docx", pdf_path):
+                cv = Converter(pdf_path)
+                cv.convert(docx_path, **options)
+                cv.close()
+            self.cache_store(cache_key, "docx", docx_path)
             return True
         except Exception as e:
             print(f"DOCX Conversion Error: {e}")
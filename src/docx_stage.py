@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+# pdf2docx.Converter.convert() options that can be passed through
+DOCX_OPTION_NAMES = ("start", "end", "pages", "multi_processing", "cpu_count")
+
+
+@dataclass
+class DocxResult:
+    pdf_path: str
+    docx_path: str
+    ok: bool
+    error: str = ""
+    elapsed: float = 0.0
+    cached: bool = False
+    tag: Any = None
+
+
+def convert_pdf(pdf_path, docx_path, options):
+    """Runs in a worker process: one pdf2docx conversion"""
+    from pdf2docx import Converter
+
+    started = time.perf_counter()
+    cv = Converter(pdf_path)
+    try:
+        cv.convert(docx_path, **options)
+    finally:
+        cv.close()
+    return time.perf_counter() - started
+
+
+class DocxJob:
+    def __init__(self, pdf_path, docx_path, tag):
+        self.pdf_path = pdf_path
+        self.docx_path = docx_path
+        self.tag = tag
+        self.cache_key = None
+        self.future = None
+        self.queued = time.perf_counter()
+        self.started = None
+
+
+class DocxStage(QObject):
+    """PDF -> DOCX pipeline stage backed by a process pool.
+
+    pdf2docx is CPU-heavy pure Python, so conversions run in separate
+    processes while the GUI thread keeps rendering the next PDFs. At most
+    max_workers conversions run at once; the rest wait here so they can
+    still be cancelled. Finished futures are collected by a QTimer and
+    reported through signals. options are passed to
+    pdf2docx.Converter.convert() (start/end/pages/multi_processing/cpu_count).
+    """
+    job_finished = pyqtSignal(object)
+    progress = pyqtSignal(int, int)
+    idle = pyqtSignal()
+
+    def __init__(self, converter=None, max_workers=None, options=None, poll_interval=50, parent=None):
+        super().__init__(parent)
+        self.converter = converter
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.options = {k: v for k, v in (options or {}).items()
+                        if k in DOCX_OPTION_NAMES and v is not None}
+        self.executor = None
+        self.pending = []
+        self.running = []
+        self.results = []
+        self.total = 0
+
+        self.poll = QTimer(self)
+        self.poll.setInterval(poll_interval)
+        self.poll.timeout.connect(self.check)
+
+    def submit(self, pdf_path, docx_path=None, tag=None):
+        if not docx_path:
+            docx_path = os.path.splitext(pdf_path)[0] + ".docx"
+        job = DocxJob(pdf_path, docx_path, tag)
+        self.total += 1
+        self.pending.append(job)
+        self.start_next()
+        if not self.poll.isActive():
+            self.poll.start()
+        return job
+
+    def cancel(self):
+        """Drops queued conversions; running ones finish"""
+        pending = self.pending
+        self.pending = []
+        for job in pending:
+            self.finish(job, False, "Cancelled")
+
+    def is_idle(self):
+        return not self.pending and not self.running
+
+    def start_next(self):
+        while self.pending and len(self.running) < self.max_workers:
+            job = self.pending.pop(0)
+            cache = self.converter.cache if self.converter is not None else None
+            if cache is not None:
+                try:
+                    job.cache_key = self.converter.docx_cache_key(job.pdf_path, self.options)
+                    if cache.fetch(job.cache_key, "docx", job.docx_path):
+                        self.finish(job, True, cached=True)
+                        continue
+                    if cache.hardlink and os.path.lexists(job.docx_path):
+                        # May be a hardlink into the cache; never write through it
+                        os.remove(job.docx_path)
+                except OSError as e:
+                    self.finish(job, False, str(e))
+                    continue
+
+            if self.executor is None:
+                # Qt does not survive fork(), start clean interpreters instead
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+            print(f"Converting PDF to Word: {job.pdf_path} -> {job.docx_path}")
+            job.started = time.perf_counter()
+            job.future = self.executor.submit(convert_pdf, job.pdf_path, job.docx_path, self.options)
+            self.running.append(job)
+
+    def check(self):
+        for job in [j for j in self.running if j.future.done()]:
+            self.running.remove(job)
+            try:
+                job.future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool) and self.executor is not None:
+                    # A worker crashed; the pool is unusable, start a new one for the next jobs
+                    self.executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = None
+                print(f"DOCX Conversion Error: {e}")
+                self.finish(job, False, str(e) or type(e).__name__)
+            else:
+                if self.converter is not None:
+                    self.converter.cache_store(job.cache_key, "docx", job.docx_path)
+                self.finish(job, True)
+        self.start_next()
+        if self.is_idle():
+            self.poll.stop()
+
+    def finish(self, job, ok, error="", cached=False):
+        if self.converter is not None and job.started is not None:
+            self.converter.tracer.record("pdf2docx", job.started, time.perf_counter() - job.started,
+                                         job.pdf_path, ok=ok)
+        result = DocxResult(job.pdf_path, job.docx_path, ok, error,
+                            time.perf_counter() - job.queued, cached, job.tag)
+        self.results.append(result)
+        self.job_finished.emit(result)
+        self.progress.emit(len(self.results), self.total)
+        if self.is_idle():
+            self.idle.emit()
+
+    def stats(self):
+        return {
+            "total": self.total,
+            "done": sum(1 for r in self.results if r.ok),
+            "failed": sum(1 for r in self.results if not r.ok),
+            "cached": sum(1 for r in self.results if r.cached),
+            "workers": self.max_workers,
+        }
+
+    def close(self):
+        self.poll.stop()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
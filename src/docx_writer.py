@@ -0,0 +1,468 @@
+import io
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import unquote, urlparse
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_COLOR_INDEX
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Pt, RGBColor
+from docx.opc.constants import RELATIONSHIP_TYPE
+from PyQt6.QtCore import QByteArray, QBuffer, QIODevice, QRectF, Qt
+from PyQt6.QtGui import QImage, QPainter
+from PyQt6.QtSvg import QSvgRenderer
+
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+                 "link", "meta", "param", "source", "track", "wbr"}
+BLOCK_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "table", "pre",
+              "blockquote", "hr", "div", "dl", "details", "section", "figure"}
+RASTER_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff")
+CODE_FONT = "Consolas"
+MATH_FONT = "Cambria Math"
+
+SVG_TAG_RE = re.compile(r'<svg\b|</svg\s*>', re.IGNORECASE)
+SVG_ROOT_RE = re.compile(r'<svg\b[^>]*>', re.IGNORECASE)
+LENGTH_RE = re.compile(r'^\s*([\d.]+)\s*(px|pt|ex|em|%)?\s*$')
+MAX_WIDTH_RE = re.compile(r'max-width:\s*([\d.]+)px')
+
+
+class Node:
+    def __init__(self, tag, attrs=None):
+        self.tag = tag
+        self.attrs = dict(attrs or {})
+        self.children = []
+
+    def classes(self):
+        return (self.attrs.get("class") or "").split()
+
+    def text(self):
+        return "".join(c if isinstance(c, str) else c.text() for c in self.children)
+
+    def elements(self, *tags):
+        return [c for c in self.children if isinstance(c, Node) and (not tags or c.tag in tags)]
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("root")
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, attrs)
+        self.stack[-1].children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.stack[-1].children.append(Node(tag, attrs))
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                break
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+def extract_svgs(html_body):
+    """Replaces every top-level <svg> by a placeholder <img data-svg=N>.
+
+    HTMLParser lowercases names (viewBox, xlink:href...), so SVG markup is
+    kept verbatim for the rasterizer instead of going through the tree.
+    """
+    svgs = []
+    out = []
+    depth = 0
+    start = 0
+    pos = 0
+    for match in SVG_TAG_RE.finditer(html_body):
+        if match.group(0).lower().startswith("<svg"):
+            if depth == 0:
+                out.append(html_body[pos:match.start()])
+                start = match.start()
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                svgs.append(html_body[start:match.end()])
+                out.append(f'<img data-svg="{len(svgs) - 1}">')
+                pos = match.end()
+    out.append(html_body[pos:])
+    return "".join(out), svgs
+
+
+def svg_size_pt(svg, body_pt=11.0):
+    """(width, height) in points of an SVG from MathJax, Mermaid or a file"""
+    root = SVG_ROOT_RE.search(svg)
+    attrs = dict(re.findall(r'([\w:-]+)\s*=\s*"([^"]*)"', root.group(0))) if root else {}
+    view_box = [float(v) for v in re.split(r'[\s,]+', attrs.get("viewBox", "").strip()) if v] or None
+    if view_box and len(view_box) != 4:
+        view_box = None
+
+    def length(value):
+        match = LENGTH_RE.match(value or "")
+        if not match:
+            return None
+        number, unit = float(match.group(1)), match.group(2) or "px"
+        return {"px": number * 0.75, "pt": number, "em": number * body_pt,
+                "ex": number * body_pt / 2}.get(unit)
+
+    width = length(attrs.get("width"))
+    height = length(attrs.get("height"))
+    if width is None:
+        max_width = MAX_WIDTH_RE.search(attrs.get("style", ""))
+        if max_width:
+            width = float(max_width.group(1)) * 0.75
+        elif view_box:
+            width = view_box[2] * 0.75
+        else:
+            width = 300.0
+    if height is None:
+        height = width * view_box[3] / view_box[2] if view_box and view_box[2] else width / 2
+    return width, height
+
+
+def svg_to_png(svg, width_pt, height_pt, scale=2.0):
+    """Rasterizes SVG markup at scale x 96 dpi; returns PNG bytes or None"""
+    renderer = QSvgRenderer(QByteArray(svg.encode("utf-8")))
+    if not renderer.isValid():
+        return None
+    width_px = max(1, int(width_pt / 0.75 * scale))
+    height_px = max(1, int(height_pt / 0.75 * scale))
+    image = QImage(width_px, height_px, QImage.Format.Format_ARGB32)
+    image.fill(Qt.GlobalColor.white)
+    painter = QPainter(image)
+    renderer.render(painter, QRectF(0, 0, width_px, height_px))
+    painter.end()
+
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    buffer.close()
+    return bytes(data)
+
+
+class DocxWriter:
+    """Builds a DOCX straight from the converter's HTML with python-docx.
+
+    Headings, paragraphs with inline formatting and links, nested lists,
+    task lists, tables, code blocks, block quotes, definition lists and
+    images are mapped to Word styles. Diagrams and formulas that were
+    pre-rendered to SVG (see prerender.py) are embedded as PNG pictures;
+    anything left unrendered falls back to its source text.
+    """
+
+    def __init__(self, base_dir=None, body_pt=11.0, max_image_width_pt=450.0):
+        self.base_dir = base_dir or os.getcwd()
+        self.body_pt = body_pt
+        self.max_image_width_pt = max_image_width_pt
+        self.doc = None
+        self.svgs = []
+
+    def write(self, html_body, docx_path):
+        html_body, self.svgs = extract_svgs(html_body)
+        builder = _TreeBuilder()
+        builder.feed(html_body)
+        builder.close()
+
+        self.doc = Document()
+        self.doc.styles["Normal"].font.size = Pt(self.body_pt)
+        self.flow(builder.root.children, self.doc)
+        os.makedirs(os.path.dirname(os.path.abspath(docx_path)), exist_ok=True)
+        self.doc.save(docx_path)
+        return docx_path
+
+    # Blocks
+
+    def flow(self, children, container, new_paragraph=None, level=0, quote=False, fmt=None):
+        """Adds mixed block/inline children; inline runs share a paragraph until the next block"""
+        if new_paragraph is None:
+            def new_paragraph():
+                return container.add_paragraph(style="Quote" if quote else None)
+        para = None
+        for child in children:
+            if isinstance(child, Node) and child.tag in BLOCK_TAGS:
+                self.block(child, container, level, quote)
+                para = None
+                continue
+            if para is None:
+                if isinstance(child, str) and not child.strip():
+                    continue
+                para = new_paragraph()
+            self.inline(child, para, fmt or {})
+
+    def block(self, node, container, level=0, quote=False):
+        tag = node.tag
+        classes = node.classes()
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            para = container.add_paragraph(style=f"Heading {tag[1]}")
+            self.inline_children(node, para, {})
+        elif tag == "p":
+            self.flow(node.children, container, level=level, quote=quote)
+        elif tag in ("ul", "ol"):
+            for item in node.elements("li"):
+                self.list_item(item, container, tag, level)
+        elif tag == "table":
+            self.table(node, container)
+        elif tag == "pre" or "highlight" in classes:
+            self.code_block(node.text(), container)
+        elif "mermaid" in classes:
+            # Not pre-rendered: keep the diagram source readable
+            self.code_block(node.text(), container)
+        elif "arithmatex" in classes:
+            para = container.add_paragraph()
+            para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            self.math_run(para, node.text().strip().removeprefix("\\[").removesuffix("\\]").strip())
+        elif "mermaid-svg" in classes or "math-svg" in classes:
+            para = container.add_paragraph()
+            para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            self.inline_children(node, para, {})
+        elif tag == "blockquote":
+            self.flow(node.children, container, level=level, quote=True)
+        elif tag == "hr":
+            self.horizontal_rule(container.add_paragraph())
+        elif tag == "dl":
+            for child in node.elements("dt", "dd"):
+                if child.tag == "dt":
+                    self.flow(child.children, container, fmt={"bold": True})
+                else:
+                    def indented():
+                        para = container.add_paragraph()
+                        para.paragraph_format.left_indent = Pt(24)
+                        return para
+                    self.flow(child.children, container, indented)
+        elif tag == "details":
+            for child in node.children:
+                if isinstance(child, Node) and child.tag == "summary":
+                    self.flow(child.children, container, fmt={"bold": True})
+                else:
+                    self.flow([child], container, level=level, quote=quote)
+        else:
+            # div, section, figure, toc... only their content matters
+            self.flow(node.children, container, level=level, quote=quote)
+
+    def list_item(self, item, container, list_tag, level):
+        style = "List Bullet" if list_tag == "ul" else "List Number"
+        if level:
+            style += f" {min(level, 2) + 1}"
+
+        children = list(item.children)
+        # Loose lists wrap the item text in <p>; it still belongs on the bullet line
+        first = next((c for c in children if not (isinstance(c, str) and not c.strip())), None)
+        if isinstance(first, Node) and first.tag == "p":
+            index = children.index(first)
+            children[index:index + 1] = first.children
+
+        paragraphs = []
+
+        def new_paragraph():
+            if not paragraphs:
+                para = container.add_paragraph(style=style)
+            else:
+                para = container.add_paragraph()
+                para.paragraph_format.left_indent = Pt(18 * (level + 1))
+            paragraphs.append(para)
+            return para
+
+        nested = []
+        rest = []
+        for child in children:
+            if isinstance(child, Node) and child.tag in ("ul", "ol"):
+                nested.append(child)
+            else:
+                rest.append(child)
+        self.flow(rest, container, new_paragraph, level)
+        if not paragraphs:
+            new_paragraph()
+        for child in nested:
+            self.block(child, container, level + 1)
+
+    def table(self, node, container):
+        rows = []
+        for section in [node] + node.elements("thead", "tbody", "tfoot"):
+            rows += section.elements("tr")
+        if not rows:
+            return
+        columns = max(len(row.elements("th", "td")) for row in rows) or 1
+        table = container.add_table(rows=len(rows), cols=columns)
+        table.style = "Table Grid"
+        for r, row in enumerate(rows):
+            for c, cell_node in enumerate(row.elements("th", "td")):
+                cell = table.cell(r, c)
+                used = []
+
+                def new_paragraph(cell=cell, used=used):
+                    para = cell.paragraphs[0] if not used else cell.add_paragraph()
+                    used.append(para)
+                    return para
+
+                self.flow(cell_node.children, cell, new_paragraph)
+                align = cell_node.attrs.get("style") or cell_node.attrs.get("align") or ""
+                for para in cell.paragraphs:
+                    if "right" in align:
+                        para.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+                    elif "center" in align:
+                        para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                    if cell_node.tag == "th":
+                        for run in para.runs:
+                            run.bold = True
+
+    def code_block(self, code, container):
+        para = container.add_paragraph()
+        para.paragraph_format.space_after = Pt(8)
+        shading = OxmlElement("w:shd")
+        shading.set(qn("w:val"), "clear")
+        shading.set(qn("w:color"), "auto")
+        shading.set(qn("w:fill"), "F5F5F5")
+        para._p.get_or_add_pPr().append(shading)
+        lines = code.rstrip("\n").split("\n")
+        for i, line in enumerate(lines):
+            run = para.add_run(line)
+            run.font.name = CODE_FONT
+            run.font.size = Pt(self.body_pt - 2)
+            if i < len(lines) - 1:
+                run.add_break()
+
+    @staticmethod
+    def horizontal_rule(para):
+        borders = OxmlElement("w:pBdr")
+        bottom = OxmlElement("w:bottom")
+        bottom.set(qn("w:val"), "single")
+        bottom.set(qn("w:sz"), "6")
+        bottom.set(qn("w:space"), "1")
+        bottom.set(qn("w:color"), "CCCCCC")
+        borders.append(bottom)
+        para._p.get_or_add_pPr().append(borders)
+
+    # Inline content
+
+    def inline_children(self, node, para, fmt):
+        for child in node.children:
+            self.inline(child, para, fmt)
+
+    def inline(self, node, para, fmt):
+        if isinstance(node, str):
+            text = node if fmt.get("code") else re.sub(r'\s+', ' ', node)
+            if text:
+                self.styled_run(para, text, fmt)
+            return
+
+        tag = node.tag
+        classes = node.classes()
+        if tag in ("strong", "b"):
+            self.inline_children(node, para, dict(fmt, bold=True))
+        elif tag in ("em", "i"):
+            self.inline_children(node, para, dict(fmt, italic=True))
+        elif tag in ("code", "kbd", "samp"):
+            self.inline_children(node, para, dict(fmt, code=True))
+        elif tag in ("del", "s", "strike"):
+            self.inline_children(node, para, dict(fmt, strike=True))
+        elif tag in ("sup", "sub", "mark", "u", "ins"):
+            self.inline_children(node, para, dict(fmt, **{tag: True}))
+        elif tag == "a":
+            self.hyperlink(node, para, fmt)
+        elif tag == "br":
+            para.add_run().add_break()
+        elif tag == "img":
+            self.image(node, para)
+        elif tag == "input" and node.attrs.get("type") == "checkbox":
+            self.styled_run(para, "☑" if "checked" in node.attrs else "☐", fmt)
+        elif "arithmatex" in classes:
+            self.math_run(para, node.text().strip().removeprefix("\\(").removesuffix("\\)").strip())
+        elif tag in BLOCK_TAGS:
+            # Block markup in an inline context (e.g. a fence inside <p>): keep the text
+            self.styled_run(para, node.text(), fmt)
+        else:
+            self.inline_children(node, para, fmt)
+
+    def styled_run(self, para, text, fmt):
+        run = para.add_run(text)
+        run.bold = fmt.get("bold") or None
+        run.italic = fmt.get("italic") or None
+        if fmt.get("strike"):
+            run.font.strike = True
+        if fmt.get("sup"):
+            run.font.superscript = True
+        if fmt.get("sub"):
+            run.font.subscript = True
+        if fmt.get("mark"):
+            run.font.highlight_color = WD_COLOR_INDEX.YELLOW
+        if fmt.get("u") or fmt.get("ins") or fmt.get("link"):
+            run.underline = True
+        if fmt.get("link"):
+            run.font.color.rgb = RGBColor(0x05, 0x63, 0xC1)
+        if fmt.get("code"):
+            run.font.name = CODE_FONT
+            run.font.size = Pt(self.body_pt - 1)
+        return run
+
+    def math_run(self, para, tex):
+        run = para.add_run(tex)
+        run.font.name = MATH_FONT
+        run.italic = True
+        return run
+
+    def hyperlink(self, node, para, fmt):
+        href = node.attrs.get("href") or ""
+        start = len(para._p.findall(qn("w:r")))
+        self.inline_children(node, para, dict(fmt, link=True))
+        if not href or href.startswith("#"):
+            return
+        runs = para._p.findall(qn("w:r"))[start:]
+        if not runs:
+            return
+        rel_id = para.part.relate_to(href, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
+        link = OxmlElement("w:hyperlink")
+        link.set(qn("r:id"), rel_id)
+        runs[0].addprevious(link)
+        for run in runs:
+            link.append(run)
+
+    def image(self, node, para):
+        svg_index = node.attrs.get("data-svg")
+        if svg_index is not None:
+            self.svg_picture(para, self.svgs[int(svg_index)])
+            return
+
+        src = node.attrs.get("src") or ""
+        alt = node.attrs.get("alt") or ""
+        path = self.local_path(src)
+        if path is None or not os.path.exists(path):
+            if alt:
+                para.add_run(f"[{alt}]")
+            return
+        if path.lower().endswith(".svg"):
+            with open(path, "r", encoding="utf-8") as f:
+                self.svg_picture(para, f.read())
+        elif path.lower().endswith(RASTER_EXTENSIONS):
+            image = QImage(path)
+            width_pt = min(image.width() * 0.75, self.max_image_width_pt) if not image.isNull() \
+                else self.max_image_width_pt
+            para.add_run().add_picture(path, width=Pt(width_pt))
+        elif alt:
+            para.add_run(f"[{alt}]")
+
+    def local_path(self, src):
+        parsed = urlparse(src)
+        if parsed.scheme == "file":
+            return unquote(parsed.path)
+        if parsed.scheme or not src:
+            # Remote images are not downloaded
+            return None
+        return os.path.normpath(os.path.join(self.base_dir, unquote(parsed.path)))
+
+    def svg_picture(self, para, svg):
+        width, height = svg_size_pt(svg, self.body_pt)
+        if width > self.max_image_width_pt:
+            height *= self.max_image_width_pt / width
+            width = self.max_image_width_pt
+        png = svg_to_png(svg, width, height)
+        if png is None:
+            return
+        para.add_run().add_picture(io.BytesIO(png), width=Pt(width), height=Pt(height))
@@ -1,9 +1,7 @@
 import sys
 import os
 import json
-import requests
-import re
-import markdown
+import time
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
                              QTextEdit, QLabel, QPushButton, QSplitter, QMessageBox, QInputDialog,
                              QLineEdit, QDialog, QFormLayout, QFileDialog, QToolBar, QComboBox,
@@ -12,81 +10,78 @@ from PyQt6.QtGui import QAction, QKeySequence, QTextCursor, QIcon, QFont, QColor
 from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal, QUrl, QSize
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 from converter import Md2PdfConverter
+from live_preview import LivePreview, PreviewWorker
+from incremental import IncrementalMarkdown
+from chat_context import ChatContext, estimate_tokens
+from text_patch import PatchError, apply_edits, reply_edits
+import ai_client
 
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config.json")
 
+CANVAS_MARKERS = ("<<<UPDATE>>>", "<<<PATCH>>>")
+
+def visible_reply(text, canvas, final=False):
+    """The part of a (partial) reply shown in the chat.
+
+    In canvas mode the <<<UPDATE>>>/<<<PATCH>>> block goes to the editor
+    instead; while streaming, a marker that has only partly arrived is held back.
+    """
+    if not canvas:
+        return text
+    starts = [pos for pos in (text.find(marker) for marker in CANVAS_MARKERS) if pos >= 0]
+    start = min(starts) if starts else -1
+    if start < 0:
+        if not final:
+            for n in range(min(len(text), max(map(len, CANVAS_MARKERS)) - 1), 0, -1):
+                if any(marker.startswith(text[-n:]) for marker in CANVAS_MARKERS):
+                    return text[:-n]
+        return text
+    end = text.find("<<<END>>>", start)
+    if end < 0:
+        return text[:start] + ("" if final else "…")
+    return text[:start] + "[✅ Editör içeriği güncellendi]" + text[end + len("<<<END>>>"):]
+
+
 class ChatWorker(QThread):
+    chunk = pyqtSignal(str)
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
 
-    def __init__(self, provider, api_key, model, messages):
+    def __init__(self, provider, api_key, model, messages, base_url=None):
         super().__init__()
         self.provider = provider
         self.api_key = api_key
         self.model = model
         self.messages = messages
+        self.base_url = base_url
 
     def run(self):
+        # Pieces are emitted as they arrive; finished gets the whole reply
         try:
-            if self.provider == "Google Gemini":
-                self.call_gemini()
-            elif self.provider == "OpenRouter":
-                self.call_openrouter()
+            client = ai_client.client_for(self.provider, self.base_url)
+            # Gemini takes its model from the URL; the model setting is OpenRouter's
+            model = self.model if self.provider == "OpenRouter" else None
+            started = time.perf_counter()
+            parts = []
+            for text in client.stream_chat(self.api_key, self.messages, model):
+                if not parts:
+                    print(f"AI: first token after {time.perf_counter() - started:.2f} s")
+                parts.append(text)
+                self.chunk.emit(text)
+            if parts:
+                self.finished.emit("".join(parts))
             else:
-                self.error.emit("Geçersiz Sağlayıcı")
+                self.finished.emit("Alınan cevap işlenemedi.")
         except Exception as e:
             self.error.emit(str(e))
 
-    def call_gemini(self):
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={self.api_key}"
-        headers = {'Content-Type': 'application/json'}
-        contents = []
-        for msg in self.messages:
-            role = "model" if msg["role"] == "assistant" else "user"
-            contents.append({
-                "role": role,
-                "parts": [{"text": msg["content"]}]
-            })
-        data = {"contents": contents}
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            result = response.json()
-            try:
-                answer = result['candidates'][0]['content']['parts'][0]['text']
-                self.finished.emit(answer)
-            except (KeyError, IndexError):
-                self.finished.emit("Alınan cevap işlenemedi.")
-        else:
-            self.error.emit(f"API Hatası: {response.text}")
-
-    def call_openrouter(self):
-        url = "https://openrouter.ai/api/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": self.model or "openai/gpt-3.5-turbo",
-            "messages": self.messages
-        }
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            result = response.json()
-            try:
-                answer = result['choices'][0]['message']['content']
-                self.finished.emit(answer)
-            except (KeyError, IndexError):
-                self.finished.emit("Alınan cevap işlenemedi.")
-        else:
-            self.error.emit(f"API Hatası: {response.text}")
-
 class SettingsDialog(QDialog):
     # ... (SettingsDialog remains same)
     def __init__(self, parent=None, config=None):
         super().__init__(parent)
         self.config = config or {}
         self.setWindowTitle("Ayarlar")
-        self.setFixedSize(400, 250)
+        self.setFixedSize(400, 320)
         self.setStyleSheet("background-color: #1e1e2e; color: #cdd6f4;")
         layout = QFormLayout(self)
         
@@ -106,10 +101,20 @@ class SettingsDialog(QDialog):
         self.txt_model = QLineEdit(self.config.get("model", "google/gemini-2.0-flash-exp:free")) 
         self.txt_model.setStyleSheet("background-color: #313244; color: #cdd6f4; padding: 5px;")
 
+        # Empty means the public API; set to e.g. a local mock server for testing
+        self.txt_gemini_url = QLineEdit(self.config.get("gemini_base_url", ""))
+        self.txt_gemini_url.setPlaceholderText(ai_client.GEMINI_BASE_URL)
+        self.txt_gemini_url.setStyleSheet("background-color: #313244; color: #cdd6f4; padding: 5px;")
+        self.txt_openrouter_url = QLineEdit(self.config.get("openrouter_base_url", ""))
+        self.txt_openrouter_url.setPlaceholderText(ai_client.OPENROUTER_BASE_URL)
+        self.txt_openrouter_url.setStyleSheet("background-color: #313244; color: #cdd6f4; padding: 5px;")
+
         layout.addRow("Sağlayıcı:", self.combo_provider)
         layout.addRow("Gemini API Key:", self.txt_gemini_key)
         layout.addRow("OpenRouter API Key:", self.txt_openrouter_key)
         layout.addRow("Model (OpenRouter):", self.txt_model)
+        layout.addRow("Gemini API URL:", self.txt_gemini_url)
+        layout.addRow("OpenRouter API URL:", self.txt_openrouter_url)
         
         btn_save = QPushButton("Kaydet")
         btn_save.setStyleSheet("background-color: #89b4fa; color: #1e1e2e; padding: 8px; font-weight: bold;")
@@ -121,6 +126,8 @@ class SettingsDialog(QDialog):
         self.config["gemini_key"] = self.txt_gemini_key.text()
         self.config["open_router_key"] = self.txt_openrouter_key.text()
         self.config["model"] = self.txt_model.text()
+        self.config["gemini_base_url"] = self.txt_gemini_url.text().strip()
+        self.config["openrouter_base_url"] = self.txt_openrouter_url.text().strip()
         self.accept()
 
 class FindReplaceDialog(QDialog):
@@ -173,7 +180,11 @@ class EditorWindow(QMainWindow):
         self.file_path = file_path
         self.parent_window = parent
         self.config = self.load_config()
-        self.messages = [] 
+        # Conversation with the assistant, kept within a token budget
+        self.chat_context = ChatContext()
+        # The worker streaming the current reply; finished ones are kept until their thread exits
+        self.worker = None
+        self.done_workers = []
         
         self.setWindowTitle(f"Editör - {file_path if file_path else 'Yeni Dosya'}")
         self.resize(1500, 900)
@@ -303,10 +314,10 @@ class EditorWindow(QMainWindow):
         self.chat_input.setStyleSheet("background-color: #313244; color: #cdd6f4; padding: 6px; border-radius: 4px;")
         inp_layout.addWidget(self.chat_input)
         
-        btn_send = QPushButton("Gönder")
-        btn_send.clicked.connect(self.send_chat_message)
-        btn_send.setStyleSheet("background-color: #89b4fa; color: #1e1e2e; font-weight: bold; border-radius: 4px; padding: 6px;")
-        inp_layout.addWidget(btn_send)
+        self.btn_send = QPushButton("Gönder")
+        self.btn_send.clicked.connect(self.send_chat_message)
+        self.btn_send.setStyleSheet("background-color: #89b4fa; color: #1e1e2e; font-weight: bold; border-radius: 4px; padding: 6px;")
+        inp_layout.addWidget(self.btn_send)
         chat_layout.addLayout(inp_layout)
         
         self.splitter.addWidget(self.chatbot_widget)
@@ -315,9 +326,19 @@ class EditorWindow(QMainWindow):
         self.splitter.setSizes([400, 700, 400]) 
         
         self.converter = Md2PdfConverter()
+        settings = self.preview_pane.settings()
+        settings.setAttribute(settings.WebAttribute.LocalContentCanAccessRemoteUrls, True)
+        # Loads the page once, then only patches changed blocks
+        self.live_preview = LivePreview(self.preview_pane, self.converter)
+        # Re-renders only the Markdown blocks touched by an edit
+        self.incremental = IncrementalMarkdown(self.converter.markdown)
+        # Parsing runs in the background so typing never waits for it
+        self.preview_worker = PreviewWorker(self.incremental)
+        self.preview_worker.rendered.connect(self.on_preview_rendered)
+        self.preview_worker.error.connect(self.on_preview_error)
+        self.preview_worker.start()
         self.preview_timer = QTimer()
         self.preview_timer.setSingleShot(True)
-        self.preview_timer.interval = 500
         self.preview_timer.timeout.connect(self.update_preview)
         
         self.setup_shortcuts()
@@ -337,26 +358,34 @@ class EditorWindow(QMainWindow):
 
     def on_text_changed(self):
         if self.act_preview.isChecked():
-            self.preview_timer.start(800)
+            # Debounce adapts to how long the last renders took
+            self.preview_timer.start(self.preview_worker.debounce_delay())
 
     def update_preview(self):
         if not self.act_preview.isChecked(): return
-        
-        md_content = self.editor_pane.toPlainText()
-        html_body = markdown.markdown(
-            md_content, 
-            extensions=['extra', 'codehilite', 'tables', 'fenced_code', 'nl2br', 'pymdownx.arithmatex', 'pymdownx.superfences']
-        )
-        full_html = self.converter.html_template.format(content=html_body)
-        
+
+        # Same cached parser and extension profile as the PDF output
+        self.preview_worker.submit(self.editor_pane.toPlainText())
+
+    def on_preview_rendered(self, generation, blocks, seconds):
+        # A newer edit is already queued, its result will follow
+        if not self.preview_worker.is_current(generation):
+            return
+
         if self.file_path:
             base_url = QUrl.fromLocalFile(os.path.dirname(os.path.abspath(self.file_path)) + os.sep)
         else:
             base_url = QUrl.fromLocalFile(os.getcwd() + os.sep)
-            
-        settings = self.preview_pane.settings()
-        settings.setAttribute(settings.WebAttribute.LocalContentCanAccessRemoteUrls, True)
-        self.preview_pane.setHtml(full_html, base_url)
+
+        self.live_preview.update_blocks(blocks, base_url)
+
+    def on_preview_error(self, generation, err):
+        print(f"Preview render error: {err}")
+
+    def closeEvent(self, event):
+        self.preview_timer.stop()
+        self.preview_worker.stop()
+        super().closeEvent(event)
 
     def load_config(self):
         if os.path.exists(CONFIG_FILE):
@@ -416,6 +445,8 @@ class EditorWindow(QMainWindow):
     def send_chat_message(self):
         msg = self.chat_input.text().strip()
         if not msg: return
+        # One reply at a time: its text, canvas edit and history turn belong together
+        if self.worker is not None: return
         
         provider = self.config.get("provider", "Google Gemini")
         api_key = self.config.get("gemini_key") if provider == "Google Gemini" else self.config.get("open_router_key")
@@ -433,50 +464,107 @@ class EditorWindow(QMainWindow):
             instruction = (
                 "\n[SİSTEM: Canvas Modu AÇIK]\n"
                 "Kullanıcı düzenleme isterse, aşağıdaki metni güncelle. "
-                "Cevabında yeni içeriği sadece <<<UPDATE>>> ve <<<END>>> etiketleri arasına yaz. "
+                "Yerel değişiklikleri <<<PATCH>>> ve <<<END>>> etiketleri arasına yaz; her değişiklik için "
+                "'<<<<<<< SEARCH' satırı, mevcut metinden birebir kopyalanmış ve metinde tek bir yerde geçen satırlar, "
+                "'=======' satırı, yerlerine gelecek satırlar ve '>>>>>>> REPLACE' satırı yaz. "
+                "Tüm değişiklikleri tek bir <<<PATCH>>> bloğuna koy. "
                 "Açıklamaları etiketlerin dışına yaz."
             )
+            if estimate_tokens(current_text) > self.chat_context.document_tokens:
+                instruction += " Metnin yalnızca bir kısmını görüyorsun; sadece <<<PATCH>>> kullan."
+            else:
+                instruction += (" Belgenin büyük kısmını yeniden yazman gerekiyorsa yeni içeriğin tamamını "
+                                "<<<UPDATE>>> ve <<<END>>> etiketleri arasına yazabilirsin.")
         else:
             instruction = (
                 "\n[SİSTEM: Canvas Modu KAPALI]\n"
                 "Kullanıcının metnini oku ama DEĞİŞTİRME YETKİN YOK. "
                 "Sadece sohbet penceresinden cevap ver, önerilerde bulun. "
-                "<<<UPDATE>>> etiketini ASLA kullanma."
+                "<<<UPDATE>>> veya <<<PATCH>>> etiketlerini ASLA kullanma."
             )
 
-        full_msg = f"{self.system_prompt_base}\n{instruction}\n\nKullanıcı İsteği: {msg}\n\nAktif Editör İçeriği (Referans):\n```markdown\n{current_text}\n```"
-        
         self.chat_history.append(f"<div style='color: #89b4fa;'><b>Sen:</b> {msg}</div>")
         self.chat_input.clear()
         self.chat_history.append(f"<div style='color: #bac2de;'><i>Asistan çalışıyor...</i></div>")
         
-        # Send clean messages structure (keeping roles simpler for API compatibility)
-        # We append the full context message as "user"
-        self.messages.append({"role": "user", "content": full_msg})
-        
-        self.worker = ChatWorker(provider, api_key, self.config.get("model"), self.messages)
+        # Only the latest message carries the editor text (or a diff/the relevant sections);
+        # canvas edits come back as patches, so large documents need not be sent whole
+        cursor = self.editor_pane.textCursor()
+        messages = self.chat_context.build(msg, current_text, f"{self.system_prompt_base}\n{instruction}",
+                                           focus=(cursor.selectionStart(), cursor.selectionEnd()))
+
+        # The reply streams into this block as it arrives
+        self.chat_history.append("<div style='color: #a6e3a1;'><b>Asistan:</b></div>")
+        self.reply_start = self.chat_history.textCursor().position()
+        self.reply_text = ""
+        self.reply_canvas = is_canvas_on
+        self.reply_applied = False
+        self.reply_partial = self.chat_context.last_stats["mode"] == "sections"
+        self.reply_error = None
+
+        base_url = self.config.get("gemini_base_url" if provider == "Google Gemini" else "openrouter_base_url")
+        self.worker = ChatWorker(provider, api_key, self.config.get("model"), messages, base_url)
+        self.worker.chunk.connect(self.on_chat_chunk)
         self.worker.finished.connect(self.on_chat_response)
         self.worker.error.connect(self.on_chat_error)
+        self.btn_send.setEnabled(False)
         self.worker.start()
 
+    def release_worker(self):
+        """The current reply is complete; sending is possible again"""
+        self.done_workers = [w for w in self.done_workers if w.isRunning()]
+        self.done_workers.append(self.worker)
+        self.worker = None
+        self.btn_send.setEnabled(True)
+
+    def on_chat_chunk(self, text):
+        if self.sender() is not self.worker:
+            return
+        self.reply_text += text
+        # Canvas updates are applied as soon as the closing marker has arrived
+        if self.reply_canvas and not self.reply_applied:
+            self.apply_canvas_reply(self.reply_text)
+        self.show_reply(visible_reply(self.reply_text, self.reply_canvas))
+
+    def show_reply(self, text):
+        cursor = self.chat_history.textCursor()
+        cursor.setPosition(self.reply_start)
+        cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+        fmt = cursor.charFormat()
+        fmt.setForeground(QColor("#a6e3a1"))
+        cursor.insertText("\n" + text, fmt)
+        self.chat_history.ensureCursorVisible()
+
     def on_chat_response(self, response):
-        # Only process updates if Canvas Mode is ON
-        if self.act_canvas.isChecked():
-            update_match = re.search(r'<<<UPDATE>>>(.*?)<<<END>>>', response, re.DOTALL)
-            if update_match:
-                new_content = update_match.group(1).strip()
-                self.editor_pane.setPlainText(new_content)
-                # Remove the update block from display to keep chat clean
-                display_response = response.replace(update_match.group(0), "<i>[✅ Editör içeriği güncellendi]</i>")
-            else:
-                display_response = response
-        else:
-            # If AI accidentally sent tags (shouldn't if instucted), ignore them visually or strip?
-            # Let's just show as is, no auto-update.
-            display_response = response
+        if self.sender() is not self.worker:
+            return
+        self.release_worker()
+        # Only process updates if Canvas Mode is ON (streaming may have applied it already)
+        if self.reply_canvas and not self.reply_applied:
+            self.apply_canvas_reply(response)
+        self.reply_text = response
+        self.show_reply(visible_reply(response, self.reply_canvas, final=True))
+        if self.reply_error:
+            self.chat_history.append(f"<div style='color: #f38ba8;'><b>Hata:</b> {self.reply_error}</div>")
+        self.chat_history.append("")
+        self.chat_context.add_reply(response)
 
-        self.chat_history.append(f"<div style='color: #a6e3a1;'><b>Asistan:</b> {display_response}</div><br>")
-        self.messages.append({"role": "assistant", "content": response})
+    def apply_canvas_reply(self, reply):
+        """Applies the first complete UPDATE/PATCH block as minimal edits (one undo step)"""
+        try:
+            edits = reply_edits(reply, self.editor_pane.toPlainText(), allow_update=not self.reply_partial)
+        except PatchError as e:
+            self.reply_applied = True
+            self.reply_error = f"Düzenleme uygulanamadı: {e}"
+            return
+        if edits is not None:
+            apply_edits(self.editor_pane, edits)
+            self.reply_applied = True
+            print(f"AI edit: {len(edits)} change(s), {sum(len(r) for _, _, r in edits)} chars inserted")
 
     def on_chat_error(self, err):
+        if self.sender() is not self.worker:
+            return
+        self.release_worker()
+        self.chat_context.discard_pending()
         self.chat_history.append(f"<div style='color: #f38ba8;'><b>Hata:</b> {err}</div><br>")
@@ -0,0 +1,243 @@
+import os
+import time
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import wait
+
+from batch import RenderResult
+
+
+def worker_main(conn, docx, converter_options, docx_options=None, docx_engine="pdf2docx", pdf=True):
+    """Entry point of a farm worker: owns an offscreen QApplication and a converter"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from converter import Md2PdfConverter
+    import offline_bundle
+
+    offline_bundle.register_scheme()
+    app = QApplication([])
+    converter = Md2PdfConverter(**converter_options)
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        job_id, input_path, output_path = job
+        started = time.perf_counter()
+        error = ""
+        try:
+            ok = converter.convert(input_path, output_path) if pdf else True
+            docx_path = os.path.splitext(output_path)[0] + ".docx"
+            if not ok:
+                error = "PDF conversion failed"
+            elif docx and docx_engine == "direct":
+                if not converter.export_docx(input_path, docx_path):
+                    ok = False
+                    error = "DOCX export failed"
+            elif docx and not converter.convert_to_docx(output_path, docx_path, **(docx_options or {})):
+                ok = False
+                error = "DOCX conversion failed"
+        except Exception:
+            ok = False
+            error = traceback.format_exc()
+        conn.send(("done", (job_id, ok, error, time.perf_counter() - started)))
+
+    app.quit()
+
+
+class FarmWorker:
+    def __init__(self, ctx, docx, converter_options, docx_options=None, docx_engine="pdf2docx", pdf=True):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=worker_main,
+                                   args=(child_conn, docx, converter_options, docx_options,
+                                         docx_engine, pdf),
+                                   daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.job = None
+        self.job_started = 0.0
+        self.spawned = time.monotonic()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+
+class ConversionFarm:
+    """Converts a large batch across several worker processes.
+
+    Each worker runs its own offscreen QApplication and Md2PdfConverter, so
+    Chromium rendering and markdown parsing are spread over all cores. Workers
+    that crash or exceed job_timeout are killed and replaced; their job is
+    retried up to max_retries times before being reported as failed.
+
+    poll() never blocks longer than its timeout, so a QTimer in the GUI can
+    drive the farm; run() does the same in a loop for headless use.
+    """
+
+    def __init__(self, workers=None, job_timeout=300, startup_timeout=60,
+                 max_retries=1, docx=False, converter_options=None, docx_options=None,
+                 docx_engine="pdf2docx", pdf=True):
+        self.ctx = mp.get_context("spawn")
+        self.num_workers = workers or os.cpu_count() or 1
+        self.job_timeout = job_timeout
+        self.startup_timeout = startup_timeout
+        self.max_retries = max_retries
+        self.docx = docx
+        self.converter_options = converter_options or {}
+        self.docx_engine = docx_engine
+        self.pdf = pdf
+        # Workers are daemon processes and cannot start pdf2docx's own process pool
+        self.docx_options = {k: v for k, v in (docx_options or {}).items()
+                             if k not in ("multi_processing", "cpu_count") and v is not None}
+
+        self.workers = []
+        self.jobs = {}
+        self.pending = []
+        self.attempts = {}
+        self.results = []
+        self.next_id = 0
+        self.restarts = 0
+        self.startup_failures = 0
+
+    @property
+    def total(self):
+        return len(self.jobs)
+
+    def submit(self, input_path, output_path=None):
+        if not output_path:
+            output_path = os.path.splitext(input_path)[0] + ".pdf"
+        job_id = self.next_id
+        self.next_id += 1
+        self.jobs[job_id] = (input_path, output_path)
+        self.attempts[job_id] = 0
+        self.pending.append(job_id)
+        return job_id
+
+    def is_done(self):
+        return len(self.results) == len(self.jobs)
+
+    def start(self):
+        needed = min(self.num_workers, len(self.pending)) or 1
+        while len(self.workers) < needed:
+            self.spawn_worker()
+
+    def spawn_worker(self):
+        worker = FarmWorker(self.ctx, self.docx, self.converter_options, self.docx_options,
+                            self.docx_engine, self.pdf)
+        self.workers.append(worker)
+        return worker
+
+    def replace_worker(self, worker, reason):
+        """Kills a crashed or hung worker, requeues or fails its job and spawns a new one"""
+        self.workers.remove(worker)
+        worker.kill()
+        self.restarts += 1
+        events = []
+        if worker.job is not None:
+            job_id = worker.job
+            if self.attempts[job_id] <= self.max_retries:
+                self.pending.insert(0, job_id)
+            else:
+                events.append(self.make_result(job_id, False, reason, time.monotonic() - worker.job_started))
+        if self.pending:
+            self.spawn_worker()
+        return events
+
+    def make_result(self, job_id, ok, error, elapsed):
+        input_path, output_path = self.jobs[job_id]
+        result = RenderResult(input_path, output_path, ok, error, elapsed)
+        self.results.append(result)
+        return result
+
+    def dispatch(self):
+        for worker in self.workers:
+            if not self.pending:
+                break
+            if worker.ready and worker.job is None:
+                job_id = self.pending.pop(0)
+                input_path, output_path = self.jobs[job_id]
+                worker.job = job_id
+                worker.job_started = time.monotonic()
+                self.attempts[job_id] += 1
+                try:
+                    worker.conn.send((job_id, input_path, output_path))
+                except (BrokenPipeError, OSError):
+                    # Picked up as a dead worker by the next health check
+                    pass
+
+    def poll(self, timeout=0.0):
+        """Dispatches jobs and returns the RenderResults that completed since the last call"""
+        events = []
+        self.dispatch()
+
+        conns = {worker.conn: worker for worker in self.workers}
+        for conn in wait(list(conns), timeout) if conns else []:
+            worker = conns[conn]
+            try:
+                kind, payload = conn.recv()
+            except (EOFError, OSError):
+                continue
+            if kind == "ready":
+                worker.ready = True
+                self.startup_failures = 0
+            elif kind == "done":
+                job_id, ok, error, elapsed = payload
+                worker.job = None
+                if ok or self.attempts[job_id] > self.max_retries:
+                    events.append(self.make_result(job_id, ok, error, elapsed))
+                else:
+                    self.pending.insert(0, job_id)
+
+        # Health checks: crashed, hung or never-started workers
+        now = time.monotonic()
+        for worker in list(self.workers):
+            if not worker.process.is_alive():
+                if not worker.ready:
+                    self.startup_failures += 1
+                events += self.replace_worker(worker, f"Worker exited with code {worker.process.exitcode}")
+            elif worker.job is not None and now - worker.job_started > self.job_timeout:
+                events += self.replace_worker(worker, f"Timed out after {self.job_timeout} s")
+            elif not worker.ready and now - worker.spawned > self.startup_timeout:
+                self.startup_failures += 1
+                events += self.replace_worker(worker, "Worker failed to start")
+
+        # Give up instead of respawning forever when workers cannot start at all
+        if self.startup_failures >= 3 * self.num_workers and not any(w.ready for w in self.workers):
+            while self.pending:
+                events.append(self.make_result(self.pending.pop(0), False, "Workers failed to start", 0.0))
+
+        self.dispatch()
+        if self.is_done():
+            self.close()
+        return events
+
+    def run(self, on_progress=None):
+        """Blocks until every submitted job has a result; on_progress(done, total, result)"""
+        self.start()
+        done = len(self.results)
+        while not self.is_done():
+            for result in self.poll(timeout=0.5):
+                done += 1
+                if on_progress:
+                    on_progress(done, self.total, result)
+        return self.results
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self.workers:
+            worker.process.join(5)
+            worker.kill()
+        self.workers = []
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import pygments
+import markdown.extensions.codehilite
+import pymdownx.highlight
+
+# Modules whose module-level pygments.highlight is replaced by the cached version
+PATCHED_MODULES = [markdown.extensions.codehilite, pymdownx.highlight]
+
+
+class HighlightCache:
+    """Memoizes pygments.highlight for the codehilite/pymdownx.highlight extensions.
+
+    Keys cover the code, the lexer class and options (i.e. the language) and
+    the formatter class and options (line numbers, css class, hl_lines...).
+    The cache is LRU-bounded and can be saved to and loaded from a JSON file.
+    """
+
+    def __init__(self, max_entries=4096, persist_path=None):
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.dirty = False
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+        if persist_path:
+            self.load()
+
+    @staticmethod
+    def make_key(code, lexer, formatter):
+        parts = [
+            type(lexer).__module__, type(lexer).__qualname__,
+            repr(sorted(lexer.options.items())),
+            type(formatter).__module__, type(formatter).__qualname__,
+            repr(sorted(formatter.options.items())),
+            code,
+        ]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def highlight(self, code, lexer, formatter, outfile=None):
+        if outfile is not None:
+            return pygments.highlight(code, lexer, formatter, outfile)
+
+        key = self.make_key(code, lexer, formatter)
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        html = pygments.highlight(code, lexer, formatter)
+        with self.lock:
+            self.entries[key] = html
+            self.dirty = True
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return html
+
+    def load(self):
+        if not (self.persist_path and os.path.exists(self.persist_path)):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Highlight cache could not be loaded: {e}")
+            return
+        with self.lock:
+            for key, html in data.get("entries", []):
+                self.entries[key] = html
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        if not (self.persist_path and self.dirty):
+            return
+        with self.lock:
+            data = {"entries": list(self.entries.items())}
+            self.dirty = False
+        os.makedirs(os.path.dirname(os.path.abspath(self.persist_path)), exist_ok=True)
+        tmp_path = self.persist_path + ".part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.persist_path)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+        }
+
+
+_installed = None
+
+
+def install(cache=None):
+    """Routes all highlighting through cache (a new HighlightCache by default)"""
+    global _installed
+    if cache is None:
+        cache = _installed or HighlightCache()
+    for module in PATCHED_MODULES:
+        module.highlight = cache.highlight
+    _installed = cache
+    return cache
+
+
+def installed_cache():
+    return _installed
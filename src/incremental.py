@@ -0,0 +1,240 @@
+import hashlib
+import re
+from collections import OrderedDict
+
+from markdown.extensions.toc import unique
+from markdown.util import BLOCK_LEVEL_ELEMENTS
+
+from md_parser import shared_renderer
+
+FENCE_RE = re.compile(r'^\s*(`{3,}|~{3,})')
+REF_DEF_RE = re.compile(r'^ {0,3}\[([^\]^][^\]]*)\]:\s*\S')
+REF_USE_RE = re.compile(r'\[([^\[\]]+)\]')
+LIST_ITEM_RE = re.compile(r'^\s*([-*+]|\d+[.)])\s')
+ATX_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+SETEXT_RE = re.compile(r'^(=+|-+)\s*$')
+# Raw HTML blocks run until their element (or comment) closes, blank lines included
+HTML_VOID_TAGS = {"hr", "br", "img", "input", "link", "meta", "col", "embed", "source", "track", "wbr"}
+HTML_BLOCK_RE = re.compile(r'^ {0,3}<(!--|[A-Za-z][A-Za-z0-9-]*)(?=[\s/>]|$)')
+HEADING_ID_RE = re.compile(r'(<h[1-6][^>]*\bid=")([^"]*)(")')
+TOC_DIV_RE = re.compile(r'<div class="toc">.*?</div>', re.DOTALL)
+TOC_MARKER = "[TOC]"
+# Footnotes and abbreviations apply to the whole document
+GLOBAL_DEF_RE = re.compile(r'^ {0,3}(\[\^[^\]]+\]:|\*\[[^\]]+\]:)', re.MULTILINE)
+
+
+class SourceBlock:
+    def __init__(self, lines):
+        self.text = "\n".join(lines)
+        self.headings = []
+
+
+class IncrementalMarkdown:
+    """Renders Markdown block by block, re-rendering only blocks that changed.
+
+    The source is split into top-level blocks (paragraphs, headings, fences,
+    math, raw HTML, tables, lists). Each block's HTML is cached by the hash of its text
+    plus the reference-link definitions it uses, so an edit only re-renders
+    the blocks it touched. Document-wide parts are stitched back together:
+    heading ids are de-duplicated in document order like the toc extension
+    does, and a [TOC] block is rebuilt from all headings. Documents with
+    footnotes or abbreviations are rendered in full.
+    """
+
+    def __init__(self, renderer=None, max_entries=2048):
+        self.renderer = renderer or shared_renderer()
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.full_renders = 0
+
+    def split(self, text):
+        """(blocks, {label: definition line}) of the source"""
+        blocks = []
+        ref_defs = {}
+        current = []
+        fence = None
+        in_math = False
+        # Open raw HTML block: (tag or "!--", nesting depth)
+        html = None
+        blank_before = False
+
+        def flush():
+            if current:
+                blocks.append(SourceBlock(current[:]))
+                current.clear()
+
+        for line in text.split("\n"):
+            if fence is not None:
+                current.append(line)
+                match = FENCE_RE.match(line)
+                if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence) \
+                        and not line.strip()[len(match.group(1)):].strip():
+                    fence = None
+                continue
+            if in_math:
+                current.append(line)
+                if line.rstrip().endswith("$$"):
+                    in_math = False
+                continue
+            if html is not None:
+                current.append(line)
+                html = self.html_block(html[0], html[1], line)
+                continue
+
+            if not line.strip():
+                blank_before = True
+                continue
+
+            ref = REF_DEF_RE.match(line)
+            if ref:
+                ref_defs[ref.group(1).strip().lower()] = line
+                continue
+
+            if blank_before and current:
+                if self.continues(current, line):
+                    current.append("")
+                else:
+                    flush()
+            blank_before = False
+
+            match = FENCE_RE.match(line)
+            tag = self.html_block_tag(line)
+            if tag and current and not (LIST_ITEM_RE.match(current[0]) or current[0].startswith(">")):
+                # Like a heading, a block-level tag ends the paragraph before it
+                flush()
+            if tag and not current:
+                html = self.html_block(tag, 0, line)
+            elif match:
+                fence = match.group(1)
+            elif line.strip().startswith("$$") and not (len(line.strip()) > 2 and line.rstrip().endswith("$$")):
+                in_math = True
+            elif ATX_HEADING_RE.match(line) and current and not line[:1].isspace():
+                # A heading ends the paragraph before it even without a blank line
+                flush()
+            current.append(line)
+
+        flush()
+        for block in blocks:
+            block.headings = self.headings_of(block.text)
+        return blocks, ref_defs
+
+    @staticmethod
+    def html_block_tag(line):
+        """Tag name (or "!--") if line opens a raw HTML block"""
+        match = HTML_BLOCK_RE.match(line)
+        if match is None:
+            return None
+        tag = match.group(1).lower()
+        return tag if tag == "!--" or tag in BLOCK_LEVEL_ELEMENTS else None
+
+    @staticmethod
+    def html_block(tag, depth, line):
+        """(tag, depth) after line, or None once the block is closed"""
+        if tag == "!--":
+            return None if "-->" in line else (tag, depth)
+        if tag in HTML_VOID_TAGS:
+            return None
+        lower = line.lower()
+        depth += len(re.findall(rf'<{tag}(?=[\s>]|$)(?![^>]*/>)', lower))
+        depth -= len(re.findall(rf'</{tag}\s*>', lower))
+        return (tag, depth) if depth > 0 else None
+
+    @staticmethod
+    def continues(current, line):
+        """Whether line, after a blank line, still belongs to the current block"""
+        first = current[0]
+        if line[:1] in (" ", "\t"):
+            return bool(LIST_ITEM_RE.match(first)) or first.startswith(">")
+        if LIST_ITEM_RE.match(first) and LIST_ITEM_RE.match(line):
+            return True
+        if first.startswith(">") and line.startswith(">"):
+            return True
+        # Definition list items
+        return line.startswith(": ")
+
+    @staticmethod
+    def headings_of(text):
+        """Headings of a block as ATX lines, used to rebuild the TOC"""
+        headings = []
+        lines = text.split("\n")
+        if FENCE_RE.match(lines[0]):
+            return headings
+        if len(lines) > 1 and SETEXT_RE.match(lines[1]):
+            level = "#" if lines[1][0] == "=" else "##"
+            headings.append(f"{level} {lines[0].strip()}")
+        headings.extend(line for line in lines if ATX_HEADING_RE.match(line))
+        return headings
+
+    def render_block(self, source):
+        key = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        html = self.cache.get(key)
+        if html is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return html
+        self.misses += 1
+        html = self.renderer.convert(source)
+        self.cache[key] = html
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return html
+
+    def render_blocks(self, text):
+        """List of HTML fragments, one per top-level Markdown block"""
+        if GLOBAL_DEF_RE.search(text):
+            self.full_renders += 1
+            return [self.renderer.convert(text)]
+
+        blocks, ref_defs = self.split(text)
+        fragments = []
+        toc_html = None
+        for block in blocks:
+            source = block.text
+            # Reference definitions can live anywhere; give each block the ones it uses
+            used = [ref_defs[label] for label in
+                    {m.group(1).strip().lower() for m in REF_USE_RE.finditer(source)}
+                    if label in ref_defs]
+            if used:
+                source += "\n\n" + "\n".join(sorted(used))
+            html = self.render_block(source)
+
+            if TOC_MARKER in block.text and '<div class="toc">' in html:
+                if toc_html is None:
+                    toc_html = self.document_toc(blocks)
+                html = TOC_DIV_RE.sub(lambda m: toc_html, html, count=1)
+            fragments.append(html)
+
+        return self.unique_heading_ids(fragments)
+
+    def render(self, text):
+        return "\n".join(self.render_blocks(text))
+
+    def document_toc(self, blocks):
+        headings = [h for block in blocks for h in block.headings]
+        html = self.render_block("\n\n".join(headings + [TOC_MARKER]))
+        match = TOC_DIV_RE.search(html)
+        return match.group(0) if match else ""
+
+    @staticmethod
+    def unique_heading_ids(fragments):
+        """Blocks are rendered alone, so repeated headings need the toc suffixes (_1, _2...)"""
+        ids = set()
+
+        def sub(match):
+            return match.group(1) + unique(match.group(2), ids) + match.group(3)
+
+        return [HEADING_ID_RE.sub(sub, html) for html in fragments]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "full_renders": self.full_renders,
+            "entries": len(self.cache),
+        }
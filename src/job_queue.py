@@ -0,0 +1,221 @@
+import os
+import time
+from dataclasses import dataclass, field
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from batch import BatchRenderer
+from docx_stage import DocxStage
+
+# Entry states
+QUEUED = "queued"
+RENDERING = "rendering"
+DOCX = "docx"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+
+@dataclass
+class QueueEntry:
+    input_path: str
+    output_path: str
+    state: str = QUEUED
+    attempts: int = 0
+    error: str = ""
+    cached: bool = False
+    queued_at: float = field(default_factory=time.perf_counter)
+    render_seconds: float = 0.0
+    docx_seconds: float = 0.0
+    finished_at: float = 0.0
+
+    @property
+    def total_seconds(self):
+        return (self.finished_at or time.perf_counter()) - self.queued_at
+
+
+class ConversionQueue(QObject):
+    """Job queue behind the main window's file list.
+
+    Entries wait here and are handed to a BatchRenderer only as render
+    slots free up, so the order can still change (prioritize), the queue can
+    be paused and cancelled, and failed renders are retried. Everything runs
+    from the GUI event loop without blocking it; feeding happens from a
+    zero-delay timer so long runs of cache hits don't recurse or starve
+    repaints.
+    """
+    entry_changed = pyqtSignal(object)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal()
+
+    def __init__(self, converter, max_in_flight=2, max_retries=1, docx=False,
+                 docx_workers=None, docx_options=None, docx_engine="pdf2docx", parent=None):
+        super().__init__(parent)
+        self.converter = converter
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.docx = docx
+        self.docx_engine = docx_engine
+        # DOCX conversion overlaps with rendering the next files
+        self.docx_stage = None
+        if docx and docx_engine != "direct":
+            self.docx_stage = DocxStage(converter, max_workers=docx_workers,
+                                        options=docx_options, parent=self)
+            self.docx_stage.job_finished.connect(self.on_docx_finished)
+        self.entries = []
+        self.pending = []
+        self.by_input = {}
+        self.paused = False
+        self.cancelled = False
+        self.running = False
+
+        self.renderer = BatchRenderer(converter, [], max_in_flight=self.max_in_flight, parent=self)
+        self.renderer.job_finished.connect(self.on_rendered)
+        self.feed_timer = QTimer(self)
+        self.feed_timer.setSingleShot(True)
+        self.feed_timer.setInterval(0)
+        self.feed_timer.timeout.connect(self.feed)
+
+    def add(self, input_path, output_path):
+        entry = self.by_input.get(input_path)
+        if entry is not None and entry.state not in FINAL_STATES:
+            return entry
+        entry = QueueEntry(input_path, output_path)
+        self.entries.append(entry)
+        self.pending.append(entry)
+        self.by_input[input_path] = entry
+        self.entry_changed.emit(entry)
+        if self.running:
+            self.schedule_feed()
+        return entry
+
+    def start(self):
+        self.running = True
+        self.cancelled = False
+        self.renderer.start()
+        self.schedule_feed()
+
+    def pause(self):
+        """Stops handing out new jobs; documents already rendering finish"""
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        self.schedule_feed()
+
+    def cancel(self):
+        self.cancelled = True
+        pending = self.pending
+        self.pending = []
+        for entry in pending:
+            self.set_state(entry, CANCELLED)
+        if self.docx_stage is not None:
+            self.docx_stage.cancel()
+        self.check_done()
+
+    def prioritize(self, input_paths):
+        """Moves the given queued files to the front, keeping their relative order"""
+        wanted = set(input_paths)
+        front = [e for e in self.pending if e.input_path in wanted]
+        self.pending = front + [e for e in self.pending if e.input_path not in wanted]
+
+    def in_flight(self):
+        return self.count(RENDERING)
+
+    def schedule_feed(self):
+        if not self.feed_timer.isActive():
+            self.feed_timer.start()
+
+    def feed(self):
+        if self.paused or self.cancelled:
+            self.check_done()
+            return
+        while self.pending and self.in_flight() < self.max_in_flight:
+            entry = self.pending.pop(0)
+            entry.attempts += 1
+            self.set_state(entry, RENDERING)
+            self.renderer.add_job(entry.input_path, entry.output_path)
+        self.check_done()
+
+    def on_rendered(self, result):
+        entry = self.by_input.get(result.input_path)
+        if entry is None:
+            return
+        entry.render_seconds += result.elapsed
+        entry.cached = result.cached
+        if not result.ok:
+            entry.error = result.error
+            if entry.attempts <= self.max_retries and not self.cancelled:
+                print(f"Retrying {result.input_path}: {result.error}")
+                self.set_state(entry, QUEUED)
+                self.pending.append(entry)
+            else:
+                self.set_state(entry, FAILED)
+        elif self.docx_stage is not None:
+            self.set_state(entry, DOCX)
+            self.docx_stage.submit(entry.output_path, tag=entry)
+        elif self.docx:
+            self.set_state(entry, DOCX)
+            # Outside the renderer's callback, export_docx may wait for the prerenderer
+            QTimer.singleShot(0, lambda: self.export_docx(entry))
+        else:
+            self.set_state(entry, DONE)
+        self.schedule_feed()
+
+    def export_docx(self, entry):
+        started = time.perf_counter()
+        docx_path = os.path.splitext(entry.output_path)[0] + ".docx"
+        ok = self.converter.export_docx(entry.input_path, docx_path)
+        entry.docx_seconds = time.perf_counter() - started
+        if ok:
+            self.set_state(entry, DONE)
+        else:
+            entry.error = "DOCX export failed"
+            self.set_state(entry, FAILED)
+        self.schedule_feed()
+
+    def on_docx_finished(self, result):
+        entry = result.tag
+        entry.docx_seconds = result.elapsed
+        if result.ok:
+            self.set_state(entry, DONE)
+        elif self.cancelled and result.error == "Cancelled":
+            self.set_state(entry, CANCELLED)
+        else:
+            entry.error = f"DOCX: {result.error}"
+            self.set_state(entry, FAILED)
+        self.schedule_feed()
+
+    def set_state(self, entry, state):
+        entry.state = state
+        if state in FINAL_STATES:
+            entry.finished_at = time.perf_counter()
+        self.entry_changed.emit(entry)
+        if state in FINAL_STATES:
+            self.progress.emit(self.count(*FINAL_STATES), len(self.entries))
+
+    def count(self, *states):
+        return sum(1 for e in self.entries if e.state in states)
+
+    def check_done(self):
+        if self.running and not self.pending and not self.count(RENDERING, DOCX):
+            self.running = False
+            self.finished.emit()
+
+    def stats(self):
+        done = [e for e in self.entries if e.state == DONE]
+        return {
+            "total": len(self.entries),
+            "done": len(done),
+            "failed": self.count(FAILED),
+            "cancelled": self.count(CANCELLED),
+            "cached": sum(1 for e in done if e.cached),
+            "retries": sum(max(0, e.attempts - 1) for e in self.entries),
+            "render_seconds": sum(e.render_seconds for e in self.entries),
+            "docx_seconds": sum(e.docx_seconds for e in self.entries),
+        }
+
+    def close(self):
+        if self.docx_stage is not None:
+            self.docx_stage.close()
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import threading
+import time
+from html.parser import HTMLParser
+from PyQt6.QtCore import QThread, pyqtSignal
+
+# Elements that never have a closing tag
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+                 "link", "meta", "param", "source", "track", "wbr"}
+
+
+class _BlockSplitter(HTMLParser):
+    """Records the offsets where top-level elements end"""
+
+    def __init__(self, text):
+        super().__init__(convert_charrefs=False)
+        self.text = text
+        self.depth = 0
+        self.ends = []
+        # Offset of every line start, getpos() reports (line, column)
+        self.line_starts = [0]
+        for i, ch in enumerate(text):
+            if ch == "\n":
+                self.line_starts.append(i + 1)
+
+    def position(self):
+        line, col = self.getpos()
+        return self.line_starts[line - 1] + col
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            if self.depth == 0:
+                self.ends.append(self.position() + len(self.get_starttag_text()))
+        else:
+            self.depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        if self.depth == 0:
+            self.ends.append(self.position() + len(self.get_starttag_text()))
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS or self.depth == 0:
+            return
+        self.depth -= 1
+        if self.depth == 0:
+            self.ends.append(self.text.index(">", self.position()) + 1)
+
+
+def split_blocks(html_body):
+    """Splits rendered Markdown HTML into its top-level elements"""
+    splitter = _BlockSplitter(html_body)
+    splitter.feed(html_body)
+    splitter.close()
+
+    blocks = []
+    start = 0
+    for end in splitter.ends + [len(html_body)]:
+        block = html_body[start:end].strip()
+        if block:
+            blocks.append(block)
+        start = end
+    return blocks
+
+
+class LivePreview:
+    """Keeps one preview page loaded and patches it block by block.
+
+    The page is loaded once with the full template (both libraries). Each
+    update splits the HTML into top-level blocks, keys them by content hash
+    and sends only the blocks the page does not have yet; unchanged blocks
+    keep their DOM (and rendered math/diagrams), and the scroll position
+    is preserved.
+    """
+
+    def __init__(self, view, converter):
+        self.view = view
+        self.converter = converter
+        self.base_url = None
+        self.loaded = False
+        self.page_keys = set()
+        self.pending = None
+        self.view.loadFinished.connect(self.on_loaded)
+
+    @staticmethod
+    def keyed_blocks(blocks):
+        """[(key, html)]: content hash plus an occurrence count for duplicate blocks"""
+        seen = {}
+        keyed = []
+        for block in blocks:
+            digest = hashlib.sha1(block.encode("utf-8")).hexdigest()[:16]
+            seen[digest] = seen.get(digest, 0) + 1
+            keyed.append((f"{digest}-{seen[digest]}", block))
+        return keyed
+
+    def update(self, html_body, base_url):
+        self.update_blocks(split_blocks(html_body), base_url)
+
+    def update_blocks(self, blocks, base_url):
+        """Shows blocks (list of HTML fragments) with base_url for relative links"""
+        if base_url != self.base_url:
+            # Relative links change meaning, start from a fresh page
+            self.base_url = base_url
+            self.loaded = False
+            self.page_keys = set()
+            self.view.setHtml(self.converter.build_html("", math=True, diagrams=True), base_url)
+
+        self.pending = blocks
+        if self.loaded:
+            self.flush()
+
+    def on_loaded(self, ok):
+        self.loaded = ok
+        self.page_keys = set()
+        if ok and self.pending is not None:
+            self.flush()
+
+    def flush(self, full=False):
+        blocks = self.pending
+        self.pending = None
+        keyed = self.keyed_blocks(blocks)
+        payload = [[key, None if key in self.page_keys and not full else block]
+                   for key, block in keyed]
+        self.page_keys = {key for key, _ in keyed}
+
+        def on_patched(missing):
+            # Page lost some blocks (e.g. reloaded): resend everything once
+            if missing and not full:
+                self.pending = blocks
+                self.flush(full=True)
+
+        script = "md2pdf.patch({}, {});".format(json.dumps(payload),
+                                                json.dumps(self.base_url.toString()))
+        self.view.page().runJavaScript(script, on_patched)
+
+
+class PreviewWorker(QThread):
+    """Renders preview Markdown off the GUI thread.
+
+    Only the newest request is kept: requests that arrive while a render is
+    running replace each other, so stale text is never parsed. Results carry
+    the request's generation number so the window can drop anything older
+    than the latest edit. The measured parse time drives the debounce delay.
+    """
+    rendered = pyqtSignal(int, object, float)
+    error = pyqtSignal(int, str)
+
+    def __init__(self, incremental, min_delay=50, max_delay=800):
+        super().__init__()
+        self.incremental = incremental
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.condition = threading.Condition()
+        self.request = None
+        self.stopping = False
+        self.generation = 0
+        # Moving average of render time in seconds
+        self.avg_seconds = None
+
+    def submit(self, text):
+        """Queues text for rendering and returns its generation number"""
+        with self.condition:
+            self.generation += 1
+            self.request = (self.generation, text)
+            self.condition.notify()
+            return self.generation
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def debounce_delay(self):
+        """Milliseconds to wait after a keystroke: about twice the recent parse time"""
+        if self.avg_seconds is None:
+            return self.min_delay
+        return int(min(self.max_delay, max(self.min_delay, self.avg_seconds * 2000)))
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.request is None and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                generation, text = self.request
+                self.request = None
+
+            started = time.perf_counter()
+            try:
+                blocks = self.incremental.render_blocks(text)
+            except Exception as e:
+                self.error.emit(generation, str(e))
+                continue
+            seconds = time.perf_counter() - started
+            self.avg_seconds = seconds if self.avg_seconds is None else 0.7 * self.avg_seconds + 0.3 * seconds
+            self.rendered.emit(generation, blocks, seconds)
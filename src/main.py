@@ -1,13 +1,23 @@
 import sys
 import os
+import time
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QListWidget, QFileDialog, 
                              QLabel, QProgressBar, QMessageBox, QFrame, QCheckBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from PyQt6.QtGui import QIcon, QDragEnterEvent, QDropEvent, QPixmap
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
+from PyQt6.QtGui import QIcon, QDragEnterEvent, QDropEvent, QPixmap, QColor
 
 from converter import Md2PdfConverter
+from renderer_pool import RendererPool
+from farm import ConversionFarm
+from job_queue import ConversionQueue
+from book import BookBuilder
+from watcher import ChangeWatcher
+from tracing import NULL_TRACER, tracer_for
+import job_queue
+from render_cache import RenderCache
 from editor import EditorWindow
+import offline_bundle
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -97,6 +107,32 @@ class MainWindow(QMainWindow):
         self.chk_docx.setStyleSheet("color: #bac2de; font-size: 13px;")
         layout.addWidget(self.chk_docx)
 
+        # Direct export skips the PDF round-trip through pdf2docx
+        self.chk_docx_direct = QCheckBox("Word'ü doğrudan Markdown'dan oluştur (daha hızlı)")
+        self.chk_docx_direct.setStyleSheet("color: #bac2de; font-size: 13px;")
+        layout.addWidget(self.chk_docx_direct)
+
+        # Checkbox for multi-process conversion (large batches)
+        self.chk_farm = QCheckBox("Çoklu işlem modunda dönüştür (büyük listeler için)")
+        self.chk_farm.setStyleSheet("color: #bac2de; font-size: 13px;")
+        layout.addWidget(self.chk_farm)
+
+        # Book mode: the list order is the chapter order
+        self.chk_book = QCheckBox("Tek PDF'te kitap olarak birleştir (içindekiler, sayfa numaraları)")
+        self.chk_book.setStyleSheet("color: #bac2de; font-size: 13px;")
+        layout.addWidget(self.chk_book)
+
+        # Watch mode: listed files are converted again whenever they or their images change
+        self.chk_watch = QCheckBox("Değişiklikleri izle ve otomatik dönüştür")
+        self.chk_watch.setStyleSheet("color: #bac2de; font-size: 13px;")
+        self.chk_watch.toggled.connect(self.toggle_watch)
+        layout.addWidget(self.chk_watch)
+
+        # Per-stage timings of the next batch, for profiling
+        self.chk_trace = QCheckBox("Performans izi kaydet (Chrome trace)")
+        self.chk_trace.setStyleSheet("color: #bac2de; font-size: 13px;")
+        layout.addWidget(self.chk_trace)
+
         # Separator
         line = QFrame()
         line.setFrameShape(QFrame.Shape.HLine)
@@ -110,6 +146,20 @@ class MainWindow(QMainWindow):
         self.btn_convert.clicked.connect(self.start_conversion)
         layout.addWidget(self.btn_convert)
 
+        # Queue controls, active while a batch runs
+        queue_layout = QHBoxLayout()
+        self.btn_pause = QPushButton("Duraklat")
+        self.btn_pause.clicked.connect(self.toggle_pause)
+        self.btn_prioritize = QPushButton("Seçiliyi Öne Al")
+        self.btn_prioritize.clicked.connect(self.prioritize_selected)
+        self.btn_cancel = QPushButton("İptal")
+        self.btn_cancel.setObjectName("deleteButton")
+        self.btn_cancel.clicked.connect(self.cancel_conversion)
+        for btn in (self.btn_pause, self.btn_prioritize, self.btn_cancel):
+            btn.setEnabled(False)
+            queue_layout.addWidget(btn)
+        layout.addLayout(queue_layout)
+
         # Progress Bar
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
@@ -123,7 +173,16 @@ class MainWindow(QMainWindow):
 
         # State
         self.output_dir = None
-        self.converter = Md2PdfConverter()
+        # Unchanged documents are copied from the render cache on re-runs
+        self.converter = Md2PdfConverter(cache=RenderCache(), prerender=True)
+        # Warm pages are reused across the batch instead of reloading the template per file
+        self.converter.pool = RendererPool(self.converter, size=1)
+        self.queue = None
+        self.farm = None
+        self.book = None
+        self.watcher = None
+        self.farm_timer = QTimer(self)
+        self.farm_timer.timeout.connect(self.poll_farm)
 
     def load_stylesheet(self):
         try:
@@ -154,9 +213,13 @@ class MainWindow(QMainWindow):
                 items = [self.file_list.item(i).text() for i in range(self.file_list.count())]
                 if path not in items:
                     self.file_list.addItem(path)
+                    if self.watcher is not None:
+                        self.watcher.add_path(path)
 
     def remove_files(self):
         for item in self.file_list.selectedItems():
+            if self.watcher is not None:
+                self.watcher.remove_input(os.path.abspath(item.text()))
             self.file_list.takeItem(self.file_list.row(item))
 
     def select_output_dir(self):
@@ -179,6 +242,21 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Uyarı", "Lütfen dönüştürülecek dosya ekleyin.")
             return
 
+        book_path = None
+        if self.chk_book.isChecked():
+            start_dir = self.output_dir or os.path.dirname(self.file_list.item(0).text())
+            book_path, _ = QFileDialog.getSaveFileName(self, "Kitabı Kaydet", os.path.join(start_dir, "kitap.pdf"),
+                                                       "PDF Files (*.pdf)")
+            if not book_path:
+                return
+
+        if self.chk_trace.isChecked():
+            trace_path, _ = QFileDialog.getSaveFileName(self, "İzi Kaydet", "md2pdf-trace.json",
+                                                        "Trace Files (*.json *.jsonl)")
+            if not trace_path:
+                return
+            self.converter.tracer = tracer_for(trace_path)
+
         self.btn_convert.setEnabled(False)
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
@@ -186,42 +264,206 @@ class MainWindow(QMainWindow):
 
         files = [self.file_list.item(i).text() for i in range(self.file_list.count())]
         total = len(files)
+
+        if book_path:
+            self.start_book_conversion(files, book_path)
+            return
+
+        if self.chk_farm.isChecked():
+            self.start_farm_conversion(files)
+            return
         
-        # Process in main thread to avoid QPainter/Font issues on Windows
-        for i, file_path in enumerate(files):
-            filename = os.path.basename(file_path)
-            self.status_label.setText(f"Dönüştürülüyor: {filename}...")
-            QApplication.processEvents() # Keep UI responsive
-            
-            # Determine Output Path
-            if self.output_dir:
-                pdf_dir = self.output_dir
-            else:
-                pdf_dir = os.path.dirname(file_path)
-                
-            base_name = os.path.splitext(filename)[0] + ".pdf"
-            output_path = os.path.join(pdf_dir, base_name)
-            
-            success = self.converter.convert(file_path, output_path)
-            
-            if success:
-                if self.chk_docx.isChecked():
-                    self.status_label.setText(f"Word'e çevriliyor: {filename}...")
-                    QApplication.processEvents()
-                    try:
-                        self.converter.convert_to_docx(output_path)
-                    except Exception as e:
-                        print(f"DOCX Hata: {e}")
-            else:
-               print(f"Hata: {filename}")
-            
-            self.progress_bar.setValue(int(((i + 1) / total) * 100))
+        # Rendering stays on the GUI thread (QPainter/Font issues on Windows) but is
+        # fully asynchronous, so the window keeps repainting during the batch
+        self.queue = ConversionQueue(self.converter, docx=self.chk_docx.isChecked(),
+                                     docx_engine="direct" if self.chk_docx_direct.isChecked() else "pdf2docx",
+                                     parent=self)
+        self.queue.entry_changed.connect(self.on_entry_changed)
+        self.queue.progress.connect(self.on_queue_progress)
+        self.queue.finished.connect(self.on_queue_finished)
+        for file_path in files:
+            self.queue.add(file_path, self.output_path_for(file_path))
+        for btn in (self.btn_pause, self.btn_prioritize, self.btn_cancel):
+            btn.setEnabled(True)
+        self.btn_pause.setText("Duraklat")
+        self.status_label.setText(f"{total} dosya sırada...")
+        self.queue.start()
+
+    def on_entry_changed(self, entry):
+        colors = {
+            job_queue.RENDERING: "#89b4fa",
+            job_queue.DOCX: "#f9e2af",
+            job_queue.DONE: "#a6e3a1",
+            job_queue.FAILED: "#f38ba8",
+            job_queue.CANCELLED: "#6c7086",
+        }
+        for item in self.file_list.findItems(entry.input_path, Qt.MatchFlag.MatchExactly):
+            tooltip = f"Durum: {entry.state}"
+            if entry.render_seconds:
+                tooltip += f" | PDF: {entry.render_seconds:.2f} sn"
+            if entry.docx_seconds:
+                tooltip += f" | DOCX: {entry.docx_seconds:.2f} sn"
+            if entry.error:
+                tooltip += f" | Hata: {entry.error}"
+            item.setToolTip(tooltip)
+            if entry.state in colors:
+                item.setForeground(QColor(colors[entry.state]))
+        if entry.state == job_queue.RENDERING:
+            self.status_label.setText(f"Dönüştürülüyor: {os.path.basename(entry.input_path)}...")
+        elif entry.state == job_queue.DOCX:
+            self.status_label.setText(f"Word'e çevriliyor: {os.path.basename(entry.input_path)}...")
+        elif entry.state == job_queue.FAILED:
+            print(f"Hata: {os.path.basename(entry.input_path)}: {entry.error}")
+
+    def on_queue_progress(self, done, total):
+        self.progress_bar.setValue(int((done / total) * 100))
+
+    def toggle_pause(self):
+        if self.queue is None:
+            return
+        if self.queue.paused:
+            self.queue.resume()
+            self.btn_pause.setText("Duraklat")
+        else:
+            self.queue.pause()
+            self.btn_pause.setText("Devam Et")
+            self.status_label.setText("Duraklatıldı (devam eden dosyalar bitiriliyor)")
+
+    def prioritize_selected(self):
+        if self.queue is not None:
+            self.queue.prioritize([item.text() for item in self.file_list.selectedItems()])
+
+    def cancel_conversion(self):
+        if self.queue is not None:
+            self.queue.cancel()
+            self.status_label.setText("İptal ediliyor...")
 
+    def on_queue_finished(self):
+        stats = self.queue.stats()
+        print(f"Conversion queue: {stats}")
+        if self.queue.docx_stage is not None:
+            print(f"DOCX stage: {self.queue.docx_stage.stats()}")
+        self.queue.close()
+        print(f"Renderer pool: {self.converter.pool.stats()}")
+        print(f"Markdown parser: {self.converter.markdown.stats()}")
+        print(f"Render cache: {self.converter.cache.stats()}")
+        self.finish_trace()
+        for btn in (self.btn_pause, self.btn_prioritize, self.btn_cancel):
+            btn.setEnabled(False)
+        self.btn_convert.setEnabled(True)
         self.status_label.setText("İşlem Tamamlandı!")
+        if stats["cancelled"]:
+            QMessageBox.information(self, "İptal", f"{stats['done']} dosya dönüştürüldü, {stats['cancelled']} dosya iptal edildi.")
+        elif stats["failed"]:
+            QMessageBox.warning(self, "Uyarı", f"{stats['failed']} dosya dönüştürülemedi.")
+        else:
+            QMessageBox.information(self, "Başarılı", "Tüm dosyalar dönüştürüldü!")
+
+    def finish_trace(self):
+        tracer = self.converter.tracer
+        if tracer.enabled:
+            tracer.close()
+            print(f"Trace: {tracer.stats()}")
+            self.converter.tracer = NULL_TRACER
+
+    def output_path_for(self, file_path):
+        # Determine Output Path
+        if self.output_dir:
+            pdf_dir = self.output_dir
+        else:
+            pdf_dir = os.path.dirname(file_path)
+
+        base_name = os.path.splitext(os.path.basename(file_path))[0] + ".pdf"
+        return os.path.join(pdf_dir, base_name)
+
+    def start_book_conversion(self, files, book_path):
+        # Only chapters that changed since the last build are rendered again
+        self.book = BookBuilder(self.converter, files, book_path, parent=self)
+        self.book.progress.connect(self.on_queue_progress)
+        self.book.finished.connect(self.on_book_finished)
+        self.status_label.setText(f"{len(files)} bölüm kitap olarak birleştiriliyor...")
+        self.book.start()
+
+    def on_book_finished(self, ok):
+        stats = self.book.stats()
+        print(f"Book: {stats}")
+        self.finish_trace()
+        self.progress_bar.setValue(100)
         self.btn_convert.setEnabled(True)
-        QMessageBox.information(self, "Başarılı", "Tüm dosyalar dönüştürüldü!")
+        self.status_label.setText("İşlem Tamamlandı!")
+        if ok:
+            QMessageBox.information(self, "Başarılı",
+                                    f"Kitap oluşturuldu: {stats['pages']} sayfa, "
+                                    f"{stats['rendered']}/{stats['chapters']} bölüm yeniden işlendi.")
+        else:
+            QMessageBox.warning(self, "Uyarı", "Kitap oluşturulamadı.")
+
+    def toggle_watch(self, checked):
+        if not checked:
+            if self.watcher is not None:
+                # Conversions still running finish before the watcher is deleted
+                self.watcher.close()
+                self.watcher = None
+            self.status_label.setText("İzleme durduruldu.")
+            return
+
+        self.watcher = ChangeWatcher(self.converter, self.output_path_for, parent=self)
+        self.watcher.scheduled.connect(self.on_watch_scheduled)
+        self.watcher.converted.connect(self.on_watch_converted)
+        for i in range(self.file_list.count()):
+            self.watcher.add_path(self.file_list.item(i).text())
+        self.status_label.setText(f"{len(self.watcher.inputs)} dosya izleniyor...")
+
+    def on_watch_scheduled(self, paths):
+        names = ", ".join(os.path.basename(p) for p in paths)
+        self.status_label.setText(f"Değişiklik algılandı, dönüştürülüyor: {names}")
+
+    def on_watch_converted(self, result):
+        for item in self.file_list.findItems(result.input_path, Qt.MatchFlag.MatchExactly):
+            item.setForeground(QColor("#a6e3a1" if result.ok else "#f38ba8"))
+            item.setToolTip(f"Otomatik dönüştürüldü: {result.elapsed:.2f} sn"
+                            if result.ok else f"Hata: {result.error}")
+        name = os.path.basename(result.input_path)
+        if result.ok:
+            self.status_label.setText(f"Güncellendi: {name} ({result.elapsed:.2f} sn)")
+        else:
+            self.status_label.setText(f"Dönüştürülemedi: {name}")
+            print(f"Hata: {name}: {result.error}")
+
+    def start_farm_conversion(self, files):
+        # Worker processes render in parallel; the GUI only polls for progress
+        self.farm = ConversionFarm(docx=self.chk_docx.isChecked(),
+                                   docx_engine="direct" if self.chk_docx_direct.isChecked() else "pdf2docx")
+        for file_path in files:
+            self.farm.submit(file_path, self.output_path_for(file_path))
+        self.farm.start()
+        self.status_label.setText(f"{len(files)} dosya {self.farm.num_workers} işlemde dönüştürülüyor...")
+        self.farm_timer.start(100)
+
+    def poll_farm(self):
+        for result in self.farm.poll():
+            # Worker processes only report the total time per document
+            self.converter.tracer.record("convert", time.perf_counter() - result.elapsed, result.elapsed,
+                                         result.input_path, ok=result.ok, worker=True)
+            if not result.ok:
+                print(f"Hata: {os.path.basename(result.input_path)}: {result.error}")
+        done = len(self.farm.results)
+        self.progress_bar.setValue(int((done / self.farm.total) * 100))
+
+        if self.farm.is_done():
+            self.farm_timer.stop()
+            failed = sum(1 for r in self.farm.results if not r.ok)
+            self.finish_trace()
+            self.status_label.setText("İşlem Tamamlandı!")
+            self.btn_convert.setEnabled(True)
+            if failed:
+                QMessageBox.warning(self, "Uyarı", f"{failed} dosya dönüştürülemedi.")
+            else:
+                QMessageBox.information(self, "Başarılı", "Tüm dosyalar dönüştürüldü!")
 
 if __name__ == "__main__":
+    # The md2pdf:// scheme for the offline bundle must exist before the app
+    offline_bundle.register_scheme()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
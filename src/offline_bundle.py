@@ -0,0 +1,156 @@
+"""Local copies of MathJax and Mermaid, served to WebEngine from memory.
+
+The libraries are fetched once into assets/vendor (or copied there by hand on
+air-gapped hosts) and exposed through the md2pdf:// URL scheme, so pages do
+not touch the network and each process reads the files only once.
+
+    python src/offline_bundle.py fetch
+"""
+import os
+import sys
+import requests
+from PyQt6.QtCore import QBuffer, QByteArray
+from PyQt6.QtWebEngineCore import (QWebEngineUrlScheme, QWebEngineUrlSchemeHandler,
+                                   QWebEngineUrlRequestJob, QWebEngineProfile)
+
+SCHEME = b"md2pdf"
+VENDOR_DIR = os.path.join(os.path.dirname(__file__), "assets", "vendor")
+
+MATHJAX_VERSION = "3.2.2"
+MERMAID_VERSION = "10.9.1"
+
+MATHJAX_CDN = f"https://cdn.jsdelivr.net/npm/mathjax@{MATHJAX_VERSION}/es5"
+MERMAID_CDN = f"https://cdn.jsdelivr.net/npm/mermaid@{MERMAID_VERSION}/dist"
+
+MATHJAX_FONTS = [
+    "AMS-Regular", "Calligraphic-Bold", "Calligraphic-Regular", "Fraktur-Bold",
+    "Fraktur-Regular", "Main-Bold", "Main-Italic", "Main-Regular", "Math-BoldItalic",
+    "Math-Italic", "Math-Regular", "SansSerif-Bold", "SansSerif-Italic",
+    "SansSerif-Regular", "Script-Regular", "Size1-Regular", "Size2-Regular",
+    "Size3-Regular", "Size4-Regular", "Typewriter-Regular", "Vector-Bold",
+    "Vector-Regular", "Zero",
+]
+
+# TeX extensions the tex-chtml/tex-svg components load at runtime, through
+# autoload (\boldsymbol, \cancel, \color, \ce...) or \require{...}, from
+# mathjax/input/tex/extensions/; all of them are bundled so nothing is fetched
+MATHJAX_TEX_EXTENSIONS = [
+    "action", "ams", "amscd", "autoload", "bbox", "boldsymbol", "braket", "bussproofs",
+    "cancel", "cases", "centernot", "color", "colortbl", "colorv2", "configmacros",
+    "empheq", "enclose", "extpfeil", "gensymb", "html", "mathtools", "mhchem",
+    "newcommand", "noerrors", "noundefined", "physics", "require", "setoptions",
+    "tagformat", "textcomp", "textmacros", "unicode", "upgreek", "verb",
+]
+
+# Local path (relative to VENDOR_DIR, also the md2pdf:// path) -> source URL
+BUNDLE_FILES = {
+    "mathjax/tex-chtml.js": f"{MATHJAX_CDN}/tex-chtml.js",
+    # Self-contained SVG output, used for pre-rendering formulas
+    "mathjax/tex-svg.js": f"{MATHJAX_CDN}/tex-svg.js",
+    "mermaid/mermaid.min.js": f"{MERMAID_CDN}/mermaid.min.js",
+}
+for _font in MATHJAX_FONTS:
+    BUNDLE_FILES[f"mathjax/output/chtml/fonts/woff-v2/MathJax_{_font}.woff"] = (
+        f"{MATHJAX_CDN}/output/chtml/fonts/woff-v2/MathJax_{_font}.woff")
+
+for _extension in MATHJAX_TEX_EXTENSIONS:
+    BUNDLE_FILES[f"mathjax/input/tex/extensions/{_extension}.js"] = (
+        f"{MATHJAX_CDN}/input/tex/extensions/{_extension}.js")
+
+MIME_TYPES = {
+    ".js": b"application/javascript",
+    ".woff": b"font/woff",
+}
+
+
+def local_url(name):
+    return f"{SCHEME.decode()}://vendor/{name}"
+
+
+def cdn_url(name):
+    return BUNDLE_FILES[name]
+
+
+def is_available():
+    return all(os.path.exists(os.path.join(VENDOR_DIR, name)) for name in BUNDLE_FILES)
+
+
+def fetch(force=False, timeout=60):
+    """Downloads the bundle into VENDOR_DIR; returns the names that were written"""
+    written = []
+    for name, url in BUNDLE_FILES.items():
+        path = os.path.join(VENDOR_DIR, name)
+        if os.path.exists(path) and not force:
+            continue
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".part", "wb") as f:
+            f.write(response.content)
+        os.replace(path + ".part", path)
+        written.append(name)
+    return written
+
+
+_scheme_registered = False
+_handler = None
+
+
+def register_scheme():
+    """Must run before the QApplication is created (Qt requirement)"""
+    global _scheme_registered
+    if _scheme_registered:
+        return
+    scheme = QWebEngineUrlScheme(SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    scheme.setFlags(QWebEngineUrlScheme.Flag.SecureScheme
+                    | QWebEngineUrlScheme.Flag.LocalAccessAllowed
+                    | QWebEngineUrlScheme.Flag.CorsEnabled)
+    QWebEngineUrlScheme.registerScheme(scheme)
+    _scheme_registered = True
+
+
+class VendorSchemeHandler(QWebEngineUrlSchemeHandler):
+    """Serves md2pdf://vendor/<name> from an in-memory copy of VENDOR_DIR"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.files = {}
+        for name in BUNDLE_FILES:
+            with open(os.path.join(VENDOR_DIR, name), "rb") as f:
+                self.files[name] = QByteArray(f.read())
+
+    def requestStarted(self, job):
+        url = job.requestUrl()
+        name = url.path().lstrip("/")
+        data = self.files.get(name) if url.host() == "vendor" else None
+        if data is None:
+            job.fail(QWebEngineUrlRequestJob.Error.UrlNotFound)
+            return
+        buffer = QBuffer(job)
+        buffer.setData(data)
+        job.reply(MIME_TYPES.get(os.path.splitext(name)[1], b"application/octet-stream"), buffer)
+
+
+def install():
+    """Installs the scheme handler on the default profile once per process.
+
+    Returns False if the bundle has not been fetched yet or the scheme was
+    not registered before the QApplication was created.
+    """
+    global _handler
+    if _handler is not None:
+        return True
+    if not (_scheme_registered and is_available()):
+        return False
+    _handler = VendorSchemeHandler()
+    QWebEngineProfile.defaultProfile().installUrlSchemeHandler(SCHEME, _handler)
+    return True
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["fetch"]:
+        print("usage: python src/offline_bundle.py fetch")
+        sys.exit(2)
+    names = fetch()
+    print(f"{len(names)} files downloaded to {VENDOR_DIR}" if names else "Bundle already complete")
@@ -0,0 +1,297 @@
+import hashlib
+import html
+import json
+import os
+import re
+from collections import OrderedDict
+from PyQt6.QtCore import QUrl, QTimer, QEventLoop
+
+from render_cache import default_cache_dir
+
+# pymdownx.arithmatex (generic) and the mermaid custom fence output
+MERMAID_RE = re.compile(r'<div class="mermaid">(.*?)</div>', re.DOTALL)
+INLINE_MATH_RE = re.compile(r'<span class="arithmatex">\\\((.*?)\\\)</span>', re.DOTALL)
+DISPLAY_MATH_RE = re.compile(r'<div class="arithmatex">\\\[(.*?)\\\]</div>', re.DOTALL)
+
+# Part of every cache id; bump when the worker page's SVG output changes
+SVG_FORMAT = "2"
+
+WORKER_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<script>
+window.MathJax = {{
+    svg: {{ fontCache: 'local' }},
+    startup: {{
+        typeset: false,
+        ready: () => {{
+            MathJax.startup.defaultReady();
+            MathJax.startup.promise.then(() => {{ window.prerenderReady = true; }});
+        }}
+    }}
+}};
+</script>
+<script async src="{mathjax_url}"></script>
+<script src="{mermaid_url}"></script>
+</head>
+<body>
+<script>
+if (window.mermaid) {{
+    // Plain SVG text labels instead of <foreignObject> HTML, so the SVGs also
+    // rasterize outside a browser (DOCX export)
+    mermaid.initialize({{ startOnLoad: false, theme: 'default', htmlLabels: false,
+                          flowchart: {{ htmlLabels: false }} }});
+}}
+window.prerender = {{
+    results: null,
+    // Renders every item in order and publishes {{id: svg or null}} when done
+    run: async function (items) {{
+        this.results = null;
+        const out = {{}};
+        for (const item of items) {{
+            try {{
+                if (item.kind === 'mermaid') {{
+                    const r = await mermaid.render('m' + item.id.slice(0, 16), item.source);
+                    out[item.id] = r.svg;
+                }} else {{
+                    const node = await MathJax.tex2svgPromise(item.source, {{ display: item.kind === 'display' }});
+                    out[item.id] = node.querySelector('svg').outerHTML;
+                }}
+            }} catch (e) {{
+                console.error(e);
+                out[item.id] = null;
+            }}
+        }}
+        this.results = out;
+    }}
+}};
+</script>
+</body>
+</html>
+"""
+
+
+class PrerenderRequest:
+    def __init__(self, html_body, items, callback):
+        self.html_body = html_body
+        self.items = items
+        self.callback = callback
+
+
+class DiagramPrerenderer:
+    """Turns Mermaid fences and arithmatex formulas into inline SVG before printing.
+
+    One warm QWebEnginePage renders all missing diagrams/formulas of a
+    document in a single call. SVGs are cached by source hash in memory and
+    on disk, so identical diagrams across files render once, and documents
+    whose items were all pre-rendered need no JavaScript or render wait.
+    Anything that fails to render is left for the page to render as before.
+    """
+
+    def __init__(self, converter, cache_dir=None, max_memory_entries=4096, timeout=30000):
+        self.converter = converter
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(default_cache_dir()), "svg")
+        self.max_memory_entries = max_memory_entries
+        self.timeout = timeout
+        self.memory = OrderedDict()
+        # Items that failed once are left to the page instead of being retried per document
+        self.failed_ids = set()
+
+        self.page = None
+        self.ready = False
+        self.broken = False
+        self.queue = []
+        self.current = None
+        self.poll = QTimer()
+        self.poll.setInterval(converter.ready_poll_interval)
+        self.poll.timeout.connect(self.check)
+        self.deadline = QTimer()
+        self.deadline.setSingleShot(True)
+        self.deadline.timeout.connect(self.on_timeout)
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    @staticmethod
+    def item_id(kind, source):
+        return hashlib.sha256(f"{SVG_FORMAT}\0{kind}\0{source}".encode("utf-8")).hexdigest()
+
+    def find_items(self, html_body):
+        """{id: (kind, source)} of every diagram and formula in the HTML"""
+        items = {}
+        for kind, pattern in (("mermaid", MERMAID_RE), ("inline", INLINE_MATH_RE),
+                              ("display", DISPLAY_MATH_RE)):
+            for match in pattern.finditer(html_body):
+                source = html.unescape(match.group(1))
+                items[self.item_id(kind, source)] = (kind, source)
+        return items
+
+    def lookup(self, item_id):
+        svg = self.memory.get(item_id)
+        if svg is not None:
+            self.memory.move_to_end(item_id)
+            return svg
+        path = os.path.join(self.cache_dir, item_id[:2], item_id + ".svg")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                svg = f.read()
+            self.remember(item_id, svg)
+        return svg
+
+    def remember(self, item_id, svg):
+        self.memory[item_id] = svg
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def store(self, item_id, svg):
+        self.remember(item_id, svg)
+        path = os.path.join(self.cache_dir, item_id[:2], item_id + ".svg")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".part", "w", encoding="utf-8") as f:
+                f.write(svg)
+            os.replace(path + ".part", path)
+        except OSError as e:
+            print(f"SVG cache error: {e}")
+
+    def inline(self, html_body):
+        """Replaces every item that has a cached SVG"""
+        def replace(kind, wrapper):
+            def sub(match):
+                svg = self.lookup(self.item_id(kind, html.unescape(match.group(1))))
+                return wrapper.format(svg) if svg else match.group(0)
+            return sub
+
+        html_body = MERMAID_RE.sub(replace("mermaid", '<div class="mermaid-svg">{}</div>'), html_body)
+        html_body = DISPLAY_MATH_RE.sub(replace("display", '<div class="math-svg math-display">{}</div>'), html_body)
+        return INLINE_MATH_RE.sub(replace("inline", '<span class="math-svg">{}</span>'), html_body)
+
+    def prerender_async(self, html_body, callback):
+        """Calls callback(html) with diagrams and formulas replaced by SVG where possible"""
+        missing = []
+        for item_id, (kind, source) in self.find_items(html_body).items():
+            if item_id in self.failed_ids:
+                continue
+            if self.lookup(item_id) is None:
+                missing.append({"id": item_id, "kind": kind, "source": source})
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not missing or self.broken:
+            callback(self.inline(html_body))
+            return
+
+        self.queue.append(PrerenderRequest(html_body, missing, callback))
+        if self.page is None:
+            self.load_page()
+        elif self.ready and self.current is None:
+            self.start_next()
+
+    def prerender(self, html_body):
+        loop = QEventLoop()
+        result = []
+
+        def on_done(new_html):
+            result.append(new_html)
+            loop.quit()
+
+        self.prerender_async(html_body, on_done)
+        if not result:
+            loop.exec()
+        return result[0]
+
+    def load_page(self):
+        self.page = self.converter.create_page()
+        self.page.loadFinished.connect(self.on_loaded)
+        self.page.setHtml(WORKER_HTML.format(mathjax_url=self.converter.mathjax_svg_url,
+                                             mermaid_url=self.converter.mermaid_url),
+                          QUrl.fromLocalFile(os.getcwd() + os.sep))
+        # The deadline also covers loading the libraries
+        self.deadline.start(self.timeout)
+        self.poll.start()
+
+    def on_loaded(self, ok):
+        self.page.loadFinished.disconnect()
+        if not ok:
+            self.give_up("Prerender page failed to load")
+
+    def check(self):
+        if not self.ready:
+            self.page.runJavaScript("!!window.prerenderReady", self.on_ready_result)
+        elif self.current is not None:
+            self.page.runJavaScript("prerender.results", self.on_results)
+
+    def on_ready_result(self, ready):
+        if ready and not self.ready:
+            self.ready = True
+            self.poll.stop()
+            self.deadline.stop()
+            self.start_next()
+
+    def start_next(self):
+        if self.current is not None or not self.queue:
+            return
+        self.current = self.queue.pop(0)
+        # Another request may have rendered some of these items meanwhile
+        self.current.items = [i for i in self.current.items if self.lookup(i["id"]) is None]
+        self.page.runJavaScript(f"prerender.run({json.dumps(self.current.items)}); true;")
+        self.deadline.start(self.timeout)
+        self.poll.start()
+
+    def on_results(self, results):
+        if results is None or self.current is None:
+            return
+        self.poll.stop()
+        self.deadline.stop()
+        for item_id, svg in results.items():
+            if svg:
+                self.store(item_id, svg)
+            else:
+                self.failed_ids.add(item_id)
+                self.failures += 1
+        self.finish_current()
+
+    def finish_current(self):
+        request = self.current
+        self.current = None
+        request.callback(self.inline(request.html_body))
+        self.start_next()
+
+    def on_timeout(self):
+        if not self.ready:
+            self.give_up("Prerender libraries did not load in time")
+        elif self.current is not None:
+            print("Prerender timeout, leaving remaining items to the page")
+            self.poll.stop()
+            self.failures += len(self.current.items)
+            self.failed_ids.update(item["id"] for item in self.current.items)
+            self.finish_current()
+
+    def give_up(self, reason):
+        """Without a working worker page every request passes through unchanged"""
+        print(f"{reason}; diagrams and math will be rendered in the page")
+        self.broken = True
+        self.poll.stop()
+        self.deadline.stop()
+        pending = self.queue
+        self.queue = []
+        for request in pending:
+            request.callback(self.inline(request.html_body))
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "memory_entries": len(self.memory),
+        }
+
+    def close(self):
+        if self.page is not None:
+            self.page.deleteLater()
+            self.page = None
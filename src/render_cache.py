@@ -0,0 +1,139 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "md2pdf", "renders")
+
+
+class RenderCache:
+    """Persistent, content-addressed store of rendered outputs.
+
+    Entries live in <cache_dir>/<key[:2]>/<key>.<kind> (kind is "pdf" or
+    "docx"). The file mtime doubles as the LRU timestamp, so there is no index
+    to keep consistent and several processes can share one cache directory.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=1024 * 1024 * 1024, hardlink=False):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        # Hardlinks avoid copying, but outputs must then be replaced, never rewritten in place
+        self.hardlink = hardlink
+
+        # Stats (this process only)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        # Running size estimate so stores don't rescan the directory every time
+        self.approx_bytes = None
+
+    @staticmethod
+    def make_key(*parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode("utf-8")
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def entry_path(self, key, kind):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{kind}")
+
+    def fetch(self, key, kind, dest):
+        """Places the cached output at dest; returns False on a miss"""
+        path = self.entry_path(key, kind)
+        if not os.path.exists(path):
+            self.misses += 1
+            return False
+
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        if os.path.lexists(dest):
+            os.remove(dest)
+        if self.hardlink:
+            try:
+                os.link(path, dest)
+            except OSError:
+                # Different filesystem or no link support
+                shutil.copyfile(path, dest)
+        else:
+            shutil.copyfile(path, dest)
+
+        os.utime(path)
+        self.hits += 1
+        return True
+
+    def store(self, key, kind, src):
+        path = self.entry_path(key, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.approx_bytes is None:
+            self.approx_bytes = sum(size for _, size, _ in self.entries())
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.stores += 1
+        self.approx_bytes += os.path.getsize(path)
+        if self.approx_bytes > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """(mtime, size, path) of every entry, oldest first"""
+        result = []
+        if not os.path.isdir(self.cache_dir):
+            return result
+        for root, dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                result.append((st.st_mtime, st.st_size, path))
+        result.sort()
+        return result
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self.approx_bytes = total
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self.approx_bytes = 0
+
+    def stats(self):
+        entries = self.entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
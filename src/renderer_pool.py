@@ -0,0 +1,130 @@
+import json
+import os
+from PyQt6.QtCore import QUrl, QEventLoop
+
+
+class RendererPool:
+    """Keeps warm QWebEnginePages with MathJax and Mermaid already loaded.
+
+    Instead of loading the full template for every document, a page is loaded
+    once and new documents are swapped in through md2pdf.setContent().
+    Pages are recycled after max_jobs_per_page documents to bound memory.
+
+    The *_async methods never block and are used by BatchRenderer; acquire()
+    and set_content() wrap them in a local event loop for Md2PdfConverter.convert.
+    """
+
+    def __init__(self, converter, size=2, max_jobs_per_page=50):
+        self.converter = converter
+        self.size = size
+        self.max_jobs_per_page = max_jobs_per_page
+
+        self.idle = []
+        self.busy = []
+        self.job_counts = {}
+        # Waiters of pages that are still loading, kept alive until ready
+        self.loading = {}
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+
+    def load_page_async(self, callback):
+        """Creates a page and calls callback(page) once the template scripts are ready"""
+        page = self.converter.create_page()
+
+        def on_ready(ready):
+            self.loading.pop(page, None)
+            self.job_counts[page] = 0
+            callback(page)
+
+        def on_loaded(ok):
+            page.loadFinished.disconnect()
+            # Warm pages carry both libraries; MathJax loads async, so wait for its startup
+            self.loading[page] = self.converter.wait_for_render_async(page, on_ready)
+
+        page.loadFinished.connect(on_loaded)
+        page.setHtml(self.converter.build_html("", math=True, diagrams=True),
+                     QUrl.fromLocalFile(os.getcwd() + os.sep))
+        self.loading[page] = None
+
+    def warm_up(self, count=None):
+        """Pre-loads pages so the first documents of a batch are hits too"""
+        count = self.size if count is None else min(count, self.size)
+        while len(self.idle) + len(self.busy) + len(self.loading) < count:
+            self.load_page_async(self.idle.append)
+
+    def acquire_async(self, callback):
+        if self.idle:
+            self.hits += 1
+            page = self.idle.pop()
+            self.busy.append(page)
+            callback(page)
+            return
+
+        self.misses += 1
+
+        def on_page(page):
+            self.busy.append(page)
+            callback(page)
+
+        self.load_page_async(on_page)
+
+    def acquire(self):
+        loop = QEventLoop()
+        acquired = []
+
+        def on_page(page):
+            acquired.append(page)
+            loop.quit()
+
+        self.acquire_async(on_page)
+        if not acquired:
+            loop.exec()
+        return acquired[0]
+
+    def release(self, page):
+        self.busy.remove(page)
+        self.job_counts[page] += 1
+
+        if self.job_counts[page] >= self.max_jobs_per_page:
+            self.recycled += 1
+            self.discard(page)
+        elif len(self.idle) >= self.size:
+            # Over the size limit (more pages were in use than the pool keeps)
+            self.discard(page)
+        else:
+            self.idle.append(page)
+
+    def discard(self, page):
+        self.job_counts.pop(page, None)
+        page.deleteLater()
+
+    def set_content_async(self, page, html_body, base_url, callback):
+        """Replaces the document body of a warm page and re-runs Mermaid/MathJax"""
+        script = "md2pdf.setContent({}, {}); true;".format(
+            json.dumps(html_body), json.dumps(base_url.toString()))
+        page.runJavaScript(script, lambda result: callback())
+
+    def set_content(self, page, html_body, base_url):
+        loop = QEventLoop()
+        self.set_content_async(page, html_body, base_url, loop.quit)
+        loop.exec()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "recycled": self.recycled,
+            "idle": len(self.idle),
+            "busy": len(self.busy),
+        }
+
+    def close(self):
+        for page in self.idle + self.busy:
+            self.discard(page)
+        self.idle = []
+        self.busy = []
@@ -0,0 +1,238 @@
+import html
+import os
+import re
+import shutil
+import tempfile
+from PyQt6.QtCore import QEventLoop, QUrl
+
+from incremental import FENCE_RE, LIST_ITEM_RE, REF_DEF_RE, REF_USE_RE, HEADING_ID_RE, IncrementalMarkdown
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    import fitz
+
+CONTENT_MARKER = "<!--md2pdf-content-->"
+COPY_BLOCK = 1024 * 1024
+
+
+def unique_id(heading_id, ids, next_suffix):
+    """toc-style _1, _2... suffixes, remembering the last suffix per id.
+
+    markdown.extensions.toc.unique() counts up from _1 every time, which is
+    quadratic for generated documents that repeat the same heading thousands
+    of times.
+    """
+    if heading_id in ids:
+        n = next_suffix.get(heading_id, 1)
+        while f"{heading_id}_{n}" in ids:
+            n += 1
+        next_suffix[heading_id] = n + 1
+        heading_id = f"{heading_id}_{n}"
+    ids.add(heading_id)
+    return heading_id
+
+
+def iter_chunks(input_path, chunk_bytes):
+    """Yields the Markdown file in pieces of roughly chunk_bytes.
+
+    Pieces only end at a blank line outside fences, $$ blocks and raw HTML
+    blocks, before a line that starts a new top-level block, so every piece
+    parses the same as it would inside the whole document. Past four times
+    the chunk size a piece ends at the next line that doesn't start with
+    whitespace, blank line or not, to keep memory bounded; that can split a
+    very long list or a file without blank lines into two paragraphs. Fences,
+    $$ and HTML blocks are never split, so an unclosed one runs to the end.
+    """
+    lines = []
+    size = 0
+    fence = None
+    in_math = False
+    # Open raw HTML block: (tag or "!--", nesting depth)
+    html = None
+    blank_before = False
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line in f:
+            stripped = line.strip()
+            oversized = size >= 4 * chunk_bytes
+            if size >= chunk_bytes and fence is None and not in_math and html is None and stripped \
+                    and not line[:1].isspace() \
+                    and (oversized or blank_before and not LIST_ITEM_RE.match(line)):
+                yield "".join(lines)
+                lines = []
+                size = 0
+
+            lines.append(line)
+            size += len(line)
+            blank_before = not stripped
+
+            if fence is not None:
+                match = FENCE_RE.match(line)
+                if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                    fence = None
+            elif in_math:
+                if line.rstrip().endswith("$$"):
+                    in_math = False
+            elif html is not None:
+                html = IncrementalMarkdown.html_block(html[0], html[1], line)
+            elif FENCE_RE.match(line):
+                fence = FENCE_RE.match(line).group(1)
+            elif stripped.startswith("$$") and not (len(stripped) > 2 and stripped.endswith("$$")):
+                in_math = True
+            else:
+                tag = IncrementalMarkdown.html_block_tag(line)
+                if tag:
+                    html = IncrementalMarkdown.html_block(tag, 0, line)
+    if lines:
+        yield "".join(lines)
+
+
+def scan_reference_definitions(input_path):
+    """{label: line} of every reference-link definition, in one streaming pass"""
+    ref_defs = {}
+    fence = None
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line in f:
+            match = FENCE_RE.match(line)
+            if fence is not None:
+                if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+                    fence = None
+            elif match:
+                fence = match.group(1)
+            else:
+                ref = REF_DEF_RE.match(line)
+                if ref:
+                    ref_defs[ref.group(1).strip().lower()] = line.rstrip("\n")
+    return ref_defs
+
+
+class StreamingConverter:
+    """Converts very large Markdown files with bounded memory.
+
+    The file is parsed in chunks (see iter_chunks) and the HTML is written to
+    temporary files that the page loads by URL, which also avoids setHtml()'s
+    2 MB limit. With part_bytes set, the HTML is split into several pages
+    that are printed one at a time and merged into one PDF with PyMuPDF, so
+    Chromium never holds the whole document either.
+
+    Python-Markdown slows down superlinearly on large inputs, so small
+    chunks are also faster overall. Reference links work across chunks and
+    heading ids stay unique; a [TOC] and footnotes only cover their own chunk.
+    """
+
+    def __init__(self, converter, chunk_bytes=256 * 1024, part_bytes=None, temp_dir=None):
+        self.converter = converter
+        self.chunk_bytes = chunk_bytes
+        self.part_bytes = part_bytes
+        self.temp_dir = temp_dir
+
+    def convert(self, input_path, output_path):
+        work_dir = tempfile.mkdtemp(prefix="md2pdf-stream-", dir=self.temp_dir)
+        try:
+            parts = self.write_parts(input_path, work_dir)
+            pdf_parts = []
+            for i, (html_path, math, diagrams) in enumerate(parts):
+                pdf_path = output_path if len(parts) == 1 else os.path.join(work_dir, f"part{i:04d}.pdf")
+                print(f"Streaming: printing part {i + 1}/{len(parts)}")
+                if not self.print_html_file(html_path, pdf_path, math or diagrams):
+                    return False
+                # The HTML of a printed part is no longer needed
+                os.remove(html_path)
+                pdf_parts.append(pdf_path)
+            if len(pdf_parts) > 1:
+                self.merge_pdfs(pdf_parts, output_path)
+            return True
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def write_parts(self, input_path, work_dir):
+        """Renders the chunks into body files; returns [(html_path, math, diagrams)]"""
+        converter = self.converter
+        ref_defs = scan_reference_definitions(input_path)
+        heading_ids = set()
+        next_suffix = {}
+        parts = []
+        body = None
+
+        def close_part():
+            body_file, body_path, math, diagrams = body
+            body_file.close()
+            html_path = body_path[:-len(".body")] + ".html"
+            self.write_page(input_path, body_path, html_path, math, diagrams)
+            os.remove(body_path)
+            parts.append((html_path, math, diagrams))
+
+        for chunk in iter_chunks(input_path, self.chunk_bytes):
+            used = {m.group(1).strip().lower() for m in REF_USE_RE.finditer(chunk)}
+            definitions = [ref_defs[label] for label in used if label in ref_defs]
+            if definitions:
+                chunk += "\n\n" + "\n".join(sorted(definitions)) + "\n"
+            chunk_html = converter.markdown_to_html(chunk)
+            del chunk
+            chunk_html = HEADING_ID_RE.sub(
+                lambda m: m.group(1) + unique_id(m.group(2), heading_ids, next_suffix) + m.group(3),
+                chunk_html)
+            if converter.prerenderer is not None:
+                chunk_html = converter.prerenderer.prerender(chunk_html)
+
+            if body is None:
+                body_path = os.path.join(work_dir, f"part{len(parts):04d}.body")
+                body = [open(body_path, "w", encoding="utf-8"), body_path, False, False]
+            body[0].write(chunk_html)
+            body[0].write("\n")
+            body[2] = body[2] or converter.uses_math(chunk_html)
+            body[3] = body[3] or converter.uses_diagrams(chunk_html)
+            if self.part_bytes and body[0].tell() >= self.part_bytes:
+                close_part()
+                body = None
+
+        if body is None and not parts:
+            body_path = os.path.join(work_dir, "part0000.body")
+            body = [open(body_path, "w", encoding="utf-8"), body_path, False, False]
+        if body is not None:
+            close_part()
+        return parts
+
+    def write_page(self, input_path, body_path, html_path, math, diagrams):
+        """Wraps a body file in the template without loading it into memory"""
+        page = self.converter.build_html(CONTENT_MARKER, math=math, diagrams=diagrams)
+        head, tail = page.split(CONTENT_MARKER, 1)
+        # The page lives in a temp dir; relative images resolve against the source
+        base_href = html.escape(self.converter.base_url_for(input_path).toString(), quote=True)
+        head = re.sub(r'<head>', f'<head>\n<base href="{base_href}">', head, count=1)
+        with open(html_path, "w", encoding="utf-8") as out:
+            out.write(head)
+            with open(body_path, "r", encoding="utf-8") as body:
+                shutil.copyfileobj(body, out, COPY_BLOCK)
+            out.write(tail)
+
+    def print_html_file(self, html_path, pdf_path, needs_wait):
+        converter = self.converter
+        page = converter.create_page()
+        try:
+            loop = QEventLoop()
+            loaded = []
+            page.loadFinished.connect(lambda ok: (loaded.append(ok), loop.quit()))
+            page.load(QUrl.fromLocalFile(html_path))
+            loop.exec()
+            if not (loaded and loaded[0]):
+                print(f"Streaming: page failed to load: {html_path}")
+                return False
+            if needs_wait:
+                converter.wait_for_render(page)
+            return converter.print_page(page, pdf_path)
+        finally:
+            page.deleteLater()
+
+    @staticmethod
+    def merge_pdfs(pdf_parts, output_path):
+        merged = fitz.open()
+        try:
+            for path in pdf_parts:
+                with fitz.open(path) as part:
+                    merged.insert_pdf(part)
+            tmp_path = output_path + ".part"
+            merged.save(tmp_path, garbage=1, deflate=True)
+        finally:
+            merged.close()
+        os.replace(tmp_path, output_path)
@@ -0,0 +1,159 @@
+"""Applies the assistant's Canvas edits to the editor without replacing its text.
+
+The assistant answers either with the whole new document:
+
+    <<<UPDATE>>>
+    ...new text...
+    <<<END>>>
+
+or, for local changes, with SEARCH/REPLACE pairs against the current text:
+
+    <<<PATCH>>>
+    <<<<<<< SEARCH
+    exact lines from the current text
+    =======
+    their replacement
+    >>>>>>> REPLACE
+    <<<END>>>
+
+Both are turned into a list of (start, end, replacement) character edits
+against the current text and applied with one QTextCursor edit block, so
+the change is a single undo step, the cursor stays where it was and the
+incremental preview only re-renders the blocks that changed.
+"""
+import bisect
+import difflib
+import re
+from PyQt6.QtGui import QTextCursor
+
+UPDATE_RE = re.compile(r'<<<UPDATE>>>(.*?)<<<END>>>', re.DOTALL)
+PATCH_RE = re.compile(r'<<<PATCH>>>(.*?)<<<END>>>', re.DOTALL)
+BLOCK_RE = re.compile(r'^<<<<<<< SEARCH[ \t]*\n(.*?)^=======[ \t]*\n(.*?)^>>>>>>> REPLACE[ \t]*$',
+                      re.DOTALL | re.MULTILINE)
+
+
+class PatchError(Exception):
+    pass
+
+
+def parse_patch(text):
+    """[(search, replace)] pairs of a <<<PATCH>>> body"""
+    pairs = [(m.group(1), m.group(2)) for m in BLOCK_RE.finditer(text)]
+    if not pairs:
+        raise PatchError("Yamada SEARCH/REPLACE bloğu yok")
+    return pairs
+
+
+def reply_edits(reply, document, allow_update=True):
+    """Edits for the first complete UPDATE or PATCH block of a reply, or None if there is none.
+
+    allow_update=False rejects full rewrites, e.g. when the assistant was
+    only shown part of the document.
+    """
+    match = PATCH_RE.search(reply)
+    update = UPDATE_RE.search(reply)
+    if update and (not match or update.start() < match.start()):
+        if not allow_update:
+            raise PatchError("Belgenin yalnızca bir kısmı gönderilmişti, tam metin güncellemesi uygulanmadı")
+        return text_edits(document, update.group(1).strip())
+    if match:
+        return patch_edits(document, parse_patch(match.group(1)))
+    return None
+
+
+def find_block(document, search, start=0):
+    """(start, end) of search in document; falls back to ignoring trailing spaces per line"""
+    pos = document.find(search, start)
+    if pos >= 0:
+        return pos, pos + len(search)
+    lines = search.rstrip("\n").split("\n")
+    pattern = "\n".join(re.escape(line.rstrip()) + r"[ \t]*" for line in lines)
+    if search.endswith("\n"):
+        pattern += "\n"
+    match = re.compile(pattern).search(document, start)
+    if match:
+        return match.start(), match.end()
+    return None
+
+
+def patch_edits(document, pairs):
+    """Edits for SEARCH/REPLACE pairs; all of them apply or PatchError is raised"""
+    edits = []
+    for search, replace in pairs:
+        if not search.strip():
+            raise PatchError("Boş SEARCH bloğu")
+        span = find_block(document, search)
+        if span is None:
+            raise PatchError(f"Metin bulunamadı: {search.strip().splitlines()[0][:60]}")
+        if find_block(document, search, span[0] + 1) is not None:
+            raise PatchError(f"Metin birden fazla yerde geçiyor: {search.strip().splitlines()[0][:60]}")
+        edits.append((span[0], span[1], replace))
+    edits.sort()
+    for (_, end, _), (start, _, _) in zip(edits, edits[1:]):
+        if start < end:
+            raise PatchError("SEARCH blokları çakışıyor")
+    return [trim_edit(document, *edit) for edit in edits]
+
+
+def text_edits(old, new):
+    """Minimal (start, end, replacement) edits turning old into new, in document order.
+
+    Lines are matched with difflib; changed runs are trimmed to the characters
+    that actually differ, so a fixed typo only touches that word.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    # Unchanged lines at both ends are skipped before the (quadratic) matcher runs
+    head = 0
+    while head < min(len(old_lines), len(new_lines)) and old_lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    while (tail < min(len(old_lines), len(new_lines)) - head
+           and old_lines[-1 - tail] == new_lines[-1 - tail]):
+        tail += 1
+    old_mid = old_lines[head:len(old_lines) - tail]
+    new_mid = new_lines[head:len(new_lines) - tail]
+    offsets = [sum(map(len, old_lines[:head]))]
+    for line in old_mid:
+        offsets.append(offsets[-1] + len(line))
+
+    edits = []
+    matcher = difflib.SequenceMatcher(None, old_mid, new_mid)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            edits.append(trim_edit(old, offsets[i1], offsets[i2], "".join(new_mid[j1:j2])))
+    return [edit for edit in edits if edit[0] != edit[1] or edit[2]]
+
+
+def trim_edit(document, start, end, replacement):
+    """Drops the characters an edit leaves unchanged at either end"""
+    while start < end and replacement and document[start] == replacement[0]:
+        start += 1
+        replacement = replacement[1:]
+    while start < end and replacement and document[end - 1] == replacement[-1]:
+        end -= 1
+        replacement = replacement[:-1]
+    return start, end, replacement
+
+
+def qt_positions(text):
+    """Maps string offsets to QTextCursor positions, which count UTF-16 units"""
+    if all(ord(c) < 0x10000 for c in text):
+        return lambda i: i
+    wide = [i for i, c in enumerate(text) if ord(c) >= 0x10000]
+    return lambda i: i + bisect.bisect_left(wide, i)
+
+
+def apply_edits(editor, edits):
+    """Applies edits (offsets into editor.toPlainText()) as one undo step"""
+    if not edits:
+        return
+    position = qt_positions(editor.toPlainText())
+    cursor = QTextCursor(editor.document())
+    cursor.beginEditBlock()
+    # Back to front, so the earlier offsets stay valid
+    for start, end, replacement in reversed(edits):
+        cursor.setPosition(position(start))
+        cursor.setPosition(position(end), QTextCursor.MoveMode.KeepAnchor)
+        cursor.insertText(replacement)
+    cursor.endEditBlock()
@@ -0,0 +1,264 @@
+"""Timing spans and counters for the conversion pipeline.
+
+Md2PdfConverter and BatchRenderer report every stage (file read, Markdown,
+page load, JS render wait, printToPdf, DOCX...) to converter.tracer. By
+default that is NULL_TRACER, which does nothing. A Tracer forwards spans and
+per-document counters to its sinks:
+
+    tracer = Tracer([ChromeTraceSink("trace.json"), StatsSink()])
+    converter.tracer = tracer
+    ...
+    tracer.close()
+    print(tracer.stats())
+
+Chrome trace files open in chrome://tracing or https://ui.perfetto.dev, with
+one row per document.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+DOC_COUNTER_PATTERNS = {
+    "code_blocks": re.compile(r'<pre\b'),
+    "diagrams": re.compile(r'class="mermaid"'),
+    "formulas": re.compile(r'class="arithmatex"'),
+    "images": re.compile(r'<img\b'),
+    "tables": re.compile(r'<table\b'),
+}
+
+
+def document_counters(html_body):
+    """Size and feature counts of a rendered document"""
+    counters = {"html_bytes": len(html_body.encode("utf-8"))}
+    for name, pattern in DOC_COUNTER_PATTERNS.items():
+        counters[name] = len(pattern.findall(html_body))
+    return counters
+
+
+class Span:
+    """A running stage; end() (or leaving the with block) records it"""
+
+    def __init__(self, tracer, name, doc, args):
+        self.tracer = tracer
+        self.name = name
+        self.doc = doc
+        self.args = args
+        self.start = time.perf_counter()
+        self.thread = threading.get_ident()
+        self.ended = False
+
+    def end(self, **args):
+        if self.ended:
+            return
+        self.ended = True
+        self.args.update(args)
+        self.tracer.record(self.name, self.start, time.perf_counter() - self.start,
+                           self.doc, self.thread, **self.args)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.end()
+        return False
+
+
+class NullSpan:
+    def end(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class NullTracer:
+    """Default tracer: spans cost one method call and record nothing"""
+    enabled = False
+
+    def span(self, name, doc=None, **args):
+        return NULL_SPAN
+
+    def record(self, name, start, duration, doc=None, thread=None, **args):
+        pass
+
+    def counters(self, doc, **values):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return None
+
+
+NULL_SPAN = NullSpan()
+NULL_TRACER = NullTracer()
+
+
+class Tracer:
+    """Collects spans and counters and hands them to the sinks.
+
+    Events are plain dicts:
+        {"type": "span", "name", "doc", "start", "duration", "thread", "args"}
+        {"type": "counters", "doc", "time", "values"}
+    Times are seconds since the tracer was created.
+    """
+    enabled = True
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def span(self, name, doc=None, **args):
+        """Starts a span; use as a context manager or call end() from a callback"""
+        return Span(self, name, doc, args)
+
+    def record(self, name, start, duration, doc=None, thread=None, **args):
+        """Adds a span measured elsewhere (start is a time.perf_counter() value)"""
+        self.emit({
+            "type": "span",
+            "name": name,
+            "doc": doc,
+            "start": start - self.origin,
+            "duration": duration,
+            "thread": thread or threading.get_ident(),
+            "args": args,
+        })
+
+    def counters(self, doc, **values):
+        self.emit({
+            "type": "counters",
+            "doc": doc,
+            "time": time.perf_counter() - self.origin,
+            "values": values,
+        })
+
+    def emit(self, event):
+        with self.lock:
+            for sink in self.sinks:
+                sink.write(event)
+
+    def close(self):
+        with self.lock:
+            for sink in self.sinks:
+                sink.close()
+
+    def stats(self):
+        """Summary from the first StatsSink, or None"""
+        for sink in self.sinks:
+            if isinstance(sink, StatsSink):
+                return sink.stats()
+        return None
+
+
+class JsonLinesSink:
+    """One JSON object per event, written as they happen"""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, event):
+        self.file.write(json.dumps(event) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ChromeTraceSink:
+    """Chrome trace-event JSON, written on close.
+
+    Every document gets its own row (tid) so parallel renders don't overlap;
+    spans without a document go on the row of their thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+        self.rows = {}
+
+    def row(self, doc, thread):
+        key = doc if doc is not None else f"thread-{thread}"
+        if key not in self.rows:
+            self.rows[key] = len(self.rows) + 1
+            self.events.append({"ph": "M", "name": "thread_name", "pid": os.getpid(),
+                                "tid": self.rows[key],
+                                "args": {"name": os.path.basename(doc) if doc else "main"}})
+        return self.rows[key]
+
+    def write(self, event):
+        pid = os.getpid()
+        if event["type"] == "span":
+            self.events.append({
+                "ph": "X",
+                "name": event["name"],
+                "cat": "md2pdf",
+                "pid": pid,
+                "tid": self.row(event["doc"], event["thread"]),
+                "ts": event["start"] * 1e6,
+                "dur": event["duration"] * 1e6,
+                "args": {"doc": event["doc"], **event["args"]},
+            })
+        else:
+            self.events.append({
+                "ph": "C",
+                "name": os.path.basename(event["doc"] or "counters"),
+                "pid": pid,
+                "ts": event["time"] * 1e6,
+                "args": event["values"],
+            })
+
+    def close(self):
+        tmp_path = self.path + ".part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+        os.replace(tmp_path, self.path)
+
+
+class StatsSink:
+    """Keeps durations per span name and totals per counter in memory"""
+
+    def __init__(self):
+        self.durations = {}
+        self.totals = {}
+        self.documents = set()
+
+    def write(self, event):
+        if event["type"] == "span":
+            self.durations.setdefault(event["name"], []).append(event["duration"])
+        else:
+            self.documents.add(event["doc"])
+            for name, value in event["values"].items():
+                self.totals[name] = self.totals.get(name, 0) + value
+
+    def close(self):
+        pass
+
+    def stats(self):
+        stages = {}
+        for name, values in self.durations.items():
+            values = sorted(values)
+            stages[name] = {
+                "count": len(values),
+                "total": round(sum(values), 4),
+                "p50": round(values[len(values) // 2], 4),
+                "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 4),
+                "max": round(values[-1], 4),
+            }
+        return {"stages": stages, "documents": len(self.documents), "counters": self.totals}
+
+
+def tracer_for(path):
+    """A Tracer writing to path (.jsonl: JSON lines, otherwise Chrome format) with stats"""
+    sink = JsonLinesSink(path) if path.endswith(".jsonl") else ChromeTraceSink(path)
+    return Tracer([sink, StatsSink()])
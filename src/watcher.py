@@ -0,0 +1,251 @@
+import os
+import time
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+
+from batch import BatchRenderer
+from renderer_pool import RendererPool
+
+
+class ChangeWatcher(QObject):
+    """Re-converts Markdown files as soon as they or their images change.
+
+    Listed files and whole directory trees are watched with
+    QFileSystemWatcher. Events are collected until nothing has happened for
+    debounce_ms, so an editor's save (often several writes or a rename)
+    triggers one render. Besides the Markdown itself, every local image a
+    document references is watched and mapped back to the documents using
+    it. Renders go through a long-lived BatchRenderer on warm RendererPool
+    pages, so a save turns into a PDF without reloading the template.
+    """
+    converted = pyqtSignal(object)
+    scheduled = pyqtSignal(list)
+
+    def __init__(self, converter, output_path_for=None, debounce_ms=150, max_in_flight=2, parent=None):
+        super().__init__(parent)
+        self.converter = converter
+        self.output_path_for = output_path_for or (lambda path: os.path.splitext(path)[0] + ".pdf")
+        if converter.pool is None:
+            converter.pool = RendererPool(converter, size=max_in_flight)
+        converter.pool.warm_up()
+
+        self.fs = QFileSystemWatcher(self)
+        self.fs.fileChanged.connect(self.on_changed)
+        self.fs.directoryChanged.connect(self.on_changed)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(debounce_ms)
+        self.timer.timeout.connect(self.flush)
+
+        self.roots = set()
+        self.watched = set()
+        self.inputs = set()
+        self.assets_of = {}
+        self.users_of = {}
+        self.signatures = {}
+        self.dirty = {}
+        self.rendering = set()
+        self.rerun = set()
+        self.changed_at = {}
+        self.stopped = False
+
+        self.renderer = BatchRenderer(converter, [], max_in_flight=max_in_flight, parent=self)
+        self.renderer.job_finished.connect(self.on_rendered)
+        self.renderer.start()
+
+    def add_path(self, path, convert=False):
+        """Watches a Markdown file or a directory tree; convert=True renders it right away"""
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            self.roots.add(path)
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                self.watch(root)
+                for name in sorted(files):
+                    if name.lower().endswith(".md"):
+                        self.add_input(os.path.join(root, name), convert)
+        elif os.path.isfile(path):
+            # Editors that save by renaming replace the file; the directory sees it come back
+            self.watch(os.path.dirname(path))
+            self.add_input(path, convert)
+
+    def add_input(self, path, convert=False):
+        if path in self.inputs:
+            return
+        self.inputs.add(path)
+        self.watch(path)
+        self.signatures[path] = self.signature(path)
+        self.update_assets(path)
+        if convert:
+            self.render([path])
+
+    def remove_input(self, path):
+        self.inputs.discard(path)
+        self.signatures.pop(path, None)
+        self.set_assets(path, set())
+        self.unwatch(path)
+
+    def watch(self, path):
+        if path not in self.watched and self.fs.addPath(path):
+            self.watched.add(path)
+
+    def rewatch(self, path):
+        """A rename-save silently drops the path from QFileSystemWatcher"""
+        if os.path.exists(path) and path not in self.fs.files() and path not in self.fs.directories():
+            self.watched.discard(path)
+            self.watch(path)
+
+    def unwatch(self, path):
+        if path in self.watched:
+            self.watched.discard(path)
+            self.fs.removePath(path)
+
+    @staticmethod
+    def signature(path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def update_assets(self, path):
+        """Re-reads which local files a document references"""
+        try:
+            assets = set(self.converter.local_assets(path, self.converter.render_file(path)))
+        except (OSError, UnicodeDecodeError):
+            assets = set()
+        self.set_assets(path, assets)
+
+    def set_assets(self, path, assets):
+        for asset in self.assets_of.get(path, set()) - assets:
+            users = self.users_of.get(asset, set())
+            users.discard(path)
+            if not users:
+                self.users_of.pop(asset, None)
+                self.signatures.pop(asset, None)
+                self.unwatch(asset)
+        for asset in assets:
+            self.users_of.setdefault(asset, set()).add(path)
+            if asset not in self.signatures:
+                self.signatures[asset] = self.signature(asset)
+            self.watch(asset)
+            self.watch(os.path.dirname(asset))
+        self.assets_of[path] = assets
+
+    def on_changed(self, path):
+        self.dirty.setdefault(path, time.perf_counter())
+        self.timer.start()
+
+    def flush(self):
+        """Works out which documents the collected events affect and renders them"""
+        dirty, self.dirty = self.dirty, {}
+        affected = {}
+
+        def mark(path, changed_at):
+            affected[path] = min(changed_at, affected.get(path, changed_at))
+
+        for path, changed_at in dirty.items():
+            if os.path.isdir(path):
+                for candidate in self.scan_directory(path):
+                    mark(candidate, changed_at)
+                continue
+            # A missing file is mid-save or deleted; its directory reports when it is back
+            self.rewatch(path)
+            if path in self.inputs and self.refresh_signature(path):
+                mark(path, changed_at)
+            if path in self.users_of and self.refresh_signature(path):
+                for user in self.users_of[path]:
+                    mark(user, changed_at)
+
+        if affected:
+            for path, changed_at in affected.items():
+                self.changed_at.setdefault(path, changed_at)
+            self.render(sorted(affected))
+
+    def scan_directory(self, directory):
+        """New or replaced files in a watched directory"""
+        found = []
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return found
+        in_tree = any(directory == root or directory.startswith(root + os.sep) for root in self.roots)
+        for name in names:
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                if in_tree and not name.startswith(".") and path not in self.watched:
+                    self.add_path(path, convert=True)
+            elif path in self.inputs or path in self.users_of:
+                self.rewatch(path)
+                if self.refresh_signature(path):
+                    found += [path] if path in self.inputs else sorted(self.users_of[path])
+            elif in_tree and name.lower().endswith(".md"):
+                self.add_input(path)
+                found.append(path)
+        return found
+
+    def refresh_signature(self, path):
+        """True if the file really changed since we last looked"""
+        signature = self.signature(path)
+        if signature is None or signature == self.signatures.get(path):
+            return False
+        self.signatures[path] = signature
+        return True
+
+    def render(self, paths):
+        if self.stopped:
+            return
+        queued = []
+        for path in paths:
+            self.update_assets(path)
+            if path in self.rendering:
+                # Rendered again with the newest content once the current run is done
+                self.rerun.add(path)
+                continue
+            self.rendering.add(path)
+            output_path = self.output_path_for(path)
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            self.renderer.add_job(path, output_path)
+            queued.append(path)
+        if queued:
+            self.scheduled.emit(queued)
+
+    def on_rendered(self, result):
+        self.rendering.discard(result.input_path)
+        if self.stopped:
+            # Finished after stop(); nobody is waiting for it any more
+            return
+        changed_at = self.changed_at.pop(result.input_path, None)
+        if changed_at is not None:
+            latency = time.perf_counter() - changed_at
+            print(f"Watch: {os.path.basename(result.input_path)} "
+                  f"{'updated' if result.ok else 'failed'} {latency:.2f} s after the change")
+        self.converted.emit(result)
+        if result.input_path in self.rerun:
+            self.rerun.discard(result.input_path)
+            QTimer.singleShot(0, lambda: self.render([result.input_path]))
+
+    def stop(self):
+        self.stopped = True
+        self.timer.stop()
+        self.dirty = {}
+        self.rerun = set()
+        if self.watched:
+            self.fs.removePaths(list(self.watched))
+            self.watched = set()
+        self.renderer.cancel()
+
+    def close(self):
+        """stop(), then deleteLater() once the renders already in flight are done"""
+        self.stop()
+        if self.renderer.done:
+            self.deleteLater()
+        else:
+            self.renderer.finished.connect(self.deleteLater)
+
+    def stats(self):
+        return {
+            "inputs": len(self.inputs),
+            "assets": len(self.users_of),
+            "watched": len(self.watched),
+            "rendering": len(self.rendering),
+        }
@@ -0,0 +1,45 @@
+import io
+import json
+import os
+import sys
+import unittest
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ai_client import iter_sse
+
+
+def sse_response(body, content_type="text/event-stream"):
+    """A requests.Response streaming body, as the server would send it"""
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = content_type
+    response.raw = io.BytesIO(body)
+    # As HTTPAdapter.build_response does: text/* without a charset means ISO-8859-1
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+class IterSseTest(unittest.TestCase):
+    def test_non_ascii_data_is_decoded_as_utf8(self):
+        text = "Merhaba dünya ğüşıöç 😀"
+        body = f"data: {json.dumps({'text': text}, ensure_ascii=False)}\n\n".encode("utf-8")
+        events = list(iter_sse(sse_response(body)))
+        self.assertEqual([json.loads(e)["text"] for e in events], [text])
+
+    def test_character_split_across_chunks(self):
+        # iter_lines reads 512 bytes at a time; put a multi-byte character on the boundary
+        prefix = "data: " + "a" * (511 - len("data: "))
+        body = (prefix + "ş😀\n\ndata: [DONE]\n\n").encode("utf-8")
+        events = list(iter_sse(sse_response(body)))
+        self.assertEqual(events, ["a" * (511 - len("data: ")) + "ş😀"])
+
+    def test_multiline_data_comments_and_done(self):
+        body = ": keep-alive\n\ndata: bir\ndata: iki\n\ndata: [DONE]\n\ndata: sonra\n\n".encode("utf-8")
+        self.assertEqual(list(iter_sse(sse_response(body))), ["bir\niki"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from chat_context import ChatContext, estimate_tokens
+
+PARAGRAPH = "Örnek paragraf metni, başlıkları ve bölümleri olan uzun bir belge. " * 20
+
+
+def large_document(sections=120):
+    return "".join(f"## Bölüm {i}\n\n{PARAGRAPH}\n\n{PARAGRAPH}\n\n" for i in range(sections))
+
+
+def total_tokens(messages):
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+class ChatContextTest(unittest.TestCase):
+    def test_sections_conversation_keeps_recent_turns(self):
+        context = ChatContext()
+        document = large_document()
+        for i in range(12):
+            messages = context.build(f"Bölüm {i} hakkında soru", document, "Sistem",
+                                     focus=(i * 1000, i * 1000))
+            context.add_reply("Cevap metni. " * 40)
+        self.assertEqual(context.last_stats["mode"], "sections")
+        self.assertEqual(context.last_stats["turns"], 11)
+        self.assertEqual(context.last_stats["summarized"], 0)
+        self.assertLessEqual(total_tokens(messages), context.max_tokens)
+
+    def test_stale_document_contexts_are_dropped(self):
+        context = ChatContext()
+        document = large_document()
+        for i in range(3):
+            messages = context.build(f"Soru {i}", document, "Sistem")
+            context.add_reply(f"Cevap {i}")
+        # Only the newest request carries sections of the document
+        with_sections = [m for m in messages if "İlgili bölümler" in m["content"]]
+        self.assertEqual(with_sections, [messages[-1]])
+        self.assertEqual([t["context"] for t in context.turns[:-1]], ["", ""])
+
+    def test_diff_against_the_only_full_copy(self):
+        context = ChatContext()
+        document = "".join(f"satır {i}\n" for i in range(200))
+        context.build("ilk", document)
+        context.add_reply("tamam")
+        changed = document.replace("satır 100\n", "değişti\n")
+        context.build("ikinci", changed)
+        context.add_reply("tamam")
+        messages = context.build("üçüncü", changed.replace("satır 5\n", "yeni\n"))
+        self.assertEqual(context.last_stats["mode"], "diff")
+        full_copies = [m for m in messages if "Aktif Editör İçeriği" in m["content"]]
+        self.assertEqual(len(full_copies), 1)
+        # The second turn's diff is not sent again
+        self.assertNotIn("+değişti", messages[2]["content"])
+        self.assertIn("+yeni", messages[-1]["content"])
+
+    def test_budget_is_respected_and_old_turns_summarized(self):
+        context = ChatContext(max_tokens=3000, document_tokens=1500, summary_tokens=300)
+        document = "".join(f"satır {i}\n" for i in range(300))
+        for i in range(30):
+            document += f"ek {i}\n"
+            messages = context.build(f"Soru {i}", document, "Sistem")
+            self.assertLessEqual(total_tokens(messages), context.max_tokens)
+            context.add_reply("Uzun cevap. " * 60)
+        self.assertGreater(context.last_stats["summarized"], 0)
+        self.assertLess(context.last_stats["turns"], 29)
+        self.assertTrue(messages[0]["content"].startswith("Önceki konuşmanın özeti"))
+
+    def test_document_is_resent_when_its_copy_is_dropped(self):
+        context = ChatContext(max_tokens=2500, document_tokens=1500, summary_tokens=200)
+        document = "".join(f"satır {i}\n" for i in range(300))
+        context.build("ilk", document)
+        context.add_reply("tamam")
+        modes = []
+        for i in range(10):
+            messages = context.build(f"Soru {i}", document, "Sistem")
+            context.add_reply("Uzun cevap. " * 80)
+            modes.append(context.last_stats["mode"])
+            # Whatever "unchanged" refers to is still part of the request
+            self.assertTrue(any(document in m["content"] for m in messages))
+        self.assertIn("unchanged", modes)
+        self.assertIn("full", modes)
+
+    def test_failed_request_is_discarded(self):
+        context = ChatContext()
+        context.build("ilk", "metin\n")
+        context.discard_pending()
+        self.assertEqual(context.turns, [])
+        messages = context.build("tekrar", "metin\n")
+        self.assertEqual(context.last_stats["mode"], "full")
+        self.assertEqual(len(messages), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from batch import RenderResult
+from cli import Reporter
+
+
+class ReporterTest(unittest.TestCase):
+    def records(self, *calls):
+        stream = io.StringIO()
+        reporter = Reporter(stream)
+        for args, kwargs in calls:
+            reporter.result(*args, **kwargs)
+        return reporter, [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def test_pdf_record(self):
+        _, [record] = self.records(((RenderResult("a.md", "out/a.pdf", True, elapsed=1.5),), {}))
+        self.assertEqual(record, {"input": "a.md", "output": "out/a.pdf", "status": "ok",
+                                  "pdf_seconds": 1.5})
+
+    def test_docx_only_record_has_no_pdf_time(self):
+        reporter, records = self.records(
+            ((RenderResult("a.md", "out/a.docx", True),), {"docx_seconds": 0.25, "pdf": False}),
+            ((RenderResult("b.md", "out/b.pdf", False, "DOCX export failed", 0.5),), {"pdf": False}),
+        )
+        self.assertEqual(records[0], {"input": "a.md", "output": "out/a.docx", "status": "ok",
+                                      "docx_seconds": 0.25})
+        self.assertNotIn("pdf_seconds", records[1])
+        self.assertEqual(records[1]["output"], "out/b.docx")
+        self.assertEqual(records[1]["docx_seconds"], 0.5)
+        self.assertEqual(records[1]["error"], "DOCX export failed")
+        self.assertEqual((reporter.converted, reporter.failed), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from md_parser import shared_renderer
+from streaming import iter_chunks
+
+
+class IterChunksTest(unittest.TestCase):
+    def chunks(self, text, chunk_bytes):
+        with tempfile.NamedTemporaryFile("w", suffix=".md", encoding="utf-8", delete=False) as f:
+            f.write(text)
+        self.addCleanup(os.remove, f.name)
+        return list(iter_chunks(f.name, chunk_bytes))
+
+    def assert_renders_like_whole(self, text, pieces):
+        renderer = shared_renderer()
+        self.assertEqual("".join(pieces), text)
+        whole = "".join(renderer.convert(text).split())
+        parts = "".join("".join(renderer.convert(piece).split()) for piece in pieces)
+        self.assertEqual(parts, whole)
+
+    def test_html_block_is_not_split(self):
+        text = ("x" * 50 + "\n\n<div class=\"note\">\n\ninside **bold**\n\nmore text\n\n</div>\n\n"
+                "after\n\nend *here*\n")
+        pieces = self.chunks(text, 40)
+        self.assertTrue(any("<div" in p and "</div>" in p for p in pieces))
+        self.assertFalse(any(p.lstrip().startswith("</div>") for p in pieces))
+        self.assert_renders_like_whole(text, pieces)
+
+    def test_html_comment_is_not_split(self):
+        text = "y" * 50 + "\n\n<!-- start\n\nhidden *text* that is long\n\nmore hidden\n\nend -->\n\nafter\n"
+        pieces = self.chunks(text, 30)
+        self.assertTrue(any("<!--" in p and "-->" in p for p in pieces))
+        self.assert_renders_like_whole(text, pieces)
+
+    def test_blank_lines_split_paragraphs(self):
+        text = "".join(f"Paragraf {i} **kalın** metin.\n\n" for i in range(50))
+        pieces = self.chunks(text, 200)
+        self.assertGreater(len(pieces), 5)
+        self.assert_renders_like_whole(text, pieces)
+
+    def test_file_without_blank_lines_is_bounded(self):
+        text = "".join(f"satır {i} uzun bir paragraf\n" for i in range(1000))
+        pieces = self.chunks(text, 1000)
+        self.assertGreater(len(pieces), 1)
+        self.assertTrue(all(len(p) <= 4 * 1000 + 40 for p in pieces))
+        self.assertEqual("".join(pieces), text)
+
+
+if __name__ == "__main__":
+    unittest.main()